@@ -0,0 +1,268 @@
+"""
+Бенчмарк модели на папке локальных изображений.
+
+    python -m src.ML.benchmark --images data/val --backends onnx,pt --imgsz 640 --batch 1,8 --threads 1,4 \
+        --output bench.json --csv bench.csv
+
+Каждая конфигурация (бэкенд x imgsz x батч x потоки) запускается в отдельном процессе, чтобы
+пиковый RSS и настройки потоков не смешивались между прогонами. Для каждой считаются
+p50/p95/p99 задержки прогона батча, изображения в секунду, пиковый RSS и среднее время
+на изображение по стадиям: препроцессинг, прямой проход, постпроцессинг, отрисовка
+"""
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import cv2
+import numpy as np
+
+from src.ML.detections import Detections
+from src.ML.render import draw_detections
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+STAGES = ("preprocess", "forward", "postprocess", "plot")
+
+
+def list_images(folder: str, limit: int | None = None) -> list[str]:
+    paths = sorted(
+        os.path.join(folder, name)
+        for name in os.listdir(folder)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not paths:
+        raise ValueError(f"В папке {folder} нет изображений")
+    return paths[:limit] if limit else paths
+
+
+def read_images(paths: list[str]) -> list[np.ndarray]:
+    """Читает кадры BGR; нечитаемые файлы пропускаются с предупреждением"""
+    frames = []
+    for path in paths:
+        frame = cv2.imread(path, cv2.IMREAD_COLOR)
+        if frame is None:
+            print(f" Не удалось прочитать изображение {path}, пропускаем")
+            continue
+        frames.append(frame)
+    if not frames:
+        raise ValueError("Ни одно изображение не удалось прочитать")
+    return frames
+
+
+class OnnxRunner:
+    """Прямой onnxruntime (как в проде при USE_ORT)"""
+
+    def __init__(self, model_path: str, threads: int):
+        from src.ML.onnx_engine import OnnxEngine
+
+        self.engine = OnnxEngine(model_path, intra_op_threads=threads)
+
+    def input_imgsz(self, imgsz: int) -> int:
+        return self.engine.input_shape(imgsz)[0]
+
+    def run(self, frames: list[np.ndarray], imgsz: int, conf: float) -> tuple[list[Detections], dict]:
+        stages = {}
+        start = time.perf_counter()
+        tensor, gains, pads = self.engine.preprocess(frames, imgsz)
+        stages["preprocess"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        output = self.engine.forward(tensor)
+        stages["forward"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        detections = [
+            self.engine.postprocess(output[i], frame.shape, gains[i], pads[i], conf, 0.6, 150)
+            for i, frame in enumerate(frames)
+        ]
+        stages["postprocess"] = time.perf_counter() - start
+        return detections, stages
+
+    def plot(self, frames: list[np.ndarray], detections: list[Detections]):
+        for frame, image_detections in zip(frames, detections):
+            draw_detections(frame, image_detections, self.engine.names)
+
+
+class UltralyticsRunner:
+    """ultralytics.YOLO — .pt на torch или .onnx через обёртку ultralytics"""
+
+    def __init__(self, model_path: str, threads: int):
+        import torch
+        from ultralytics import YOLO
+
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.model = YOLO(model_path, task="detect")
+        if model_path.endswith(".pt"):
+            try:
+                self.model.fuse()
+            except Exception:
+                pass
+
+    def input_imgsz(self, imgsz: int) -> int:
+        return imgsz
+
+    def run(self, frames: list[np.ndarray], imgsz: int, conf: float) -> tuple[list, dict]:
+        results = self.model.predict(frames, imgsz=imgsz, conf=conf, iou=0.6, max_det=150, verbose=False)
+        # ultralytics считает время стадий на изображение, в мс
+        speed = results[0].speed
+        stages = {
+            "preprocess": speed["preprocess"] * len(frames) / 1000,
+            "forward": speed["inference"] * len(frames) / 1000,
+            "postprocess": speed["postprocess"] * len(frames) / 1000,
+        }
+        return results, stages
+
+    def plot(self, frames: list[np.ndarray], results: list):
+        for result in results:
+            result.plot()
+
+
+RUNNERS = {
+    "onnx": OnnxRunner,
+    "int8": OnnxRunner,
+    "ultralytics-onnx": UltralyticsRunner,
+    "pt": UltralyticsRunner,
+}
+
+
+def run_config(config: dict) -> dict:
+    """Один прогон конфигурации; выполняется в отдельном процессе"""
+    frames = read_images(config["images"])
+    runner = RUNNERS[config["backend"]](config["model_path"], config["threads"])
+    batch_size, imgsz, conf = config["batch"], config["imgsz"], config["conf"]
+
+    def next_batch(index: int) -> list[np.ndarray]:
+        start = index * batch_size
+        return [frames[(start + i) % len(frames)] for i in range(batch_size)]
+
+    for index in range(config["warmup"]):
+        runner.run(next_batch(index), imgsz, conf)
+
+    latencies = []
+    stage_totals = dict.fromkeys(STAGES, 0.0)
+    for index in range(config["iterations"]):
+        batch = next_batch(index)
+        start = time.perf_counter()
+        detections, stages = runner.run(batch, imgsz, conf)
+        latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        runner.plot(batch, detections)
+        stages["plot"] = time.perf_counter() - start
+
+        for stage, seconds in stages.items():
+            stage_totals[stage] += seconds
+
+    latencies_ms = np.asarray(latencies) * 1000
+    images = config["iterations"] * batch_size
+    return {
+        "backend": config["backend"],
+        "model": os.path.basename(config["model_path"]),
+        "imgsz": imgsz,
+        "input_imgsz": runner.input_imgsz(imgsz),
+        "batch": batch_size,
+        "threads": config["threads"],
+        "iterations": config["iterations"],
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "mean_ms": float(latencies_ms.mean()),
+        "images_per_s": images / float(np.sum(latencies)),
+        # ru_maxrss в Linux — в КБ
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        **{f"{stage}_ms": stage_totals[stage] * 1000 / images for stage in STAGES},
+    }
+
+
+def host_info() -> dict:
+    import onnxruntime
+
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "onnxruntime": onnxruntime.__version__,
+    }
+
+
+def write_csv(rows: list[dict], path: str):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main():
+    from src.ML.yolo import ONNX_INT8_PATH, ONNX_PATH, PT_PATH
+
+    model_paths = {"onnx": ONNX_PATH, "int8": ONNX_INT8_PATH, "ultralytics-onnx": ONNX_PATH, "pt": PT_PATH}
+
+    parser = argparse.ArgumentParser(description="Бенчмарк инференса по бэкендам, imgsz, батчам и потокам")
+    parser.add_argument("--images", required=True, help="папка с изображениями")
+    parser.add_argument("--limit", type=int, default=64, help="сколько изображений взять из папки")
+    parser.add_argument("--backends", default="onnx", help=f"через запятую: {', '.join(RUNNERS)}")
+    parser.add_argument("--model", help="другой файл модели вместо стандартного для бэкенда")
+    parser.add_argument("--imgsz", type=_int_list, default=[640])
+    parser.add_argument("--batch", type=_int_list, default=[1])
+    parser.add_argument("--threads", type=_int_list, default=[0], help="0 — по умолчанию бэкенда")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--output", help="JSON с результатами")
+    parser.add_argument("--csv", help="CSV с результатами")
+    args = parser.parse_args()
+
+    backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+    unknown = set(backends) - set(RUNNERS)
+    if unknown:
+        parser.error(f"неизвестные бэкенды: {', '.join(sorted(unknown))}")
+
+    images = list_images(args.images, args.limit)
+    rows = []
+    context = mp.get_context("spawn")
+    for backend, imgsz, batch, threads in product(backends, args.imgsz, args.batch, args.threads):
+        config = {
+            "backend": backend,
+            "model_path": args.model or model_paths[backend],
+            "images": images,
+            "imgsz": imgsz,
+            "batch": batch,
+            "threads": threads,
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "conf": args.conf,
+        }
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            try:
+                row = pool.submit(run_config, config).result()
+            except Exception as e:
+                print(f"{backend} imgsz={imgsz} batch={batch} threads={threads}: ошибка {e!r}")
+                continue
+        rows.append(row)
+        print(
+            f"{backend:>16} imgsz={imgsz} batch={batch} threads={threads}: "
+            f"p50 {row['p50_ms']:.1f} мс, p95 {row['p95_ms']:.1f} мс, {row['images_per_s']:.1f} img/s, "
+            f"RSS {row['peak_rss_mb']:.0f} МБ"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"host": host_info(), "results": rows}, f, ensure_ascii=False, indent=2)
+    if args.csv and rows:
+        write_csv(rows, args.csv)
+
+
+if __name__ == "__main__":
+    main()
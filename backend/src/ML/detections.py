@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class Detections:
+    """Детекции одного изображения в координатах исходного кадра"""
+    boxes: np.ndarray       # (N, 4) float32, xyxy
+    scores: np.ndarray      # (N,) float32
+    class_ids: np.ndarray   # (N,) int64, индексы классов модели
+
+    @classmethod
+    def empty(cls) -> "Detections":
+        return cls(
+            boxes=np.zeros((0, 4), dtype=np.float32),
+            scores=np.zeros((0,), dtype=np.float32),
+            class_ids=np.zeros((0,), dtype=np.int64),
+        )
+
+    def __len__(self) -> int:
+        return int(self.class_ids.shape[0])
+
+    def tool_ids(self, class_names: dict) -> list[int]:
+        """Переводит индексы классов в id инструментов (имена классов модели = id в БД)"""
+        return [
+            int(class_names[cls_id])
+            for cls_id in self.class_ids.tolist()
+            if cls_id in class_names
+        ]
+
+    def filter(self, conf: float) -> "Detections":
+        """Оставляет детекции с уверенностью выше conf"""
+        mask = self.scores > conf
+        return Detections(boxes=self.boxes[mask], scores=self.scores[mask], class_ids=self.class_ids[mask])
+
+    def to_dict(self) -> dict:
+        return {
+            "boxes": self.boxes.tolist(),
+            "scores": self.scores.tolist(),
+            "class_ids": self.class_ids.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Detections":
+        return cls(
+            boxes=np.asarray(data["boxes"], dtype=np.float32).reshape(-1, 4),
+            scores=np.asarray(data["scores"], dtype=np.float32),
+            class_ids=np.asarray(data["class_ids"], dtype=np.int64),
+        )
@@ -0,0 +1,180 @@
+import ast
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+from src.ML.detections import Detections
+
+
+LETTERBOX_COLOR = (114, 114, 114)
+MAX_NMS_CANDIDATES = 30000   # как в ultralytics: ограничение кандидатов перед NMS
+MAX_WH = 7680                # смещение боксов по классу для class-aware NMS
+
+
+def letterbox(image: np.ndarray, new_shape: tuple[int, int]) -> tuple[np.ndarray, float, tuple[float, float]]:
+    """
+    Масштабирует кадр с сохранением пропорций и добивает паддингом до new_shape (h, w).
+    Возвращает кадр, коэффициент масштаба и паддинг (pad_w, pad_h).
+    """
+    h, w = image.shape[:2]
+    new_h, new_w = new_shape
+    gain = min(new_h / h, new_w / w)
+    resized_w, resized_h = int(round(w * gain)), int(round(h * gain))
+
+    if (resized_w, resized_h) != (w, h):
+        image = cv2.resize(image, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR)
+
+    pad_w = (new_w - resized_w) / 2
+    pad_h = (new_h - resized_h) / 2
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+    return image, gain, (left, top)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float, max_det: int) -> np.ndarray:
+    """Жадный NMS, IoU считается векторно против всех оставшихся кандидатов"""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0 and len(keep) < max_det:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        if rest.size == 0:
+            break
+
+        inter_w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        inter_h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = inter_w * inter_h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-7)
+        order = rest[iou <= iou_threshold]
+
+    return np.asarray(keep, dtype=np.int64)
+
+
+class OnnxEngine:
+    """Инференс best.onnx напрямую через onnxruntime, без ultralytics и torch"""
+
+    def __init__(self, model_path: str, intra_op_threads: int = 0):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+
+        self.model_path = model_path
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_dtype = np.float16 if model_input.type == "tensor(float16)" else np.float32
+
+        # Статический экспорт (dynamic=False) фиксирует размер батча и входа
+        batch, _, height, width = model_input.shape
+        self.fixed_batch = batch if isinstance(batch, int) else None
+        self.fixed_imgsz = (height, width) if isinstance(height, int) and isinstance(width, int) else None
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+
+    def input_shape(self, imgsz: int) -> tuple[int, int]:
+        """Размер входа сети: для статического экспорта imgsz игнорируется"""
+        return self.fixed_imgsz or (imgsz, imgsz)
+
+    def preprocess(self, images: list[np.ndarray], imgsz: int):
+        """Letterbox + BGR->RGB, HWC->CHW, нормализация; все кадры собираются в один тензор"""
+        shape = self.input_shape(imgsz)
+        letterboxed, gains, pads = [], [], []
+        for image in images:
+            lb, gain, pad = letterbox(image, shape)
+            letterboxed.append(lb)
+            gains.append(gain)
+            pads.append(pad)
+
+        batch = np.stack(letterboxed)[..., ::-1].transpose(0, 3, 1, 2)
+        tensor = np.ascontiguousarray(batch, dtype=self.input_dtype)
+        tensor *= self.input_dtype(1 / 255.0)
+        return tensor, gains, pads
+
+    def forward(self, tensor: np.ndarray) -> np.ndarray:
+        """Прогон тензора; при статическом батче режем его на куски нужного размера"""
+        if self.fixed_batch is None or self.fixed_batch == tensor.shape[0]:
+            return self.session.run(None, {self.input_name: tensor})[0]
+
+        count = tensor.shape[0]
+        outputs = []
+        for start in range(0, count, self.fixed_batch):
+            part = tensor[start:start + self.fixed_batch]
+            if part.shape[0] < self.fixed_batch:
+                padding = np.zeros((self.fixed_batch - part.shape[0], *part.shape[1:]), dtype=part.dtype)
+                part = np.concatenate([part, padding])
+            outputs.append(self.session.run(None, {self.input_name: part})[0])
+        return np.concatenate(outputs)[:count]
+
+    def postprocess(
+        self,
+        output: np.ndarray,
+        image_shape: tuple[int, ...],
+        gain: float,
+        pad: tuple[float, float],
+        conf: float,
+        iou: float,
+        max_det: int,
+    ) -> Detections:
+        """Фильтр по уверенности, class-aware NMS и перевод боксов в координаты исходного кадра"""
+        # YOLOv8/11 отдаёт (4 + nc, anchors) — переводим в (anchors, 4 + nc)
+        if output.shape[0] < output.shape[1]:
+            output = output.T
+
+        class_scores = output[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(class_scores.shape[0]), class_ids]
+
+        mask = scores > conf
+        if not mask.any():
+            return Detections.empty()
+
+        xywh, scores, class_ids = output[mask, :4], scores[mask], class_ids[mask]
+        if scores.shape[0] > MAX_NMS_CANDIDATES:
+            top = scores.argsort()[::-1][:MAX_NMS_CANDIDATES]
+            xywh, scores, class_ids = xywh[top], scores[top], class_ids[top]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+
+        keep = nms(boxes + (class_ids * MAX_WH)[:, None], scores, iou, max_det)
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+        boxes[:, [0, 2]] -= pad[0]
+        boxes[:, [1, 3]] -= pad[1]
+        boxes /= gain
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, image_shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, image_shape[0])
+
+        return Detections(
+            boxes=boxes.astype(np.float32),
+            scores=scores.astype(np.float32),
+            class_ids=class_ids.astype(np.int64),
+        )
+
+    def predict(
+        self,
+        images: list[np.ndarray],
+        conf: float = 0.25,
+        iou: float = 0.7,
+        imgsz: int = 640,
+        max_det: int = 300,
+    ) -> list[Detections]:
+        """Детекция на списке BGR-кадров"""
+        tensor, gains, pads = self.preprocess(images, imgsz)
+        output = self.forward(tensor)
+
+        return [
+            self.postprocess(output[i], image.shape, gains[i], pads[i], conf, iou, max_det)
+            for i, image in enumerate(images)
+        ]
+
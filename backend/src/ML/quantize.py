@@ -0,0 +1,279 @@
+"""
+Квантизация best.onnx в INT8 и сравнение с FP32-моделью.
+
+    python -m src.ML.quantize --calib-dir data/calib --eval-dir data/val --report int8_report.json
+
+Калибровка (static) идёт по локальным изображениям из --calib-dir. Отчёт содержит задержку обеих
+моделей и согласие детекций: precision/recall INT8 по каждому классу относительно выхода FP32
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+import onnx
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+from src.ML.benchmark import list_images
+from src.ML.detections import Detections
+from src.ML.onnx_engine import OnnxEngine
+from src.ML.yolo import ONNX_INT8_PATH, ONNX_PATH, load_image
+
+CALIBRATION_METHODS = {
+    "minmax": CalibrationMethod.MinMax,
+    "entropy": CalibrationMethod.Entropy,
+    "percentile": CalibrationMethod.Percentile,
+}
+
+
+class ImageCalibrationReader(CalibrationDataReader):
+    """Отдаёт калибровочные кадры с тем же препроцессингом, что и в проде"""
+
+    def __init__(self, engine: OnnxEngine, paths: list[str], imgsz: int = 640):
+        self.engine = engine
+        self.imgsz = imgsz
+        self._paths = iter(paths)
+
+    def get_next(self) -> dict | None:
+        path = next(self._paths, None)
+        if path is None:
+            return None
+        tensor, _, _ = self.engine.preprocess([load_image(path)], self.imgsz)
+        if self.engine.fixed_batch and self.engine.fixed_batch > 1:
+            tensor = np.repeat(tensor, self.engine.fixed_batch, axis=0)
+        return {self.engine.input_name: tensor}
+
+
+def quantize(
+    model_path: str,
+    output_path: str,
+    calib_paths: list[str] | None = None,
+    mode: str = "static",
+    imgsz: int = 640,
+    calibrate_method: str = "minmax",
+    exclude_nodes: list[str] | None = None,
+) -> str:
+    """
+    static — веса и активации в INT8 (QDQ), нужна калибровка;
+    dynamic — только веса, активации квантуются на лету
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        prepared = os.path.join(tmp, "prepared.onnx")
+        quant_pre_process(model_path, prepared)
+
+        if mode == "dynamic":
+            quantize_dynamic(prepared, output_path, weight_type=QuantType.QUInt8)
+        elif mode == "static":
+            if not calib_paths:
+                raise ValueError("Для static-квантизации нужны калибровочные изображения")
+            engine = OnnxEngine(model_path)
+            quantize_static(
+                prepared,
+                output_path,
+                ImageCalibrationReader(engine, calib_paths, imgsz),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True,
+                calibrate_method=CALIBRATION_METHODS[calibrate_method],
+                nodes_to_exclude=exclude_nodes or [],
+            )
+        else:
+            raise ValueError(f"Неизвестный режим квантизации: {mode}")
+
+    _copy_metadata(model_path, output_path)
+    return output_path
+
+
+def _copy_metadata(source_path: str, target_path: str):
+    """Имена классов лежат в metadata_props, OnnxEngine читает их оттуда"""
+    source = onnx.load(source_path, load_external_data=False)
+    target = onnx.load(target_path)
+    existing = {prop.key for prop in target.metadata_props}
+    for prop in source.metadata_props:
+        if prop.key not in existing:
+            target.metadata_props.append(prop)
+    onnx.save(target, target_path)
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU всех пар боксов xyxy: (N, 4) x (M, 4) -> (N, M)"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = (bottom_right - top_left).clip(0).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).clip(0).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).clip(0).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-7)
+
+
+def match_detections(reference: Detections, candidate: Detections, iou_threshold: float = 0.5):
+    """
+    Жадное сопоставление детекций кандидата с эталоном того же класса.
+    Возвращает счётчики tp, fp, fn по индексам классов
+    """
+    tp, fp, fn = Counter(), Counter(), Counter()
+    ious = box_iou(candidate.boxes, reference.boxes) if len(candidate) and len(reference) else None
+    matched = np.zeros(len(reference), dtype=bool)
+
+    for i in np.argsort(-candidate.scores):
+        cls_id = int(candidate.class_ids[i])
+        best = -1
+        if ious is not None:
+            row = np.where((reference.class_ids == cls_id) & ~matched, ious[i], 0.0)
+            if row.size and row.max() >= iou_threshold:
+                best = int(row.argmax())
+        if best >= 0:
+            matched[best] = True
+            tp[cls_id] += 1
+        else:
+            fp[cls_id] += 1
+
+    for cls_id in reference.class_ids[~matched].tolist():
+        fn[cls_id] += 1
+    return tp, fp, fn
+
+
+def _latency_stats(times_ms: list[float]) -> dict:
+    values = np.asarray(times_ms)
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+    }
+
+
+def compare(
+    fp32_path: str,
+    int8_path: str,
+    image_paths: list[str],
+    conf: float = 0.25,
+    iou: float = 0.6,
+    imgsz: int = 640,
+    match_iou: float = 0.5,
+    threads: int = 0,
+) -> dict:
+    """Задержка обеих моделей и precision/recall INT8 относительно FP32 по классам"""
+    engines = {
+        "fp32": OnnxEngine(fp32_path, intra_op_threads=threads),
+        "int8": OnnxEngine(int8_path, intra_op_threads=threads),
+    }
+    images = [load_image(path) for path in image_paths]
+    outputs: dict[str, list[Detections]] = {}
+    latency: dict[str, dict] = {}
+
+    for name, engine in engines.items():
+        engine.predict(images[:1], conf=conf, iou=iou, imgsz=imgsz)  # прогрев
+        times, detections = [], []
+        for image in images:
+            start = time.perf_counter()
+            detections.extend(engine.predict([image], conf=conf, iou=iou, imgsz=imgsz))
+            times.append((time.perf_counter() - start) * 1000)
+        outputs[name] = detections
+        latency[name] = _latency_stats(times)
+
+    tp, fp, fn = Counter(), Counter(), Counter()
+    for reference, candidate in zip(outputs["fp32"], outputs["int8"]):
+        image_tp, image_fp, image_fn = match_detections(reference, candidate, match_iou)
+        tp.update(image_tp)
+        fp.update(image_fp)
+        fn.update(image_fn)
+
+    names = engines["fp32"].names
+    per_class = {}
+    for cls_id in sorted(set(tp) | set(fp) | set(fn)):
+        per_class[str(names.get(cls_id, cls_id))] = _agreement(tp[cls_id], fp[cls_id], fn[cls_id])
+
+    return {
+        "images": len(images),
+        "conf": conf,
+        "iou": iou,
+        "match_iou": match_iou,
+        "model_size_mb": {
+            "fp32": os.path.getsize(fp32_path) / 2**20,
+            "int8": os.path.getsize(int8_path) / 2**20,
+        },
+        "latency": latency,
+        "speedup": latency["fp32"]["mean_ms"] / latency["int8"]["mean_ms"],
+        "overall": _agreement(sum(tp.values()), sum(fp.values()), sum(fn.values())),
+        "per_class": per_class,
+    }
+
+
+def _agreement(tp: int, fp: int, fn: int) -> dict:
+    return {
+        "tp": tp,
+        "fp": fp,
+        "fn": fn,
+        "precision": tp / (tp + fp) if tp + fp else 1.0,
+        "recall": tp / (tp + fn) if tp + fn else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8-квантизация best.onnx и сравнение с FP32")
+    parser.add_argument("--model", default=ONNX_PATH, help="FP32 ONNX модель")
+    parser.add_argument("--output", default=ONNX_INT8_PATH, help="куда сохранить INT8 модель")
+    parser.add_argument("--calib-dir", help="папка с калибровочными изображениями")
+    parser.add_argument("--calib-limit", type=int, default=200, help="максимум калибровочных изображений")
+    parser.add_argument("--mode", choices=("static", "dynamic"), default="static")
+    parser.add_argument("--calibrate-method", choices=tuple(CALIBRATION_METHODS), default="minmax")
+    parser.add_argument("--exclude-nodes", default="", help="узлы графа без квантизации, через запятую")
+    parser.add_argument("--eval-dir", help="папка для сравнения с FP32 (по умолчанию --calib-dir)")
+    parser.add_argument("--compare-only", action="store_true", help="не квантовать, сравнить готовую --output")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--iou", type=float, default=0.6)
+    parser.add_argument("--match-iou", type=float, default=0.5)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--report", help="сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    if not args.compare_only:
+        calib_paths = list_images(args.calib_dir, args.calib_limit) if args.calib_dir else None
+        start = time.perf_counter()
+        quantize(
+            args.model,
+            args.output,
+            calib_paths,
+            mode=args.mode,
+            imgsz=args.imgsz,
+            calibrate_method=args.calibrate_method,
+            exclude_nodes=[node for node in args.exclude_nodes.split(",") if node],
+        )
+        print(f"INT8 модель сохранена: {args.output} ({time.perf_counter() - start:.1f} с)")
+
+    eval_dir = args.eval_dir or args.calib_dir
+    if not eval_dir:
+        return
+
+    report = compare(
+        args.model,
+        args.output,
+        list_images(eval_dir),
+        conf=args.conf,
+        iou=args.iou,
+        imgsz=args.imgsz,
+        match_iou=args.match_iou,
+        threads=args.threads,
+    )
+    report["mode"] = "compare-only" if args.compare_only else args.mode
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Отрисовка детекций примитивами cv2 (без аннотатора ultralytics и загрузки шрифтов) и кодирование
+результата: кадр при необходимости уменьшается до отрисовки, формат и качество задаются параметрами
+"""
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+from src.ML.detections import Detections
+
+# формат -> (расширение файла, флаг качества cv2.imencode)
+FORMATS = {
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+# шрифты Hershey в cv2 умеют только ASCII, поэтому названия инструментов транслитерируются
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z", "и": "i",
+    "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t",
+    "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y", "ь": "",
+    "э": "e", "ю": "yu", "я": "ya", "«": '"', "»": '"', "—": "-", "–": "-", "⁄": "/", "№": "N",
+})
+
+
+def ascii_label(text: str) -> str:
+    """Подпись, которую может нарисовать cv2.putText: кириллица транслитерируется, прочее — '?'"""
+    translated = "".join(
+        char.lower().translate(_TRANSLIT).capitalize() if char.isupper() else char.translate(_TRANSLIT)
+        for char in text
+    )
+    return translated.encode("ascii", "replace").decode("ascii")
+
+
+def tool_labels(class_names: dict, tool_names: dict[int, str]) -> dict[int, str]:
+    """
+    Подписи классов модели по справочнику инструментов: имя класса модели — id инструмента.
+    Классы, которых нет в справочнике, подписываются своим именем
+    """
+    labels = {}
+    for class_id, name in class_names.items():
+        try:
+            label = tool_names.get(int(name), name)
+        except (TypeError, ValueError):
+            label = name
+        labels[class_id] = ascii_label(str(label))
+    return labels
+
+
+@lru_cache(maxsize=1024)
+def _color(class_id: int) -> tuple[int, int, int]:
+    """Стабильный цвет для класса"""
+    rng = np.random.default_rng(class_id)
+    return tuple(int(c) for c in rng.integers(64, 256, size=3))
+
+
+def draw_detections(
+    image: np.ndarray,
+    detections: Detections,
+    class_names: dict,
+    copy: bool = True,
+) -> np.ndarray:
+    """Рисует боксы и подписи классов поверх кадра (по умолчанию — поверх копии)"""
+    canvas = image.copy() if copy else image
+    thickness = max(round(sum(canvas.shape[:2]) / 2 * 0.003), 2)
+    font_scale = thickness / 3
+    text_thickness = max(thickness - 1, 1)
+
+    for box, score, class_id in zip(
+        detections.boxes.astype(int).tolist(),
+        detections.scores.tolist(),
+        detections.class_ids.tolist(),
+    ):
+        x1, y1, x2, y2 = box
+        color = _color(class_id)
+        cv2.rectangle(canvas, (x1, y1), (x2, y2), color, thickness)
+
+        label = f"{class_names.get(class_id, class_id)} {score:.2f}"
+        (text_w, text_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, text_thickness)
+        text_top = y1 - text_h - 3 if y1 - text_h - 3 >= 0 else y1 + text_h + 3
+        cv2.rectangle(canvas, (x1, y1), (x1 + text_w, text_top), color, -1)
+        cv2.putText(
+            canvas,
+            label,
+            (x1, y1 - 2 if text_top < y1 else y1 + text_h + 2),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            font_scale,
+            (255, 255, 255),
+            text_thickness,
+            lineType=cv2.LINE_AA,
+        )
+
+    return canvas
+
+
+def downscale(image: np.ndarray, detections: Detections, max_side: int) -> tuple[np.ndarray, Detections, bool]:
+    """Уменьшает кадр до max_side по большей стороне вместе с боксами; третье значение — был ли кадр уменьшен"""
+    height, width = image.shape[:2]
+    if max_side <= 0 or max(height, width) <= max_side:
+        return image, detections, False
+    scale = max_side / max(height, width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    # INTER_AREA с целым коэффициентом идёт быстрым путём; остаток (меньше 2x) — линейной интерполяцией.
+    # Для 12 Мп кадра это в разы быстрее INTER_AREA сразу до итогового размера
+    resized = image
+    factor = int(1 / scale)
+    if factor >= 2:
+        resized = cv2.resize(image, None, fx=1 / factor, fy=1 / factor, interpolation=cv2.INTER_AREA)
+    if resized.shape[1::-1] != size:
+        resized = cv2.resize(resized, size, interpolation=cv2.INTER_LINEAR)
+    scaled = Detections(
+        boxes=detections.boxes * np.float32(scale),
+        scores=detections.scores,
+        class_ids=detections.class_ids,
+    )
+    return resized, scaled, True
+
+
+def encode_image(image: np.ndarray, fmt: str = "jpeg", quality: int = 95) -> bytes:
+    if fmt not in FORMATS:
+        raise ValueError(f"Формат должен быть одним из {tuple(FORMATS)}, получено {fmt!r}")
+    extension, quality_flag = FORMATS[fmt]
+    ok, buffer = cv2.imencode(extension, image, [quality_flag, int(quality)])
+    if not ok:
+        raise ValueError(f"Не удалось закодировать изображение в {fmt}")
+    return buffer.tobytes()
+
+
+def render_image(
+    image: np.ndarray,
+    detections: Detections,
+    class_names: dict,
+    max_side: int = 0,
+    fmt: str = "jpeg",
+    quality: int = 95,
+) -> bytes:
+    """
+    Кадр с разметкой в байтах файла. Уменьшение идёт до отрисовки: рисовать и кодировать
+    приходится меньше пикселей, а толщина линий и шрифт считаются уже от итогового размера.
+    Уменьшенный кадр — свой массив, его можно размечать без копии
+    """
+    image, detections, resized = downscale(image, detections, max_side)
+    return encode_image(draw_detections(image, detections, class_names, copy=not resized), fmt, quality)
+
+
+def format_for_path(path: str) -> str:
+    """Формат по расширению файла (по умолчанию jpeg)"""
+    lowered = path.lower()
+    return next((fmt for fmt, (extension, _) in FORMATS.items() if lowered.endswith(extension)), "jpeg")
@@ -0,0 +1,158 @@
+"""
+Бенчмарк отрисовки результатов: ultralytics r.plot() + cv2.imwrite (как в run_inference раньше)
+против своего рендера (src.ML.render) в разных форматах, качестве и с уменьшением.
+
+    python -m src.ML.render_benchmark --images data/val --variants jpeg:95,jpeg:85,webp:80 --max-side 0,1920,1280 \
+        --output render_bench.json --csv render_bench.csv
+
+Детекции считаются один раз, дальше замеряется только отрисовка и кодирование каждого изображения.
+Если установлен ultralytics, детекции берутся из его Results, чтобы обе отрисовки рисовали одно и то же,
+иначе — из onnxruntime (тогда строки r.plot() в отчёте нет). Для каждого варианта: среднее время
+отрисовки и кодирования на изображение, p95, средний размер файла и отношение к r.plot()
+"""
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from src.ML.benchmark import host_info, list_images, read_images, write_csv
+from src.ML.detections import Detections
+from src.ML.render import FORMATS, downscale, draw_detections, encode_image, tool_labels
+
+
+def _ultralytics_results(model_path: str, frames: list[np.ndarray], imgsz: int, conf: float) -> list | None:
+    try:
+        from ultralytics import YOLO
+    except ImportError:
+        print("ultralytics не установлен: сравнение с r.plot() пропущено")
+        return None
+    model = YOLO(model_path, task="detect")
+    return [model.predict(frame, imgsz=imgsz, conf=conf, iou=0.6, max_det=150, verbose=False)[0] for frame in frames]
+
+
+def _onnx_detections(frames: list[np.ndarray], imgsz: int, conf: float) -> tuple[list[Detections], dict]:
+    from src.ML.yolo import detect, get_class_names
+
+    return [detect([frame], model_conf=conf, imgsz=imgsz)[0][0] for frame in frames], get_class_names()
+
+
+def _measure(render, items: list, repeat: int) -> dict:
+    """render(item) -> (время отрисовки, время кодирования, байты)"""
+    draw_times, encode_times, sizes = [], [], []
+    for _ in range(repeat):
+        for item in items:
+            draw_s, encode_s, size = render(item)
+            draw_times.append(draw_s)
+            encode_times.append(encode_s)
+            sizes.append(size)
+    total_ms = (np.asarray(draw_times) + np.asarray(encode_times)) * 1000
+    return {
+        "draw_ms": float(np.mean(draw_times) * 1000),
+        "encode_ms": float(np.mean(encode_times) * 1000),
+        "total_ms": float(total_ms.mean()),
+        "p95_ms": float(np.percentile(total_ms, 95)),
+        "mean_kb": float(np.mean(sizes) / 1024),
+    }
+
+
+def _plot_render(result) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    plotted = result.plot()
+    drawn = time.perf_counter()
+    # cv2.imwrite с параметрами по умолчанию (JPEG 95), без записи на диск
+    ok, buffer = cv2.imencode(".jpg", plotted)
+    return drawn - start, time.perf_counter() - drawn, buffer.size
+
+
+def _own_render(labels: dict, fmt: str, quality: int, max_side: int):
+    def render(item: tuple[np.ndarray, Detections]) -> tuple[float, float, int]:
+        frame, detections = item
+        start = time.perf_counter()
+        image, scaled, resized = downscale(frame, detections, max_side)
+        canvas = draw_detections(image, scaled, labels, copy=not resized)
+        drawn = time.perf_counter()
+        content = encode_image(canvas, fmt, quality)
+        return drawn - start, time.perf_counter() - drawn, len(content)
+
+    return render
+
+
+def _variants(value: str) -> list[tuple[str, int]]:
+    variants = []
+    for item in value.split(","):
+        fmt, _, quality = item.strip().partition(":")
+        if fmt not in FORMATS:
+            raise argparse.ArgumentTypeError(f"формат должен быть одним из {tuple(FORMATS)}: {item}")
+        variants.append((fmt, int(quality or 90)))
+    return variants
+
+
+def main():
+    from src.ML.yolo import ONNX_PATH, PT_PATH
+
+    parser = argparse.ArgumentParser(description="Сравнение отрисовки результатов с ultralytics r.plot()")
+    parser.add_argument("--images", required=True, help="папка с изображениями")
+    parser.add_argument("--limit", type=int, default=32, help="сколько изображений взять из папки")
+    parser.add_argument("--model", help="модель для детекций (по умолчанию best.pt, если есть, иначе best.onnx)")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--variants", type=_variants, default=_variants("jpeg:95,jpeg:85,webp:80"),
+                        help="формат:качество через запятую")
+    parser.add_argument("--max-side", default="0,1920,1280", help="уменьшение по большей стороне, 0 — без него")
+    parser.add_argument("--repeat", type=int, default=3, help="сколько раз прогнать каждое изображение")
+    parser.add_argument("--tool-names", help="JSON {id инструмента: название} для подписей (по умолчанию — id)")
+    parser.add_argument("--output", help="JSON с результатами")
+    parser.add_argument("--csv", help="CSV с результатами")
+    args = parser.parse_args()
+
+    frames = read_images(list_images(args.images, args.limit))
+    model_path = args.model or (PT_PATH if os.path.exists(PT_PATH) else ONNX_PATH)
+    results = _ultralytics_results(model_path, frames, args.imgsz, args.conf)
+    if results is not None:
+        from src.ML.yolo import _results_to_detections
+
+        detections = [_results_to_detections(result) for result in results]
+        class_names = results[0].names
+    else:
+        detections, class_names = _onnx_detections(frames, args.imgsz, args.conf)
+
+    tool_names = {}
+    if args.tool_names:
+        with open(args.tool_names, encoding="utf-8") as f:
+            tool_names = {int(key): value for key, value in json.load(f).items()}
+    labels = tool_labels(class_names, tool_names)
+
+    rows = []
+    if results is not None:
+        rows.append({"renderer": "ultralytics r.plot()", "format": "jpeg", "quality": 95, "max_side": 0,
+                     **_measure(_plot_render, results, args.repeat)})
+    items = list(zip(frames, detections))
+    for fmt, quality in args.variants:
+        for max_side in (int(side) for side in args.max_side.split(",") if side.strip()):
+            rows.append({"renderer": "src.ML.render", "format": fmt, "quality": quality, "max_side": max_side,
+                         **_measure(_own_render(labels, fmt, quality, max_side), items, args.repeat)})
+
+    baseline = rows[0] if results is not None else None
+    for row in rows:
+        if baseline is not None:
+            row["speedup"] = baseline["total_ms"] / row["total_ms"]
+            row["size_ratio"] = row["mean_kb"] / baseline["mean_kb"]
+        print(
+            f"{row['renderer']:>20} {row['format']:>4}:{row['quality']:<3} max_side={row['max_side']:<5} "
+            f"draw {row['draw_ms']:.1f} мс + encode {row['encode_ms']:.1f} мс = {row['total_ms']:.1f} мс "
+            f"(p95 {row['p95_ms']:.1f}), {row['mean_kb']:.0f} КБ"
+            + (f", x{row['speedup']:.1f} быстрее, {row['size_ratio']:.0%} размера" if baseline is not None else "")
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"host": host_info(), "images": len(frames), "results": rows}, f, ensure_ascii=False, indent=2)
+    if args.csv and rows:
+        write_csv(rows, args.csv)
+
+
+if __name__ == "__main__":
+    main()
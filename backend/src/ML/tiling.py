@@ -0,0 +1,100 @@
+"""
+Тайловый инференс для фото высокого разрешения: кадр режется на перекрывающиеся тайлы,
+каждый из которых модель видит в своём imgsz, а детекции тайлов собираются обратно
+в координаты кадра с подавлением дублей на стыках
+"""
+import math
+
+import numpy as np
+
+from src.ML.detections import Detections
+
+
+def tile_grid(height: int, width: int, tile_size: int, overlap: float, max_tiles: int) -> np.ndarray:
+    """
+    Окна тайлов (x1, y1, x2, y2). Крайние тайлы прижимаются к границе кадра.
+    Если сетка выходит больше max_tiles, тайлы увеличиваются, пока она не уложится в лимит:
+    вычисления ограничены, а выигрыш в разрешении остаётся максимально возможным
+    """
+    tile = max(tile_size, 1)
+    while True:
+        stride = max(int(tile * (1 - overlap)), 1)
+        cols = 1 if width <= tile else math.ceil((width - tile) / stride) + 1
+        rows = 1 if height <= tile else math.ceil((height - tile) / stride) + 1
+        if rows * cols <= max(max_tiles, 1):
+            break
+        tile = int(tile * 1.1) + 1
+
+    xs = np.minimum(np.arange(cols) * stride, max(width - tile, 0))
+    ys = np.minimum(np.arange(rows) * stride, max(height - tile, 0))
+    x1, y1 = np.meshgrid(xs, ys)
+    x1, y1 = x1.ravel(), y1.ravel()
+    return np.stack([x1, y1, np.minimum(x1 + tile, width), np.minimum(y1 + tile, height)], axis=1)
+
+
+def fuse_boxes(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    class_ids: np.ndarray,
+    threshold: float,
+    max_det: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Жадное слияние дублей одного класса с разных тайлов. Перекрытие считается как
+    площадь пересечения к площади меньшего бокса (IoS): обрезанный краем тайла бокс почти целиком
+    лежит внутри полного, хотя IoU у них маленький. Оставшийся бокс расширяется до объединения
+    слитых с ним. Возвращает индексы оставленных боксов и итоговые боксы
+    """
+    # смещение по классу: боксы разных классов не пересекаются
+    shifted = boxes + (class_ids * (float(boxes.max()) + 1.0))[:, None]
+    x1, y1, x2, y2 = shifted[:, 0], shifted[:, 1], shifted[:, 2], shifted[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+
+    keep, fused = [], []
+    while order.size > 0 and len(keep) < max_det:
+        i, rest = order[0], order[1:]
+        inter_w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        inter_h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        ios = inter_w * inter_h / (np.minimum(areas[i], areas[rest]) + 1e-7)
+        duplicate = ios > threshold
+
+        members = np.concatenate(([i], rest[duplicate]))
+        keep.append(i)
+        fused.append([
+            boxes[members, 0].min(), boxes[members, 1].min(), boxes[members, 2].max(), boxes[members, 3].max()
+        ])
+        order = rest[~duplicate]
+
+    return np.asarray(keep, dtype=np.int64), np.asarray(fused, dtype=np.float32).reshape(-1, 4)
+
+
+def merge_tiles(
+    detections: list[Detections],
+    owners: list[int],
+    offsets: list[tuple[int, int]],
+    num_images: int,
+    threshold: float,
+    max_det: int = 150,
+) -> list[Detections]:
+    """Детекции тайлов (в координатах тайла) -> детекции каждого кадра после слияния дублей"""
+    owners_array = np.asarray(owners, dtype=np.int64)
+    counts = np.fromiter((len(part) for part in detections), dtype=np.int64, count=len(detections))
+    if not counts.sum():
+        return [Detections.empty() for _ in range(num_images)]
+
+    shifts = np.repeat(np.tile(np.asarray(offsets, dtype=np.float32), 2), counts, axis=0)
+    boxes = np.concatenate([part.boxes for part in detections]) + shifts
+    scores = np.concatenate([part.scores for part in detections])
+    class_ids = np.concatenate([part.class_ids for part in detections])
+    image_ids = np.repeat(owners_array, counts)
+
+    merged = []
+    for index in range(num_images):
+        mask = image_ids == index
+        if not mask.any():
+            merged.append(Detections.empty())
+            continue
+        keep, fused = fuse_boxes(boxes[mask], scores[mask], class_ids[mask], threshold, max_det)
+        merged.append(Detections(boxes=fused, scores=scores[mask][keep], class_ids=class_ids[mask][keep]))
+    return merged
@@ -0,0 +1,282 @@
+import asyncio
+import itertools
+import math
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.ML.detections import Detections
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Подключение к существующему сегменту; владелец сегмента — родительский процесс"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # python < 3.13
+        return shared_memory.SharedMemory(name=name)
+
+
+def pack_detections(detections: Detections) -> np.ndarray:
+    """Детекции одним массивом (N, 6): x1, y1, x2, y2, score, class_id"""
+    return np.concatenate(
+        [detections.boxes, detections.scores[:, None], detections.class_ids[:, None].astype(np.float32)],
+        axis=1,
+    ).astype(np.float32, copy=False)
+
+
+def unpack_detections(packed: np.ndarray) -> Detections:
+    return Detections(
+        boxes=np.ascontiguousarray(packed[:, :4]),
+        scores=np.ascontiguousarray(packed[:, 4]),
+        class_ids=packed[:, 5].astype(np.int64),
+    )
+
+
+def _worker_main(
+    worker_id: int,
+    intra_op_threads: int,
+    warmup_batch_sizes: list[int] | None,
+    warmup_imgsz: list[int] | None,
+    tasks: mp.Queue,
+    results: mp.Queue,
+):
+    """Процесс-воркер: один раз загружает и прогревает модель, затем обрабатывает кадры из shared memory"""
+    # ORT_THREADS, унаследованный от API (из .env), рассчитан на весь хост: воркеру достаётся только его доля
+    if intra_op_threads > 0:
+        os.environ["ORT_THREADS"] = str(intra_op_threads)
+
+    from src.ML import yolo
+
+    if intra_op_threads > 0 and not yolo.USE_ORT:
+        import torch
+
+        torch.set_num_threads(intra_op_threads)
+
+    try:
+        warmup_time = yolo.warmup(warmup_batch_sizes, warmup_imgsz)
+        class_names = yolo.get_class_names()
+        fixed_imgsz = yolo.get_fixed_imgsz()
+    except Exception as e:
+        results.put(("failed", worker_id, repr(e)))
+        return
+    results.put(("ready", worker_id, class_names, warmup_time, fixed_imgsz))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        task_id, shm_name, shapes, params = task
+        shm, frames = None, []
+        try:
+            shm = _attach(shm_name)
+            offset = 0
+            for shape in shapes:
+                frames.append(np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset))
+                offset += math.prod(shape)
+
+            detections, dt = yolo.detect(frames, **params)
+            results.put(("done", worker_id, task_id, [pack_detections(d) for d in detections], dt))
+        except Exception as e:
+            results.put(("error", worker_id, task_id, repr(e)))
+        finally:
+            frames.clear()  # views на буфер должны умереть до close()
+            if shm is not None:
+                shm.close()
+
+
+class InferenceWorkerPool:
+    """
+    Пул процессов с моделью. Кадры передаются через multiprocessing.shared_memory,
+    обратно приходят компактные массивы детекций
+    """
+
+    def __init__(
+        self,
+        num_workers: int,
+        threads_per_worker: int = 0,
+        warmup_batch_sizes: list[int] | None = None,
+        warmup_imgsz: list[int] | None = None,
+    ):
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+        self.warmup_batch_sizes = warmup_batch_sizes
+        self.warmup_imgsz = warmup_imgsz
+        self._ctx = mp.get_context("spawn")
+        self._results = None
+        self._processes: list = [None] * num_workers
+        self._task_queues: list = [None] * num_workers
+        self._in_flight: list[dict[int, tuple[Future, shared_memory.SharedMemory]]] = [{} for _ in range(num_workers)]
+        self._task_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._listener: threading.Thread | None = None
+        self._stopping = False
+        self.class_names: dict | None = None
+        self.fixed_imgsz: tuple[int, int] | None = None
+        self.warmup_times: list[float | None] = [None] * num_workers
+        self._completed = 0
+        self._failed = 0
+        self._restarts = 0
+
+    def _spawn(self, worker_id: int):
+        tasks = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.threads_per_worker, self.warmup_batch_sizes, self.warmup_imgsz, tasks, self._results),
+            name=f"inference-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._task_queues[worker_id] = tasks
+        self._processes[worker_id] = process
+
+    def start(self, timeout: float = 600.0):
+        """Запускает воркеры и блокируется, пока все не загрузят и не прогреют модель"""
+        self._results = self._ctx.Queue()
+        for worker_id in range(self.num_workers):
+            self._spawn(worker_id)
+
+        ready = 0
+        deadline = time.monotonic() + timeout
+        while ready < self.num_workers:
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                dead = [p.name for p in self._processes if not p.is_alive()]
+                if dead or time.monotonic() > deadline:
+                    self.shutdown()
+                    raise RuntimeError(f"Воркеры инференса не запустились: {', '.join(dead) or 'таймаут'}")
+                continue
+            if message[0] == "failed":
+                self.shutdown()
+                raise RuntimeError(f"Воркер инференса {message[1]} не загрузил модель: {message[2]}")
+            if message[0] == "ready":
+                self.class_names = message[2]
+                self.warmup_times[message[1]] = message[3]
+                self.fixed_imgsz = message[4]
+                ready += 1
+
+        self._listener = threading.Thread(target=self._listen, name="inference-pool-listener", daemon=True)
+        self._listener.start()
+
+    def shutdown(self):
+        self._stopping = True
+        for tasks in self._task_queues:
+            if tasks is not None:
+                tasks.put(None)
+        for process in self._processes:
+            if process is not None:
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+        for worker_id in range(self.num_workers):
+            self._fail_in_flight(worker_id, RuntimeError("Пул инференса остановлен"))
+
+    def submit(self, frames: list[np.ndarray], **params) -> Future:
+        """Копирует кадры в shared memory и отдаёт задачу наименее загруженному воркеру"""
+        frames = [np.ascontiguousarray(frame, dtype=np.uint8) for frame in frames]
+        shm = shared_memory.SharedMemory(create=True, size=max(sum(frame.nbytes for frame in frames), 1))
+        offset = 0
+        for frame in frames:
+            np.ndarray(frame.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)[...] = frame
+            offset += frame.nbytes
+
+        future: Future = Future()
+        task_id = next(self._task_ids)
+        with self._lock:
+            worker_id = min(range(self.num_workers), key=lambda i: len(self._in_flight[i]))
+            self._in_flight[worker_id][task_id] = (future, shm)
+            self._task_queues[worker_id].put((task_id, shm.name, [frame.shape for frame in frames], params))
+        return future
+
+    async def detect(self, frames: list[np.ndarray], **params) -> tuple[list[Detections], float]:
+        if not frames:
+            return [], 0.0
+        return await asyncio.wrap_future(self.submit(frames, **params))
+
+    def _listen(self):
+        last_check = time.monotonic()
+        while not self._stopping:
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                message = None
+
+            if time.monotonic() - last_check >= 1.0:
+                self._check_workers()
+                last_check = time.monotonic()
+            if message is None:
+                continue
+
+            kind, worker_id = message[0], message[1]
+            if kind == "ready":
+                self.warmup_times[worker_id] = message[3]
+                continue
+            if kind == "failed":
+                self._fail_in_flight(worker_id, RuntimeError(f"Воркер инференса не загрузил модель: {message[2]}"))
+                continue
+
+            task_id = message[2]
+            with self._lock:
+                future, shm = self._in_flight[worker_id].pop(task_id, (None, None))
+            if future is None:
+                continue
+            self._release(shm)
+
+            if kind == "done":
+                self._completed += 1
+                future.set_result(([unpack_detections(packed) for packed in message[3]], message[4]))
+            else:
+                self._failed += 1
+                future.set_exception(RuntimeError(message[3]))
+
+    def _check_workers(self):
+        """Упавший воркер перезапускается, его задачи завершаются ошибкой"""
+        for worker_id, process in enumerate(self._processes):
+            if self._stopping or process is None or process.is_alive():
+                continue
+            # очередь и задачи воркера подменяются атомарно, чтобы новая задача не ушла в мёртвую очередь
+            with self._lock:
+                pending = self._in_flight[worker_id]
+                self._in_flight[worker_id] = {}
+                self._restarts += 1
+                self._spawn(worker_id)
+            self._fail(pending, RuntimeError(f"Воркер инференса завершился с кодом {process.exitcode}"))
+
+    def _fail_in_flight(self, worker_id: int, error: Exception):
+        with self._lock:
+            pending = self._in_flight[worker_id]
+            self._in_flight[worker_id] = {}
+        self._fail(pending, error)
+
+    def _fail(self, pending: dict, error: Exception):
+        for future, shm in pending.values():
+            self._release(shm)
+            self._failed += 1
+            if not future.done():
+                future.set_exception(error)
+
+    @staticmethod
+    def _release(shm: shared_memory.SharedMemory):
+        shm.close()
+        shm.unlink()
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = [len(tasks) for tasks in self._in_flight]
+        return {
+            "workers": self.num_workers,
+            "alive": sum(1 for p in self._processes if p is not None and p.is_alive()),
+            "threads_per_worker": self.threads_per_worker,
+            "in_flight": in_flight,
+            "completed": self._completed,
+            "failed": self._failed,
+            "restarts": self._restarts,
+            "warmup_times_s": self.warmup_times,
+        }
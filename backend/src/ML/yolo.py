@@ -1,29 +1,64 @@
 import os
-import json
+import threading
 import cv2
 import numpy as np
-import torch
 import time
-from ultralytics import YOLO
+
+from src.config import Settings
+from src.ML.detections import Detections
+from src.ML.render import format_for_path, render_image
+
+
+def _cuda_available() -> bool:
+    """torch импортируется только здесь, чтобы ONNX-путь мог обходиться без него"""
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
 
 
 # ======= Автовыбор бэкенда =======
-USE_CUDA = torch.cuda.is_available()
+settings = Settings()
+
+# размеры входа, на которых модель прогревается при старте
+ML_WARMUP_IMGSZ = [int(size) for size in settings.ML_WARMUP_IMGSZ.split(",") if size.strip()]
+
+USE_CUDA = settings.ML_BACKEND != "onnxruntime" and _cuda_available()
 DEVICE = "cuda:0" if USE_CUDA else "cpu"
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ONNX_PATH = os.path.join(BASE_DIR, "ML", "best.onnx")    # ONNX CPU
+ONNX_INT8_PATH = os.path.join(BASE_DIR, "ML", "best.int8.onnx")  # INT8 ONNX CPU (python -m src.ML.quantize)
 PT_PATH = os.path.join(BASE_DIR, "ML", "best.pt")        # fallback PyTorch
 MEDIA_DIR = os.path.join(BASE_DIR, "media")
 
 # Автовыбор модели
-if not USE_CUDA and os.path.isfile(ONNX_PATH):
+if not USE_CUDA and settings.ML_PRECISION == "int8" and os.path.isfile(ONNX_INT8_PATH):
+    MODEL_PATH = ONNX_INT8_PATH
+    print("Использую INT8 ONNX (CPU):", MODEL_PATH)
+elif not USE_CUDA and os.path.isfile(ONNX_PATH):
     MODEL_PATH = ONNX_PATH
     print("Использую ONNX (CPU):", MODEL_PATH)
 else:
     MODEL_PATH = PT_PATH
     print("Фолбэк на PyTorch .pt:", MODEL_PATH)
 
+# ONNX по умолчанию гоняем напрямую через onnxruntime, ultralytics — только по явному запросу
+USE_ORT = MODEL_PATH.endswith(".onnx") and settings.ML_BACKEND != "ultralytics"
+
+
+def _model_version(path: str) -> str:
+    """Версия модели для ключей кэша: файл, его размер и время изменения, бэкенд"""
+    backend = "ort" if USE_ORT else "ultralytics"
+    if not os.path.isfile(path):
+        return f"{os.path.basename(path)}-{backend}"
+    stat = os.stat(path)
+    return f"{os.path.basename(path)}-{stat.st_size}-{int(stat.st_mtime)}-{backend}"
+
+
+MODEL_VERSION = os.getenv("MODEL_VERSION") or _model_version(MODEL_PATH)
+
 
 os.makedirs(MEDIA_DIR, exist_ok=True)
 
@@ -32,85 +67,179 @@ model = None
 
 CLASS_NAMES = None
 
+_model_load_lock = threading.Lock()
+# ultralytics.YOLO не потокобезопасен, onnxruntime.InferenceSession.run — потокобезопасен
+_predict_lock = threading.Lock()
+
 
 def _get_model():
     """Ленивая загрузка модели"""
+    if model is None:
+        with _model_load_lock:
+            if model is None:
+                _load_model()
+    return model
+
+
+def _load_model():
     global model, CLASS_NAMES
     if model is None:
-        model = YOLO(MODEL_PATH, task="detect")
-        
+        if USE_ORT:
+            from src.ML.onnx_engine import OnnxEngine
+
+            engine = OnnxEngine(MODEL_PATH, intra_op_threads=settings.ORT_THREADS)
+            CLASS_NAMES = engine.names
+            model = engine
+            return
+
+        import torch
+        from ultralytics import YOLO
+
+        yolo_model = YOLO(MODEL_PATH, task="detect")
+
         # Только для .pt имеет смысл .to()/.fuse()
         if MODEL_PATH.endswith(".pt"):
-            model.to(DEVICE)
+            yolo_model.to(DEVICE)
             if USE_CUDA:
                 torch.backends.cudnn.benchmark = True  # ускорение для .pt
             try:
-                model.fuse()
+                yolo_model.fuse()
             except Exception:
                 pass
-        
-        CLASS_NAMES = model.names
-    return model
+
+        CLASS_NAMES = yolo_model.names
+        model = yolo_model
 
 
-def run_inference(
-    image_input,
-    output_file=None,
-    vis_output=None,
+def load_image(image_input) -> np.ndarray:
+    """Путь к файлу, байты загрузки или уже декодированный BGR-кадр -> ndarray"""
+    if isinstance(image_input, np.ndarray):
+        return image_input
+    if isinstance(image_input, str):
+        image = cv2.imread(image_input)
+    elif isinstance(image_input, (bytes, bytearray, memoryview)):
+        image = decode_image(image_input)
+    else:
+        raise TypeError("image_input должен быть str, bytes или np.ndarray")
+    if image is None:
+        raise ValueError("Не удалось прочитать изображение")
+    return image
+
+
+def decode_image(content: bytes) -> np.ndarray | None:
+    """Декодирует байты загруженного файла в BGR-кадр"""
+    buffer = np.frombuffer(content, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def _results_to_detections(result) -> Detections:
+    """ultralytics Results -> Detections"""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return Detections.empty()
+    return Detections(
+        boxes=boxes.xyxy.cpu().numpy().astype(np.float32),
+        scores=boxes.conf.cpu().numpy().astype(np.float32),
+        class_ids=boxes.cls.cpu().numpy().astype(np.int64),
+    )
+
+
+def detect(
+    images: list[np.ndarray],
     model_conf=0.67,
     iou=0.6,
     imgsz=640,
     max_det=150,
-):
-    if output_file is None:
-        output_file = os.path.join(MEDIA_DIR, "predictions.json")
-    if vis_output is None:
-        vis_output = os.path.join(MEDIA_DIR, "vis_result.jpg")
-
-    # source
-    if isinstance(image_input, (str, np.ndarray)):
-        source = image_input
-    else:
-        raise TypeError("image_input должен быть str или np.ndarray")
+) -> tuple[list[Detections], float]:
+    """
+    Один прямой проход по списку кадров.
+    Возвращает детекции для каждого кадра и время инференса всего батча в мс
+    """
+    if not images:
+        return [], 0.0
 
     current_model = _get_model()
-    
-    use_half = USE_CUDA and MODEL_PATH.endswith(".pt")
 
-    # замер времени (без I/O синхронизируем CUDA)
     _t0 = time.perf_counter()
-    results = current_model.predict(
-        source=source,
-        imgsz=imgsz,
-        conf=model_conf,
-        iou=iou,
-        max_det=max_det,
-        device=DEVICE,
-        half=use_half,
-        verbose=False
-    )
-    if USE_CUDA:
-        torch.cuda.synchronize()
+    if USE_ORT:
+        detections = current_model.predict(images, conf=model_conf, iou=iou, imgsz=imgsz, max_det=max_det)
+    else:
+        import torch
+
+        with _predict_lock:
+            results = current_model.predict(
+                source=images,
+                imgsz=imgsz,
+                conf=model_conf,
+                iou=iou,
+                max_det=max_det,
+                device=DEVICE,
+                half=USE_CUDA and MODEL_PATH.endswith(".pt"),
+                verbose=False
+            )
+            if USE_CUDA:
+                torch.cuda.synchronize()
+        detections = [_results_to_detections(r) for r in results]
     dt = (time.perf_counter() - _t0) * 1000.0
 
-    predictions = []
-    for r in results:
-        boxes = r.boxes
-        if boxes is None or len(boxes) == 0:
-            continue
-
-        classes = boxes.cls.cpu().numpy().astype(int)
-
-        for cls_id in classes:
-            if 0 <= cls_id < len(CLASS_NAMES):
-                predictions.append(int(CLASS_NAMES[cls_id]))
-
-        if vis_output:
-            res_plotted = r.plot()
-            cv2.imwrite(vis_output, res_plotted)
-
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(predictions, f, indent=2, ensure_ascii=False)
-
-    return output_file, vis_output, dt
-
+    return detections, dt
+
+
+def warmup(batch_sizes: list[int] | None = None, imgsz_list: list[int] | None = None) -> float:
+    """
+    Загружает модель и прогоняет пустые кадры на каждом размере входа и батча,
+    чтобы создание сессии и первая оптимизация графа не доставались первому запросу.
+    Возвращает время прогрева в секундах
+    """
+    start = time.perf_counter()
+    _get_model()
+    for imgsz in imgsz_list or ML_WARMUP_IMGSZ:
+        frame = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        for batch_size in sorted(set(batch_sizes or [1, settings.ML_BATCH_SIZE])):
+            detect([frame] * batch_size, imgsz=imgsz)
+    return time.perf_counter() - start
+
+
+def get_class_names() -> dict:
+    """Имена классов модели; модель загружается, только если их ещё никто не задал"""
+    if CLASS_NAMES is None:
+        _get_model()
+    return CLASS_NAMES
+
+
+def get_fixed_imgsz() -> tuple[int, int] | None:
+    """Размер входа статического ONNX-экспорта (None — вход динамический или модель не через onnxruntime)"""
+    return getattr(_get_model(), "fixed_imgsz", None)
+
+
+def set_class_names(class_names: dict):
+    """Имена классов от модели, загруженной в другом процессе (пул воркеров)"""
+    global CLASS_NAMES
+    CLASS_NAMES = class_names
+
+
+def to_tool_ids(detections: Detections) -> list[int]:
+    """id инструментов по детекциям загруженной модели"""
+    return detections.tool_ids(get_class_names())
+
+
+def save_visualization(
+    image: np.ndarray,
+    detections: Detections,
+    vis_output: str,
+    labels: dict | None = None,
+    max_side: int = 0,
+    quality: int = 95,
+) -> str:
+    """
+    Рисует детекции и сохраняет кадр; формат — по расширению vis_output (.jpg или .webp).
+    labels — подписи классов (по умолчанию имена классов модели), max_side — уменьшение перед отрисовкой
+    """
+    content = render_image(
+        image, detections, labels or get_class_names(), max_side, format_for_path(vis_output), quality
+    )
+    with open(vis_output, "wb") as f:
+        f.write(content)
+    return vis_output
@@ -1,7 +1,18 @@
 from fastapi import APIRouter, Depends, File, UploadFile
+from fastapi.responses import JSONResponse
 from src.utils.dependencies import get_redis, get_db_session
 from src.utils.redis_client import RedisClient
 from src.utils.database import check_postgres_connection
+from src.services.cascade import inference_cascade
+from src.services.catalog_service import tool_catalog
+from src.services.tiled_inference import tiled_inference
+from src.services.job_service import predict_jobs
+from src.utils.batcher import micro_batcher
+from src.utils.executor import inference_executor
+from src.utils.media_store import media_store
+from src.utils.pipeline import batch_pipeline
+from src.utils.predict_cache import predict_cache
+from src.utils.visualization import visualization_store
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
@@ -24,3 +35,32 @@ async def health(redis: RedisClient = Depends(get_redis)):
         }
     }
 
+
+@router.get("/ready")
+async def ready():
+    """
+    Готовность к трафику: модель загружена и прогрета (503, пока нет).
+    Если модель не загрузилась, сервис готов в режиме degraded: предикт отвечает ошибкой, остальное работает
+    """
+    if not inference_executor.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    if inference_executor.degraded is not None:
+        return {"status": "degraded", "error": inference_executor.degraded}
+    return {"status": "ready", "warmup_time_s": inference_executor.warmup_time}
+
+
+@router.get("/stats")
+async def stats():
+    """Статистика инференса"""
+    return {
+        "executor": inference_executor.stats(),
+        "micro_batcher": micro_batcher.stats(),
+        "batch_pipeline": batch_pipeline.stats(),
+        "visualization": visualization_store.stats(),
+        "media": media_store.stats(),
+        "predict_cache": predict_cache.stats(),
+        "tool_catalog": tool_catalog.stats(),
+        "cascade": inference_cascade.stats(),
+        "tiling": tiled_inference.stats(),
+        "jobs": predict_jobs.stats()
+    }
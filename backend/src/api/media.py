@@ -1,38 +1,100 @@
-from fastapi import APIRouter, HTTPException
+import os
+from fastapi import APIRouter, HTTPException, Request, Response
 from fastapi.responses import FileResponse
 from pathlib import Path
+from src.config import Settings
+from src.utils.media_store import media_store
+from src.utils.metrics import stage
+from src.utils.pipeline import render_pool
+from src.utils.visualization import visualization_store
+
+settings = Settings()
 
 router = APIRouter(prefix="/media", tags=["media"])
 
+THUMBNAIL_WIDTHS = tuple(sorted(int(width) for width in settings.MEDIA_THUMBNAIL_WIDTHS.split(",") if width.strip()))
+
+MIME_TYPES = {".png": "image/png", ".gif": "image/gif", ".webp": "image/webp"}
+
 
 @router.get("/{filename}")
-async def get_image(filename: str):
+async def get_image(request: Request, filename: str, size: int | None = None):
     """
-    Эндпоинт для получения изображений из папки medi
+    Эндпоинт для получения изображений из папки media.
+    Результаты предикта не меняются после создания, поэтому отдаются со strong ETag
+    и долгим Cache-Control: повторный запрос с If-None-Match получает 304, а Range поддерживается.
+    size — ширина WebP-миниатюры результата (одна из MEDIA_THUMBNAIL_WIDTHS), создаётся один раз
     """
-    base_dir = Path(__file__).parent.parent.parent
-    media_dir = base_dir / "src" / "media"
-    file_path = media_dir / filename
-    
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="Изображение не найдено")
-    
+    result_id = media_store.result_id(filename)
+    if size is not None:
+        if result_id is None:
+            raise HTTPException(status_code=400, detail="Миниатюры есть только у результатов предикта")
+        if size not in THUMBNAIL_WIDTHS:
+            raise HTTPException(
+                status_code=400, detail=f"size должен быть одним из {', '.join(map(str, THUMBNAIL_WIDTHS))}"
+            )
+
+    media_dir = Path(media_store.media_dir)
+    # результаты лежат в шардах хранилища, url остаётся плоским
+    if size is not None:
+        file_path = Path(media_store.thumbnail_path(result_id, size))
+    else:
+        file_path = Path(media_store.path(filename))
+
     try:
         file_path.resolve().relative_to(media_dir.resolve())
     except ValueError:
         raise HTTPException(status_code=403, detail="Доступ запрещен")
-    
-    mime_type = "image/jpeg"
-    if filename.lower().endswith('.png'):
-        mime_type = "image/png"
-    elif filename.lower().endswith('.gif'):
-        mime_type = "image/gif"
-    elif filename.lower().endswith('.webp'):
-        mime_type = "image/webp"
-    
+
+    file_stat = _stat(file_path)
+    if file_stat is None:
+        # результат предикта с отложенной отрисовкой рисуется (и уменьшается) при первом обращении
+        with stage("render"):
+            if size is not None:
+                rendered = await render_pool.run(
+                    visualization_store.thumbnail, filename, size, settings.MEDIA_THUMBNAIL_QUALITY
+                )
+            else:
+                rendered = await render_pool.run(visualization_store.render, filename)
+        file_stat = _stat(file_path) if rendered is not None else None
+        if file_stat is None:
+            raise HTTPException(status_code=404, detail="Изображение не найдено")
+    # время доступа — для вытеснения давно не открывавшихся результатов
+    media_store.touch(str(file_path), file_stat)
+
+    if result_id is not None:
+        etag = f'"{result_id}"' if size is None else f'"{result_id}-w{size}"'
+        cache_control = f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable"
+    else:
+        etag = f'"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}"'
+        cache_control = "no-cache"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
     return FileResponse(
         path=file_path,
-        media_type=mime_type,
-        filename=filename,
-        headers={"Content-Disposition": "inline"}
+        media_type=MIME_TYPES.get(file_path.suffix.lower(), "image/jpeg"),
+        filename=file_path.name if size is not None else filename,
+        stat_result=file_stat,
+        headers=headers,
+        content_disposition_type="inline"
     )
+
+
+def _stat(path: Path) -> os.stat_result | None:
+    """Один stat на запрос: его же получает FileResponse"""
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # слабое сравнение (RFC 9110): W/ у тегов из If-None-Match не учитывается
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
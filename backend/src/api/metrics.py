@@ -0,0 +1,39 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.utils.batcher import micro_batcher
+from src.utils.executor import inference_executor
+from src.utils.media_store import media_store
+from src.utils.metrics import registry
+from src.utils.pipeline import batch_pipeline
+
+router = APIRouter(tags=["metrics"])
+
+registry.gauge(
+    "inference_running", "Задачи, выполняющиеся в пуле инференса", lambda: inference_executor.stats()["running"]
+)
+registry.gauge(
+    "inference_queued", "Задачи, ждущие свободного потока пула инференса", lambda: inference_executor.stats()["queued"]
+)
+registry.gauge(
+    "microbatch_queue_depth", "Запросы в очереди micro-batching", lambda: micro_batcher.stats()["queue_depth"]
+)
+registry.gauge(
+    "pipeline_decoded_queue_depth",
+    "Декодированные куски пакетов, ждущие инференса",
+    lambda: batch_pipeline.queue_depth("decoded"),
+)
+registry.gauge(
+    "pipeline_inferred_queue_depth",
+    "Куски пакетов после инференса, ждущие постобработки",
+    lambda: batch_pipeline.queue_depth("inferred"),
+)
+registry.gauge("media_store_bytes", "Размер результатов в media/ по последнему учёту", lambda: media_store.stats()["bytes"])
+registry.gauge("media_store_files", "Файлы результатов в media/ по последнему учёту", lambda: media_store.stats()["files"])
+registry.gauge("model_ready", "Модель загружена и прогрета", lambda: float(inference_executor.ready))
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Метрики в формате Prometheus"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
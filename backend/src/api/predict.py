@@ -1,15 +1,24 @@
-import zipfile
-import io
-import os
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 
+from src.services.job_service import predict_jobs
 from src.services.predict_service import PredictService
-from src.schemas.predict import PredictResponse, BatchPredictResponse
+from src.services.stream_service import PredictStream
+from src.schemas.predict import (
+    PredictResponse, BatchPredictResponse, JobStatusResponse, JobSubmitResponse, VideoPredictResponse
+)
+from src.config import Settings
 from src.utils.dependencies import get_db_session
+from src.utils.metrics import BATCH_IMAGES, FAILED_IMAGES, server_timing, stage, track_request
 from src.utils.unzip import extract_images_from_zip
+from src.utils.video import FrameSequence, open_uploaded_video
+
+settings = Settings()
 
 
 router = APIRouter(prefix="/predict", tags=["predict"])
@@ -18,39 +27,52 @@ router = APIRouter(prefix="/predict", tags=["predict"])
 
 @router.post("/", response_model=PredictResponse)
 async def predict_toolkit(
+    response: Response,
     image: UploadFile = File(...),
     toolkit_id: int = Form(...),
     confidence:float = Form(0.5),
+    visualize: bool = Form(True),
     session: AsyncSession = Depends(get_db_session)
 ):
     """
     Эндпоинт для предикта инструментов на изображении
     """
     predict_service = PredictService(session)
-    result = await predict_service.predict(image, toolkit_id,confidence)
+    with track_request("predict") as timings:
+        BATCH_IMAGES.observe(1, endpoint="predict")
+        result = await predict_service.predict(image, toolkit_id, confidence, visualize)
+    _set_server_timing(response, timings)
     return result
 
 
 @router.post("/batch", response_model=BatchPredictResponse)
 async def predict_toolkit_batch(
+    response: Response,
     images: List[UploadFile] = File(...),
     toolkit_id: int = Form(...),
     confidence: float = Form(0.5),
+    visualize: bool = Form(True),
     session: AsyncSession = Depends(get_db_session)
 ):
     """
     Анализ нескольких изображений
     """
     predict_service = PredictService(session)
-    result = await predict_service.predict_batch(images, toolkit_id, confidence)
+    with track_request("batch") as timings:
+        BATCH_IMAGES.observe(len(images), endpoint="batch")
+        result = await predict_service.predict_batch(images, toolkit_id, confidence, visualize)
+    FAILED_IMAGES.inc(result.failed_images, endpoint="batch")
+    _set_server_timing(response, timings)
     return result
 
 
 @router.post("/zip", response_model=BatchPredictResponse)
 async def predict_toolkit_from_zip(
+    response: Response,
     zip_file: UploadFile = File(...),
     toolkit_id: int = Form(...),
     confidence: float = Form(0.5),
+    visualize: bool = Form(True),
     session: AsyncSession = Depends(get_db_session)
 ):
     """
@@ -59,11 +81,146 @@ async def predict_toolkit_from_zip(
     if not zip_file.filename or not zip_file.filename.lower().endswith('.zip'):
         raise HTTPException(status_code=400, detail="Файл должен быть ZIP-архивом")
     
-    images = extract_images_from_zip(zip_file) # метод находится в утилках
-    
-    if not images:
-        raise HTTPException(status_code=400, detail="В ZIP-архиве не найдено изображений")
-    
-    predict_service = PredictService(session)
-    result = await predict_service.predict_batch(images, toolkit_id, confidence)
+    with track_request("zip") as timings:
+        with stage("unzip"):
+            images = extract_images_from_zip(zip_file) # метод находится в утилках, файлы читаются лениво
+        
+        try:
+            if not images:
+                raise HTTPException(status_code=400, detail="В ZIP-архиве не найдено изображений")
+            
+            BATCH_IMAGES.observe(len(images), endpoint="zip")
+            predict_service = PredictService(session)
+            result = await predict_service.predict_batch(images, toolkit_id, confidence, visualize)
+        finally:
+            images.close()
+    FAILED_IMAGES.inc(result.failed_images, endpoint="zip")
+    _set_server_timing(response, timings)
     return result
+
+
+@router.post("/video", response_model=VideoPredictResponse)
+async def predict_toolkit_video(
+    response: Response,
+    video: UploadFile | None = File(None),
+    frames: List[UploadFile] | None = File(None),
+    toolkit_id: int = Form(...),
+    confidence: float = Form(0.5),
+    visualize: bool = Form(True),
+    session: AsyncSession = Depends(get_db_session)
+):
+    """
+    Анализ видео (video) или последовательности кадров (frames) — одна сверка с набором на все кадры.
+    Кадры видео выбираются с частотой VIDEO_SAMPLE_FPS, почти одинаковые подряд в модель не идут
+    """
+    if (video is None) == (not frames):
+        raise HTTPException(status_code=400, detail="Нужно передать либо video, либо frames")
+
+    with track_request("video") as timings:
+        with stage("read_upload"):
+            source = (
+                await asyncio.to_thread(open_uploaded_video, video)
+                if video is not None else FrameSequence(frames, settings.VIDEO_MAX_FRAMES)
+            )
+        try:
+            predict_service = PredictService(session)
+            result = await predict_service.predict_video(source, toolkit_id, confidence, visualize)
+        finally:
+            source.close()
+        BATCH_IMAGES.observe(result.frames_processed, endpoint="video")
+    FAILED_IMAGES.inc(result.frames_failed, endpoint="video")
+    _set_server_timing(response, timings)
+    return result
+
+
+@router.post("/batch/stream")
+async def predict_toolkit_batch_stream(
+    images: List[UploadFile] = File(...),
+    toolkit_id: int = Form(...),
+    confidence: float = Form(0.5),
+    visualize: bool = Form(True),
+    format: str = Form("ndjson")
+):
+    """
+    Анализ нескольких изображений с потоковой выдачей: каждый результат
+    отправляется сразу (NDJSON или SSE), в конце — запись summary
+    """
+    stream = PredictStream(format, endpoint="batch_stream")
+    await stream.prepare_batch(images)
+    return _streaming_response(stream, toolkit_id, confidence, visualize)
+
+
+@router.post("/zip/stream")
+async def predict_toolkit_from_zip_stream(
+    zip_file: UploadFile = File(...),
+    toolkit_id: int = Form(...),
+    confidence: float = Form(0.5),
+    visualize: bool = Form(True),
+    format: str = Form("ndjson")
+):
+    """
+    Анализ изображений из зип файла с потоковой выдачей (см. /predict/batch/stream)
+    """
+    if not zip_file.filename or not zip_file.filename.lower().endswith('.zip'):
+        raise HTTPException(status_code=400, detail="Файл должен быть ZIP-архивом")
+
+    stream = PredictStream(format, endpoint="zip_stream")
+    with stage("unzip"):
+        await stream.prepare_zip(zip_file)
+    return _streaming_response(stream, toolkit_id, confidence, visualize)
+
+
+@router.post("/jobs/batch", response_model=JobSubmitResponse, status_code=202)
+async def submit_batch_job(
+    images: List[UploadFile] = File(...),
+    toolkit_id: int = Form(...),
+    confidence: float = Form(0.5),
+    visualize: bool = Form(True)
+):
+    """
+    Фоновый анализ нескольких изображений: сразу возвращает id задачи
+    """
+    return await predict_jobs.submit_batch(images, toolkit_id, confidence, visualize)
+
+
+@router.post("/jobs/zip", response_model=JobSubmitResponse, status_code=202)
+async def submit_zip_job(
+    zip_file: UploadFile = File(...),
+    toolkit_id: int = Form(...),
+    confidence: float = Form(0.5),
+    visualize: bool = Form(True)
+):
+    """
+    Фоновый анализ изображений из зип файла: сразу возвращает id задачи
+    """
+    if not zip_file.filename or not zip_file.filename.lower().endswith('.zip'):
+        raise HTTPException(status_code=400, detail="Файл должен быть ZIP-архивом")
+    return await predict_jobs.submit_zip(zip_file, toolkit_id, confidence, visualize)
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str, offset: int = 0):
+    """
+    Статус фоновой задачи, процент готовности и готовые результаты (начиная с offset)
+    """
+    job = await predict_jobs.get(job_id, offset)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+
+def _streaming_response(stream: PredictStream, toolkit_id: int, confidence: float, visualize: bool):
+    return StreamingResponse(
+        stream.records(toolkit_id, confidence, visualize),
+        media_type=stream.media_type,
+        # без буферизации на прокси, иначе результаты придут одним куском в конце
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # если клиент отключился до начала потока, временные файлы всё равно удаляются
+        background=BackgroundTask(stream.cleanup),
+    )
+
+
+def _set_server_timing(response: Response, timings: dict):
+    """Стадии запроса в заголовок Server-Timing (видно во вкладке Network браузера)"""
+    if settings.SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = server_timing(timings)
@@ -1,3 +1,4 @@
+from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
 from pathlib import Path
@@ -20,8 +21,126 @@ class Settings(BaseSettings):
     REDIS_PASSWORD: str 
     REDIS_DB: int 
 
+    # Бэкенд модели: auto | onnxruntime | ultralytics
+    ML_BACKEND: str = "auto"
+    # Точность на CPU: fp32 | int8 (int8 берёт best.int8.onnx, если он есть)
+    ML_PRECISION: str = "fp32"
+    # Потоки onnxruntime (0 — onnxruntime выбирает сам)
+    ORT_THREADS: int = Field(0, ge=0)
+    # Кадров в одном прямом проходе для пакетной обработки
+    ML_BATCH_SIZE: int = Field(8, gt=0)
+    # Размеры входа через запятую, на которых модель прогревается при старте
+    ML_WARMUP_IMGSZ: str = "640"
+
+    # Пул потоков для инференса
+    INFERENCE_WORKERS: int = 2
+    # Пул процессов с моделью (0 — модель работает в процессе API)
+    ML_WORKERS: int = 0
+    ML_WORKER_THREADS: int = 0
+
+    # Пакетная обработка: потоки декодирования изображений и ёмкость очередей между стадиями (в кусках по ML_BATCH_SIZE)
+    DECODE_WORKERS: int = 4
+    # Потоки записи результатов предикта, отрисовки и миниатюр (отдельно от инференса и декодирования)
+    RENDER_WORKERS: int = 2
+    PIPELINE_QUEUE_SIZE: int = 2
+
+    # Micro-batching одиночных запросов /predict/
+    MICROBATCH_MAX_BATCH_SIZE: int = 8
+    MICROBATCH_MAX_WAIT_MS: float = 10.0
+
+    # Каскадный инференс: ступени imgsz через запятую (одна — без каскада) и полоса неуверенных скоров для эскалации
+    CASCADE_IMGSZ: str = "640"
+    CASCADE_UNCERTAIN_LOW: float = 0.3
+    CASCADE_UNCERTAIN_HIGH: float = 0.6
+
+    # Тайловый инференс больших фото: размер тайла в пикселях кадра, доля перекрытия, лимит тайлов на кадр
+    # и порог слияния дублей на стыках (пересечение к площади меньшего бокса)
+    TILED_INFERENCE: bool = False
+    TILE_SIZE: int = 1280
+    TILE_OVERLAP: float = 0.2
+    TILE_MAX_TILES: int = 12
+    TILE_MERGE_THRESHOLD: float = 0.6
+
+    # Кэш результатов инференса в Redis (ключ — хэш изображения и параметры модели)
+    PREDICT_CACHE_ENABLED: bool = True
+    PREDICT_CACHE_TTL: int = 86400
+
+    # Снимок наборов и инструментов в памяти для предикта: перечитывается после записи через API и не реже чем раз в TTL секунд (0 — только после записи)
+    TOOL_CATALOG_TTL: int = 300
+
+    # Почти одинаковые снимки в /predict/batch и /predict/zip: максимальное расстояние Хэмминга между 256-битными dHash
+    # (-1 — не искать дубли), в модель идёт только первый снимок группы. По умолчанию выключено: хэш не видит
+    # пропажу одного мелкого инструмента, и неполный набор получит результат полного
+    DEDUP_MAX_DISTANCE: int = -1
+
+    # Лимиты ZIP-архивов для /predict/zip
+    ZIP_MAX_MEMBERS: int = 1000
+    ZIP_MAX_MEMBER_MB: int = 64
+    ZIP_MAX_TOTAL_MB: int = 2048
+    ZIP_MAX_COMPRESSION_RATIO: float = 100.0
+
+    # /predict/video: частота выборки кадров, лимит кадров на запрос, размер файла и порог отсева похожих кадров
+    # (средняя разница яркости уменьшенных кадров в долях от 255, 0 — не отсеивать)
+    VIDEO_SAMPLE_FPS: float = 2.0
+    VIDEO_MAX_FRAMES: int = 120
+    VIDEO_MAX_MB: int = 512
+    VIDEO_SIMILARITY_THRESHOLD: float = 0.03
+
+    # Фоновые задачи /predict/jobs: время хранения статуса в Redis и число одновременно обрабатываемых
+    PREDICT_JOBS_TTL: int = 86400
+    PREDICT_JOBS_MAX_CONCURRENT: int = 1
+
+    # Заголовок Server-Timing со временем стадий в ответах /predict
+    SERVER_TIMING_ENABLED: bool = False
+
+    # Отрисовка результатов: lazy — при первом GET /media/, background — фоновой задачей, eager — в запросе
+    VISUALIZATION_MODE: str = "lazy"
+    # Формат изображений с разметкой (jpeg или webp), качество кодирования и уменьшение по большей стороне
+    # перед отрисовкой (0 — в исходном размере)
+    VISUALIZATION_FORMAT: str = "jpeg"
+    VISUALIZATION_QUALITY: int = 85
+    VISUALIZATION_MAX_SIDE: int = 1920
+
+    # Хранилище результатов в media/: лимит размера в МБ и срок хранения в часах (0 — без лимита), период фоновой уборки
+    # и возраст в секундах, после которого недописанные файлы упавших запросов считаются мусором
+    MEDIA_MAX_MB: int = 4096
+    MEDIA_MAX_AGE_HOURS: float = 168
+    MEDIA_SWEEP_INTERVAL: int = 300
+    MEDIA_ORPHAN_AGE: int = 3600
+
+    # Выдача /media/: max-age кэша браузера для результатов (они не меняются), ширины миниатюр WebP через запятую и их качество
+    MEDIA_CACHE_MAX_AGE: int = 31536000
+    MEDIA_THUMBNAIL_WIDTHS: str = "160,320,640"
+    MEDIA_THUMBNAIL_QUALITY: int = 80
+
     BASE_DIR: Path = Path(__file__).resolve().parent.parent
 
+    @field_validator("ML_BACKEND", "ML_PRECISION", mode="before")
+    @classmethod
+    def _lower(cls, value):
+        return value.lower() if isinstance(value, str) else value
+
+    @field_validator("ML_BACKEND")
+    @classmethod
+    def _check_backend(cls, value: str) -> str:
+        if value not in ("auto", "onnxruntime", "ultralytics"):
+            raise ValueError("ML_BACKEND должен быть auto, onnxruntime или ultralytics")
+        return value
+
+    @field_validator("ML_PRECISION")
+    @classmethod
+    def _check_precision(cls, value: str) -> str:
+        if value not in ("fp32", "int8"):
+            raise ValueError("ML_PRECISION должен быть fp32 или int8")
+        return value
+
+    @field_validator("ML_WARMUP_IMGSZ")
+    @classmethod
+    def _check_warmup_imgsz(cls, value: str) -> str:
+        sizes = [size.strip() for size in value.split(",") if size.strip()]
+        if not sizes or not all(size.isdigit() and int(size) > 0 for size in sizes):
+            raise ValueError("ML_WARMUP_IMGSZ должен быть непустым списком положительных чисел через запятую")
+        return value
 
     @property
     def DB_URL(self):
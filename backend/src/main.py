@@ -9,8 +9,17 @@ from src.api.base import router as base_router
 from src.utils.redis_client import redis_client
 from src.utils.database import db_manager
 from src.utils.mock import create_mock_data
+from src.utils.batcher import micro_batcher
+from src.utils.executor import inference_executor
+from src.utils.pipeline import decode_pool, render_pool
+from src.utils.media_store import media_store
+from src.utils.visualization import visualization_store
+from src.services.cascade import inference_cascade
+from src.services.catalog_service import tool_catalog
+from src.services.job_service import predict_jobs
 from src.api.predict import router as predict_router
 from src.api.media import router as media_router
+from src.api.metrics import router as metrics_router
 from src.api.user import router as user_router
 from src.api.tool import router as tool_router
 from src.api.toolkit import router as toolkit_router
@@ -31,6 +40,10 @@ async def lifespan(app: FastAPI):
         # Создание mock данных при старте приложения
         await create_mock_data()
         
+        # Снимок наборов и инструментов для предикта
+        async with db_manager.session_factory() as session:
+            await tool_catalog.load(session)
+        
     except Exception as e:
         print(f" Ошибка подключения к БД: {e}")
     
@@ -39,11 +52,32 @@ async def lifespan(app: FastAPI):
         redis_client.ping()
     except Exception as e:
         print(f" Ошибка подключения к редису: {e}")
-        
+
+    #пулы декодирования и инференса, прогрев модели и micro-batching
+    decode_pool.start()
+    render_pool.start()
+    inference_executor.start()
+    try:
+        warmup_time = await inference_executor.warmup()
+        print(f"Модель загружена и прогрета за {warmup_time:.2f} с")
+    except Exception as e:
+        print(f" Ошибка загрузки модели, сервис работает в режиме degraded: {e}")
+    inference_cascade.fit_input_size(inference_executor.fixed_imgsz())
+    micro_batcher.start()
+
+    #уборка хранилища результатов
+    media_store.start()
     
     yield
 
     # стоп
+    await predict_jobs.stop()
+    await micro_batcher.stop()
+    await visualization_store.stop()
+    await media_store.stop()
+    inference_executor.shutdown()
+    decode_pool.shutdown()
+    render_pool.shutdown()
     await db_manager.close_engine()
     redis_client.disconnect()
 
@@ -65,6 +99,7 @@ app.add_middleware(
 app.include_router(base_router)
 app.include_router(predict_router)
 app.include_router(media_router)
+app.include_router(metrics_router)
 app.include_router(user_router)
 app.include_router(tool_router)
 app.include_router(toolkit_router)
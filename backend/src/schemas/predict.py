@@ -10,13 +10,25 @@ class ToolInfo(BaseModel):
     category: str
 
 
+class ToolCount(BaseModel):
+    """Сверка одного инструмента набора с найденным на изображении"""
+    tool_id: int
+    name: str | None = None
+    expected: int
+    found: int
+    missing: int
+    unexpected: int
+
+
 class PredictResponse(BaseModel):
     """Ответ сервиса предикта"""
     found_tools: List[ToolInfo]
     hand_check: bool
-    processed_image_url: str  
+    reconciliation: List[ToolCount] = []
+    processed_image_url: str | None = None
     ml_predictions: List[int]
     inference_time_ms: float 
+    cascade_tier: int | None = None
 
 
 class PredictRequest(BaseModel):
@@ -31,9 +43,13 @@ class BatchImageResult(BaseModel):
     success: bool
     found_tools: List[ToolInfo]
     hand_check: bool
+    reconciliation: List[ToolCount] = []
     processed_image_url: str | None = None
     ml_predictions: List[int] | None = None
     inference_time_ms: float | None = None
+    cascade_tier: int | None = None
+    # номер (с нуля) почти такого же изображения в запросе, чей результат скопирован
+    duplicate_of: int | None = None
     error_message: str | None = None
 
 
@@ -42,3 +58,52 @@ class BatchPredictResponse(BaseModel):
     successful_images: int
     failed_images: int
     results: List[BatchImageResult]
+
+
+class VideoFrameResult(BaseModel):
+    """Кадр видео, прошедший в модель"""
+    index: int
+    timestamp_ms: float | None = None
+    ml_predictions: List[int]
+    cascade_tier: int | None = None
+
+
+class VideoPredictResponse(BaseModel):
+    """
+    Ответ предикта по видео или последовательности кадров: сверка с набором одна на все кадры,
+    найденное количество инструмента — максимум по кадрам
+    """
+    found_tools: List[ToolInfo]
+    hand_check: bool
+    reconciliation: List[ToolCount] = []
+    processed_image_url: str | None = None
+    ml_predictions: List[int]
+    inference_time_ms: float
+    frames_sampled: int
+    frames_processed: int
+    frames_skipped: int
+    frames_failed: int = 0
+    frames: List[VideoFrameResult] = []
+
+
+class JobSubmitResponse(BaseModel):
+    """Ответ на постановку фоновой задачи"""
+    job_id: str
+    status: str
+    total: int
+
+
+class JobStatusResponse(BaseModel):
+    """Статус фоновой задачи и готовые результаты"""
+    job_id: str
+    kind: str
+    status: str
+    total: int
+    processed: int
+    progress: float
+    successful_images: int
+    failed_images: int
+    results: List[BatchImageResult]
+    error: str | None = None
+    created_at: float
+    updated_at: float
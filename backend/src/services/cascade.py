@@ -0,0 +1,144 @@
+import hashlib
+from collections import Counter
+from typing import Awaitable, Callable, List
+
+import numpy as np
+
+from src.config import Settings
+from src.ML.detections import Detections
+from src.utils.metrics import registry
+
+settings = Settings()
+
+CASCADE_IMAGES = registry.counter(
+    "predict_cascade_images_total", "Изображения, ответ по которым дала ступень каскада", ("imgsz",)
+)
+CASCADE_ESCALATIONS = registry.counter(
+    "predict_cascade_escalations_total", "Переходы на следующую ступень каскада", ("reason",)
+)
+
+DetectFn = Callable[[List[np.ndarray], float, int], Awaitable[tuple[List[Detections], float]]]
+
+
+class InferenceCascade:
+    """
+    Каскадный инференс: сначала кадр прогоняется на меньшем imgsz, на следующую ступень
+    уходят только кадры, по которым ответ ненадёжен — есть детекции в полосе неуверенности
+    [uncertain_low, uncertain_high) или сверка с набором потребовала бы ручной проверки.
+    Последняя ступень отвечает всегда. С одной ступенью — обычный инференс
+    """
+
+    def __init__(self, tiers: list[int], uncertain_low: float, uncertain_high: float):
+        self.tiers = tiers or [640]
+        self.uncertain_low = uncertain_low
+        self.uncertain_high = uncertain_high
+        self._answered: Counter = Counter()
+        self._escalations: Counter = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.tiers) > 1
+
+    def fit_input_size(self, fixed_imgsz: tuple[int, int] | None):
+        """
+        Статический экспорт работает только на своём размере входа: ступени каскада выполняли бы
+        одинаковые прямые проходы, поэтому каскад сворачивается до одной ступени этого размера
+        """
+        if fixed_imgsz is None:
+            return
+        size = max(fixed_imgsz)
+        if self.tiers != [size]:
+            print(
+                f" Модель со статическим входом {fixed_imgsz[0]}x{fixed_imgsz[1]}: "
+                f"ступени CASCADE_IMGSZ={','.join(map(str, self.tiers))} заменены одной ступенью {size}"
+            )
+            self.tiers = [size]
+
+    def cache_variant(self, expected: np.ndarray) -> int | str:
+        """
+        Параметр imgsz для ключа кэша детекций. Ответ каскада зависит от ступеней, порогов
+        и состава набора (эскалация по ручной проверке), поэтому всё это входит в ключ
+        """
+        if not self.enabled:
+            return self.tiers[0]
+        toolkit = hashlib.sha1(np.ascontiguousarray(expected, dtype=np.int64).tobytes()).hexdigest()[:12]
+        tiers = ">".join(map(str, self.tiers))
+        return f"{tiers}:{self.uncertain_low}-{self.uncertain_high}:{toolkit}"
+
+    def _uncertain(self, detections: Detections) -> bool:
+        scores = detections.scores
+        return bool(((scores >= self.uncertain_low) & (scores < self.uncertain_high)).any())
+
+    async def detect(
+        self,
+        frames: List[np.ndarray],
+        confidence: float,
+        detect_fn: DetectFn,
+        needs_check: Callable[[List[Detections]], List[bool]] | None = None,
+    ) -> tuple[List[Detections], List[int], float]:
+        """
+        Детекции по кадрам, imgsz ступени, ответившей по каждому кадру, и суммарное время прямых проходов (мс).
+        detect_fn(кадры, conf, imgsz) — прямой проход; needs_check — нужна ли ручная проверка по детекциям
+        """
+        detections: List[Detections | None] = [None] * len(frames)
+        answered_by: List[int | None] = [None] * len(frames)
+        pending = list(range(len(frames)))
+        total_time = 0.0
+
+        for level, imgsz in enumerate(self.tiers):
+            last = level == len(self.tiers) - 1
+            # на промежуточных ступенях порог ниже, чтобы увидеть детекции из полосы неуверенности
+            run_conf = confidence if last else min(confidence, self.uncertain_low)
+            tier_detections, dt = await detect_fn([frames[index] for index in pending], run_conf, imgsz)
+            total_time += dt
+            final = [
+                image_detections.filter(confidence) if run_conf < confidence else image_detections
+                for image_detections in tier_detections
+            ]
+
+            escalate = [False] * len(pending)
+            if not last:
+                checks = needs_check(final) if needs_check is not None else escalate
+                for i, image_detections in enumerate(tier_detections):
+                    if self._uncertain(image_detections):
+                        reason = "uncertain"
+                    elif checks[i]:
+                        reason = "hand_check"
+                    else:
+                        continue
+                    escalate[i] = True
+                    self._escalations[reason] += 1
+                    CASCADE_ESCALATIONS.inc(reason=reason)
+
+            next_pending = []
+            for index, image_detections, up in zip(pending, final, escalate):
+                if up:
+                    next_pending.append(index)
+                    continue
+                detections[index], answered_by[index] = image_detections, imgsz
+                self._answered[imgsz] += 1
+                CASCADE_IMAGES.inc(imgsz=imgsz)
+            pending = next_pending
+            if not pending:
+                break
+
+        return detections, answered_by, total_time
+
+    def stats(self) -> dict:
+        answered = sum(self._answered.values())
+        return {
+            "tiers": self.tiers,
+            "uncertain_band": [self.uncertain_low, self.uncertain_high],
+            "answered": {str(imgsz): self._answered[imgsz] for imgsz in self.tiers},
+            "hit_rate": {
+                str(imgsz): self._answered[imgsz] / answered if answered else 0.0 for imgsz in self.tiers
+            },
+            "escalations": dict(self._escalations),
+        }
+
+
+inference_cascade = InferenceCascade(
+    tiers=[int(size) for size in settings.CASCADE_IMGSZ.split(",") if size.strip()],
+    uncertain_low=settings.CASCADE_UNCERTAIN_LOW,
+    uncertain_high=settings.CASCADE_UNCERTAIN_HIGH,
+)
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import Settings
+from src.repo.predict_repos import ToolKitItemRepo, ToolKitRepo, ToolRepo
+from src.schemas.predict import ToolInfo
+
+settings = Settings()
+
+
+@dataclass(frozen=True)
+class ToolkitSnapshot:
+    """Состав набора: id инструмента -> количество и тот же состав вектором ожидаемых количеств по id"""
+    id: int
+    items: dict[int, int] = field(default_factory=dict)
+    expected: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+
+    @classmethod
+    def from_items(cls, toolkit_id: int, items: dict[int, int]) -> "ToolkitSnapshot":
+        expected = np.zeros(max(items, default=-1) + 1, dtype=np.int64)
+        expected[list(items)] = list(items.values())
+        return cls(toolkit_id, items, expected)
+
+
+class ToolCatalog:
+    """
+    Снимок наборов, их состава и справочника инструментов в памяти процесса для пути предикта.
+    Классы модели — это id инструментов в БД, поэтому справочник ключуется по id инструмента = классу модели.
+    Загружается при старте и перечитывается целиком (три запроса) после записи через сервисы
+    инструментов и наборов или по истечении TOOL_CATALOG_TTL (правки в обход API).
+    В установившемся режиме предикт не делает запросов к БД
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self.tools: dict[int, ToolInfo] = {}
+        self.toolkits: dict[int, ToolkitSnapshot] = {}
+        self._loaded_at: float | None = None
+        # поколение растёт при каждой записи; снимок актуален, если загружен в текущем поколении
+        self._generation = 0
+        self._loaded_generation = -1
+        self._lock: asyncio.Lock | None = None
+        self._loads = 0
+        self._hits = 0
+
+    def invalidate(self):
+        self._generation += 1
+
+    def _is_fresh(self) -> bool:
+        if self._loaded_at is None or self._loaded_generation != self._generation:
+            return False
+        return self.ttl <= 0 or time.monotonic() - self._loaded_at < self.ttl
+
+    async def load(self, session: AsyncSession):
+        generation = self._generation
+        tools = await ToolRepo(session).get()
+        toolkits = await ToolKitRepo(session).get()
+        items = await ToolKitItemRepo(session).get()
+
+        kits: dict[int, dict[int, int]] = {toolkit.id: {} for toolkit in toolkits}
+        for item in items:
+            kit = kits.setdefault(item.toolkit_id, {})
+            kit[item.tool_id] = kit.get(item.tool_id, 0) + item.quantity
+
+        # ссылки подменяются целиком: конкурентные читатели видят либо старый, либо новый снимок
+        self.tools = {
+            tool.id: ToolInfo(id=tool.id, name=tool.name, serial_number=tool.serial_number, category=tool.category)
+            for tool in tools
+        }
+        self.toolkits = {toolkit_id: ToolkitSnapshot.from_items(toolkit_id, kit) for toolkit_id, kit in kits.items()}
+        self._loaded_at = time.monotonic()
+        self._loaded_generation = generation
+        self._loads += 1
+
+    async def ensure(self, session: AsyncSession):
+        """Перечитывает снимок, если он устарел; одновременные запросы ждут одной загрузки"""
+        if self._is_fresh():
+            self._hits += 1
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._is_fresh():
+                await self.load(session)
+
+    async def toolkit(self, session: AsyncSession, toolkit_id: int) -> ToolkitSnapshot:
+        await self.ensure(session)
+        return self.toolkits.get(toolkit_id) or ToolkitSnapshot(toolkit_id)
+
+    def get_tools(self, tool_ids: list[int]) -> list[ToolInfo]:
+        """Инструменты по id, без повторов, в порядке id (как при выборке из БД)"""
+        return [self.tools[tool_id] for tool_id in sorted(set(tool_ids)) if tool_id in self.tools]
+
+    def stats(self) -> dict:
+        return {
+            "tools": len(self.tools),
+            "toolkits": len(self.toolkits),
+            "loads": self._loads,
+            "hits": self._hits,
+            "fresh": self._is_fresh(),
+            "age_s": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None,
+        }
+
+
+tool_catalog = ToolCatalog(ttl=settings.TOOL_CATALOG_TTL)
@@ -0,0 +1,237 @@
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from typing import BinaryIO, Iterable, List
+
+from fastapi import HTTPException, UploadFile
+
+from src.config import Settings
+from src.ML.yolo import MEDIA_DIR
+from src.schemas.predict import BatchImageResult, JobStatusResponse, JobSubmitResponse
+from src.services.predict_service import PredictService
+from src.utils.database import db_manager
+from src.utils.redis_client import RedisClient, redis_client
+from src.utils.unzip import ZipImages
+from src.utils.uploads import iter_saved_uploads, open_saved_archive, save_archive, save_uploads
+
+settings = Settings()
+
+JOBS_DIR = os.path.join(MEDIA_DIR, "jobs")
+
+
+class JobStateError(Exception):
+    """Статус или результаты задачи не удалось записать в Redis"""
+
+
+class PredictJobManager:
+    """
+    Фоновая обработка больших пакетов и архивов.
+    Запрос только сохраняет файлы на диск и сразу возвращает id задачи;
+    статус, прогресс и результаты по мере готовности пишутся в Redis,
+    поэтому статус может отдать любой воркер API
+    """
+
+    def __init__(self, client: RedisClient, ttl: int, max_concurrent: int):
+        self.client = client
+        self.ttl = ttl
+        self.max_concurrent = max(1, max_concurrent)
+        self._semaphore: asyncio.Semaphore | None = None
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._state_errors = 0
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"predict_job:{job_id}"
+
+    @staticmethod
+    def _results_key(job_id: str) -> str:
+        return f"predict_job:{job_id}:results"
+
+    async def submit_batch(
+        self,
+        images: List[UploadFile],
+        toolkit_id: int,
+        confidence: float,
+        visualize: bool
+    ) -> JobSubmitResponse:
+        state = await self._create("batch", len(images))
+        job_dir = os.path.join(JOBS_DIR, state["job_id"])
+        try:
+            paths = await asyncio.to_thread(save_uploads, job_dir, images)
+        except Exception as e:
+            await self._abort(state, job_dir, e)
+            raise
+        return self._start(state, iter_saved_uploads(paths), toolkit_id, confidence, visualize, job_dir)
+
+    async def submit_zip(
+        self,
+        zip_file: UploadFile,
+        toolkit_id: int,
+        confidence: float,
+        visualize: bool
+    ) -> JobSubmitResponse:
+        # число изображений известно только после сохранения архива
+        state = await self._create("zip", 0)
+        job_dir = os.path.join(JOBS_DIR, state["job_id"])
+        try:
+            path = await asyncio.to_thread(save_archive, job_dir, zip_file)
+            archive_file, images = open_saved_archive(path, zip_file.filename)
+        except Exception as e:
+            await self._abort(state, job_dir, e)
+            raise
+
+        state["total"] = len(images)
+        return self._start(state, images, toolkit_id, confidence, visualize, job_dir, archive_file)
+
+    async def _create(self, kind: str, total: int) -> dict:
+        """
+        Первая запись статуса — до сохранения файлов: без Redis статус задачи никто не получит,
+        поэтому задача не ставится и файлы не пишутся (503)
+        """
+        now = time.time()
+        state = {
+            "job_id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "queued",
+            "total": total,
+            "processed": 0,
+            "successful_images": 0,
+            "failed_images": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if not await self._save_state(state):
+            raise HTTPException(
+                status_code=503, detail="Хранилище статусов задач (Redis) недоступно, задача не поставлена"
+            )
+        return state
+
+    async def _abort(self, state: dict, job_dir: str, error: Exception):
+        """Задача не началась (файлы не сохранились или архив не открылся)"""
+        await asyncio.to_thread(shutil.rmtree, job_dir, True)
+        state["status"] = "failed"
+        state["error"] = str(error.detail) if isinstance(error, HTTPException) else str(error)
+        await self._save_state(state)
+
+    def _start(
+        self,
+        state: dict,
+        images: Iterable[UploadFile],
+        toolkit_id: int,
+        confidence: float,
+        visualize: bool,
+        job_dir: str,
+        archive_file: BinaryIO | None = None
+    ) -> JobSubmitResponse:
+        job_id = state["job_id"]
+        task = asyncio.create_task(
+            self._run(state, images, toolkit_id, confidence, visualize, job_dir, archive_file)
+        )
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        return JobSubmitResponse(job_id=job_id, status=state["status"], total=state["total"])
+
+    async def _run(
+        self,
+        state: dict,
+        images: Iterable[UploadFile],
+        toolkit_id: int,
+        confidence: float,
+        visualize: bool,
+        job_dir: str,
+        archive_file: BinaryIO | None
+    ):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        try:
+            async with self._semaphore:
+                state["status"] = "running"
+                await self._save_state(state)
+
+                if db_manager.session_factory is None:
+                    await db_manager.create_engine()
+                async with db_manager.session_factory() as session:
+                    await PredictService(session).predict_batch(
+                        images,
+                        toolkit_id,
+                        confidence,
+                        visualize,
+                        on_chunk=lambda results: self._on_chunk(state, results)
+                    )
+                state["status"] = "done"
+        except asyncio.CancelledError:
+            state["status"] = "failed"
+            state["error"] = "Обработка прервана остановкой сервиса"
+            raise
+        except HTTPException as e:
+            state["status"] = "failed"
+            state["error"] = str(e.detail)
+        except Exception as e:
+            state["status"] = "failed"
+            state["error"] = str(e)
+        finally:
+            if isinstance(images, ZipImages):
+                images.close()
+            if archive_file is not None:
+                archive_file.close()
+            await asyncio.to_thread(shutil.rmtree, job_dir, True)
+            await self._save_state(state)
+
+    async def _on_chunk(self, state: dict, results: List[BatchImageResult]):
+        stored = await asyncio.to_thread(
+            self.client.rpush,
+            self._results_key(state["job_id"]),
+            *[result.model_dump() for result in results],
+            ex=self.ttl
+        )
+        if not stored:
+            # результаты куска потеряны: продолжать — значит отдать клиенту неполный ответ как готовый
+            raise JobStateError("Не удалось сохранить результаты в Redis, обработка остановлена")
+        state["processed"] += len(results)
+        state["successful_images"] += sum(1 for result in results if result.success)
+        state["failed_images"] += sum(1 for result in results if not result.success)
+        await self._save_state(state)
+
+    async def _save_state(self, state: dict) -> bool:
+        state["updated_at"] = time.time()
+        saved = bool(await asyncio.to_thread(self.client.set, self._key(state["job_id"]), dict(state), self.ttl))
+        if not saved:
+            self._state_errors += 1
+            print(f" Ошибка записи статуса задачи {state['job_id']} ({state['status']}) в Redis")
+        return saved
+
+    async def get(self, job_id: str, offset: int = 0) -> JobStatusResponse | None:
+        """Статус задачи и результаты, начиная с offset (для опроса только новых)"""
+        state = await asyncio.to_thread(self.client.get, self._key(job_id))
+        if not isinstance(state, dict):
+            return None
+        results = await asyncio.to_thread(self.client.lrange, self._results_key(job_id), max(offset, 0), -1)
+        return JobStatusResponse(
+            **state,
+            progress=100.0 * state["processed"] / state["total"] if state["total"] else 100.0,
+            results=[BatchImageResult(**result) for result in results],
+        )
+
+    async def stop(self):
+        """Незавершённые задачи помечаются как прерванные"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "running_or_queued": len(self._tasks),
+            "max_concurrent": self.max_concurrent,
+            "state_write_errors": self._state_errors,
+        }
+
+
+predict_jobs = PredictJobManager(
+    client=redis_client,
+    ttl=settings.PREDICT_JOBS_TTL,
+    max_concurrent=settings.PREDICT_JOBS_MAX_CONCURRENT,
+)
@@ -1,172 +1,534 @@
-import os
-import uuid
-from fastapi import UploadFile
+import asyncio
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from itertools import islice
+import numpy as np
+from fastapi import HTTPException, UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.ML.yolo import run_inference
-from src.repo.predict_repos import ToolRepo, ToolKitRepo, ToolKitItemRepo
-from src.schemas.predict import PredictResponse, ToolInfo, BatchImageResult, BatchPredictResponse
-from typing import List
+from src.ML.detections import Detections
+from src.ML.yolo import decode_image, to_tool_ids
+from src.config import Settings
+from src.services.cascade import inference_cascade
+from src.services.catalog_service import ToolkitSnapshot, tool_catalog
+from src.services.tiled_inference import tiled_inference
+from src.services.reconciliation import Reconciliation, reconcile
+from src.schemas.predict import (
+    PredictResponse, ToolCount, ToolInfo, BatchImageResult, BatchPredictResponse,
+    VideoFrameResult, VideoPredictResponse
+)
+from src.utils.batcher import micro_batcher
+from src.utils.dedup import DuplicateIndex
+from src.utils.executor import inference_executor
+from src.utils.metrics import record_stage, stage
+from src.utils.pipeline import batch_pipeline, decode_pool
+from src.utils.predict_cache import predict_cache
+from src.utils.video import FrameSequence, SimilarFrameFilter, VideoFrames, encode_frame
+from src.utils.visualization import visualization_store
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List
+
+settings = Settings()
+
+@dataclass
+class _Chunk:
+    """Кусок пакета между стадиями конвейера; словари — по позиции изображения в куске"""
+    images: List[UploadFile]
+    # номер первого изображения куска в запросе
+    offset: int = 0
+    contents: dict[int, bytes] = field(default_factory=dict)
+    frames: dict[int, np.ndarray] = field(default_factory=dict)
+    detections: dict[int, Detections] = field(default_factory=dict)
+    times: dict[int, float] = field(default_factory=dict)
+    tiers: dict[int, int] = field(default_factory=dict)
+    failures: dict[int, BatchImageResult] = field(default_factory=dict)
+    # почти одинаковые снимки: номер в запросе изображения, чей результат копируется
+    duplicates: dict[int, int] = field(default_factory=dict)
+    # после инференса: id инструментов по изображениям и их сверка с набором (строка матрицы — rows)
+    predictions: dict[int, List[int]] = field(default_factory=dict)
+    rows: dict[int, int] = field(default_factory=dict)
+    reconciliation: Reconciliation | None = None
 
 
 class PredictService:
     def __init__(self, session: AsyncSession):
         self.session = session
-        self.tool_repo = ToolRepo(session)
-        self.toolkit_repo = ToolKitRepo(session)
-        self.toolkit_item_repo = ToolKitItemRepo(session)
 
-    async def predict(self, image: UploadFile, toolkit_id: int,confidence: float = 0.5) -> PredictResponse:
+    async def predict(
+        self,
+        image: UploadFile,
+        toolkit_id: int,
+        confidence: float = 0.5,
+        visualize: bool = True
+    ) -> PredictResponse:
         """
-        Основной метод предикта
+        Основной метод предикта.
+        Кадр декодируется в памяти и уходит в micro-batcher вместе с параллельными запросами,
+        визуализация рисуется отложенно (см. VisualizationStore).
+        Повторная загрузка того же изображения берёт детекции из кэша и не идёт в модель.
+        При нескольких ступенях CASCADE_IMGSZ кадр сначала идёт на меньшем imgsz (см. InferenceCascade)
         """
-        temp_image_path = await self._save_temp_image(image)
-        predictions_json_path = None
-        
-        try:
-            final_image_filename = f"processed_{uuid.uuid4()}.jpg"
-            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            media_dir = os.path.join(base_dir, "media")
-            final_image_path = os.path.join(media_dir, final_image_filename)
-
-            predictions_json_path, _, inference_time = run_inference(
-                temp_image_path, 
-                vis_output=final_image_path,
-                model_conf=confidence
-            )
-            
+        content = await self._read_upload(image)
 
-            ml_predictions = await self._read_ml_predictions(predictions_json_path)
-            
+        with stage("toolkit_items"):
+            toolkit = await tool_catalog.toolkit(self.session, toolkit_id)
+        cache_imgsz = self._cache_variant(toolkit)
 
-            toolkit_items = await self.toolkit_item_repo.get_items_by_toolkit_id(toolkit_id)
-            
+        frame = None
+        tier = None
+        inference_time = 0.0
+        with stage("cache_lookup"):
+            detections = await predict_cache.get(content, conf=confidence, imgsz=cache_imgsz)
+        if detections is None:
+            try:
+                frame = await self._decode(content)
+            except ValueError as e:
+                # пакетные варианты отдают такую ошибку в результате по файлу, одиночный — 400
+                raise HTTPException(status_code=400, detail=str(e))
+            with stage("inference"):
+                [detections], [tier], inference_time = await inference_cascade.detect(
+                    [frame], confidence, tiled_inference.wrap(self._submit), self._needs_check(toolkit)
+                )
+            record_stage("forward", inference_time / 1000)
+            with stage("cache_store"):
+                await predict_cache.set(content, detections, conf=confidence, imgsz=cache_imgsz)
 
-            found_tools, hand_check = await self._compare_predictions_with_toolkit(
-                ml_predictions, toolkit_items
+        with stage("visualization"):
+            processed_image_url = (
+                await visualization_store.save(content, frame, detections) if visualize else None
             )
-            
-            return PredictResponse(
-                found_tools=found_tools,
-                hand_check=hand_check,
-                processed_image_url=f"/media/{final_image_filename}",
-                ml_predictions=ml_predictions,
-                inference_time_ms=inference_time
-            )
-            
-        finally:
-
-            await self._cleanup_temp_files(temp_image_path, predictions_json_path)
-
-    async def _save_temp_image(self, image: UploadFile) -> str:
-        """Сохраняет изображение во временную папку"""
-
-        file_extension = os.path.splitext(image.filename)[1] if image.filename else '.jpg'
-        temp_filename = f"temp_{uuid.uuid4()}{file_extension}"
-        
-
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        media_dir = os.path.join(base_dir, "media")
-        os.makedirs(media_dir, exist_ok=True)
-        
-        temp_path = os.path.join(media_dir, temp_filename)
-        
-        await image.seek(0)
-        
-        with open(temp_path, "wb") as buffer:
-            content = await image.read()
-            buffer.write(content)
-            
-        return temp_path
-
-    async def _read_ml_predictions(self, predictions_json_path: str) -> List[int]:
-        """Читает предсказания из JSON файла"""
-        import json
-        
-        with open(predictions_json_path, "r", encoding="utf-8") as f:
-            predictions = json.load(f)
-            
-        return predictions
-
-    async def _compare_predictions_with_toolkit(
-        self, 
-        ml_predictions: List[int], 
-        toolkit_items: List
-    ) -> tuple[List[ToolInfo], bool]:
+
+        ml_predictions = to_tool_ids(detections)
+
+
+        with stage("compare"):
+            reconciliation = reconcile(toolkit.expected, [ml_predictions])
+            found_tools, hand_check, tool_counts = self._compare_predictions_with_toolkit(reconciliation, 0)
+
+        return PredictResponse(
+            found_tools=found_tools,
+            hand_check=hand_check,
+            reconciliation=tool_counts,
+            processed_image_url=processed_image_url,
+            ml_predictions=ml_predictions,
+            inference_time_ms=inference_time,
+            cascade_tier=tier
+        )
+
+    @staticmethod
+    async def _submit(frames: List[np.ndarray], conf: float, imgsz: int) -> tuple[List[Detections], float]:
+        """Прямой проход одиночного запроса через micro-batcher; тайлы кадра и так идут одним батчем"""
+        if len(frames) > 1:
+            return await inference_executor.detect(frames, model_conf=conf, imgsz=imgsz)
+        detections, inference_time = await micro_batcher.submit(frames[0], conf=conf, imgsz=imgsz)
+        return [detections], inference_time
+
+    @staticmethod
+    async def _detect(frames: List[np.ndarray], conf: float, imgsz: int) -> tuple[List[Detections], float]:
+        """Прямой проход куска пакета"""
+        return await inference_executor.detect(frames, model_conf=conf, imgsz=imgsz)
+
+    @staticmethod
+    def _cache_variant(toolkit: ToolkitSnapshot) -> int | str:
+        """Параметр imgsz ключа кэша детекций с учётом каскада и тайлового режима"""
+        variant = inference_cascade.cache_variant(toolkit.expected)
+        tiles = tiled_inference.cache_variant()
+        return f"{variant}|{tiles}" if tiles else variant
+
+    @staticmethod
+    def _needs_check(toolkit: ToolkitSnapshot) -> Callable[[List[Detections]], List[bool]]:
+        """Потребует ли сверка с набором ручной проверки — повод перейти на следующую ступень каскада"""
+        return lambda detections: reconcile(
+            toolkit.expected, [to_tool_ids(image_detections) for image_detections in detections]
+        ).hand_checks()
+
+    def _compare_predictions_with_toolkit(
+        self,
+        reconciliation: Reconciliation,
+        index: int
+    ) -> tuple[List[ToolInfo], bool, List[ToolCount]]:
         """
-        Сравнивает найденные ML инструменты с ожидаемыми в наборе
+        Итог сверки изображения с набором с учётом количеств: найденные инструменты набора,
+        нужна ли ручная проверка (не хватает хотя бы одного) и построчная сверка по инструментам
         """
+        found_tools = tool_catalog.get_tools(reconciliation.matched_ids(index))
+        hand_check = reconciliation.hand_check(index)
+        return found_tools, hand_check, reconciliation.tool_counts(index, tool_catalog.tools)
 
-        expected_tool_ids = [item.tool.id for item in toolkit_items]
-        
-
-        found_tool_ids = [tool_id for tool_id in ml_predictions if tool_id in expected_tool_ids]
-        
-
-        found_tools = []
-        if found_tool_ids:
-            tools = await self.tool_repo.get_tools_by_ids(found_tool_ids)
-            found_tools = [
-                ToolInfo(
-                    id=tool.id,
-                    name=tool.name,
-                    serial_number=tool.serial_number,
-                    category=tool.category
-                )
-                for tool in tools
-            ]
-        
-        # Определяем нужна ли ручная проверка
+    async def predict_batch(
+        self,
+        images: Iterable[UploadFile],
+        toolkit_id: int,
+        confidence: float = 0.5,
+        visualize: bool = True,
+        on_chunk: Callable[[List[BatchImageResult]], Awaitable[None]] | None = None
+    ) -> BatchPredictResponse:
+        """
+        Пакетная обработка изображений (см. iter_predict_batch).
+        on_chunk получает результаты каждого куска по мере готовности (прогресс фоновых задач)
+        """
+        results = []
+        chunk_results = []
+        # ошибка в on_chunk (например, статус задачи не записался) сразу останавливает стадии конвейера
+        async with aclosing(self.iter_predict_batch(images, toolkit_id, confidence, visualize)) as batch:
+            async for result in batch:
+                results.append(result)
+                chunk_results.append(result)
+                if on_chunk is not None and len(chunk_results) == settings.ML_BATCH_SIZE:
+                    await on_chunk(chunk_results)
+                    chunk_results = []
+        if on_chunk is not None and chunk_results:
+            await on_chunk(chunk_results)
+
+        successful_count = sum(1 for result in results if result.success)
 
-        hand_check = len(found_tool_ids) < len(expected_tool_ids)
-        
-        return found_tools, hand_check
+        return BatchPredictResponse(
+            successful_images=successful_count,
+            failed_images=len(results) - successful_count,
+            results=results
+        )
 
-    async def predict_batch(self, images: List[UploadFile], toolkit_id: int, confidence: float = 0.5) -> BatchPredictResponse:
+    async def iter_predict_batch(
+        self,
+        images: Iterable[UploadFile],
+        toolkit_id: int,
+        confidence: float = 0.5,
+        visualize: bool = True
+    ) -> AsyncIterator[BatchImageResult]:
         """
-        Пакетная обработка изображений
+        Результаты пакета по одному, в порядке входных изображений, как только они готовы.
+        Конвейер из трёх стадий, связанных ограниченными очередями (см. PipelineStats):
+        decode читает и декодирует куски по ML_BATCH_SIZE в пуле декодирования, опережая модель;
+        inference прогоняет кусок за один прямой проход; postprocess (кэш, визуализация, сверка с набором)
+        идёт параллельно с инференсом следующего куска.
+        images может быть ленивым (ZipImages): вперёд читается не больше PIPELINE_QUEUE_SIZE кусков.
+        Почти одинаковые снимки внутри запроса (DuplicateIndex) в модель не идут — им копируется
+        результат первого снимка группы с пометкой duplicate_of
         """
-        results = []
-        successful_count = 0
-        failed_count = 0
-        
-        for image in images:
+        with stage("toolkit_items"):
+            toolkit = await tool_catalog.toolkit(self.session, toolkit_id)
+        cache_imgsz = self._cache_variant(toolkit)
+        duplicates = DuplicateIndex(settings.DEDUP_MAX_DISTANCE)
+
+        with batch_pipeline.run() as queues:
+            tasks = [
+                asyncio.create_task(
+                    self._decode_stage(images, confidence, cache_imgsz, duplicates, queues["decoded"])
+                ),
+                asyncio.create_task(
+                    self._inference_stage(confidence, toolkit, duplicates, queues["decoded"], queues["inferred"])
+                ),
+            ]
             try:
-                result = await self.predict(image, toolkit_id, confidence)
-                
-                batch_result = BatchImageResult(
-                    filename=image.filename or "unknown",
-                    success=True,
-                    found_tools=result.found_tools,
-                    hand_check=result.hand_check,
-                    processed_image_url=result.processed_image_url,
-                    ml_predictions=result.ml_predictions,
-                    inference_time_ms=result.inference_time_ms
+                while (chunk := await self._next_chunk(queues["inferred"], "postprocess")) is not None:
+                    with batch_pipeline.busy("postprocess"), stage("compare"):
+                        self._reconcile_chunk(chunk, toolkit)
+                    for position in range(len(chunk.images)):
+                        with batch_pipeline.busy("postprocess"):
+                            result = await self._postprocess(chunk, position, confidence, cache_imgsz, visualize)
+                        yield result
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def predict_video(
+        self,
+        frames: VideoFrames | FrameSequence,
+        toolkit_id: int,
+        confidence: float = 0.5,
+        visualize: bool = True
+    ) -> VideoPredictResponse:
+        """
+        Предикт по кадрам видео (VideoFrames) или последовательности фото (FrameSequence).
+        Почти одинаковые подряд кадры отсеиваются до модели (SimilarFrameFilter), остальные идут
+        кусками по ML_BATCH_SIZE через каскад и тайлы, как пакет. Детекции всех кадров сводятся
+        в одну сверку с набором (Reconciliation.combine); визуализация — по кадру с наибольшим
+        числом найденных инструментов набора. Кадры не кэшируются: они не повторяются между запросами
+        """
+        with stage("toolkit_items"):
+            toolkit = await tool_catalog.toolkit(self.session, toolkit_id)
+
+        similar = SimilarFrameFilter(settings.VIDEO_SIMILARITY_THRESHOLD)
+        iterator = similar(frames)
+        frame_results: List[VideoFrameResult] = []
+        predictions: List[List[int]] = []
+        inference_time = 0.0
+        best: tuple[int, np.ndarray, Detections] | None = None
+
+        while True:
+            with stage("decode"):
+                chunk = await decode_pool.run(lambda: list(islice(iterator, settings.ML_BATCH_SIZE)))
+            if not chunk:
+                break
+            with stage("inference"):
+                chunk_detections, tiers, chunk_time = await inference_cascade.detect(
+                    [item.frame for item in chunk],
+                    confidence,
+                    tiled_inference.wrap(self._detect),
+                    self._needs_check(toolkit)
                 )
-                results.append(batch_result)
-                successful_count += 1
-                
+            record_stage("forward", chunk_time / 1000)
+            inference_time += chunk_time
+
+            chunk_predictions = [to_tool_ids(detections) for detections in chunk_detections]
+            predictions.extend(chunk_predictions)
+            for item, ids, tier in zip(chunk, chunk_predictions, tiers):
+                frame_results.append(VideoFrameResult(
+                    index=item.index, timestamp_ms=item.timestamp_ms, ml_predictions=ids, cascade_tier=tier
+                ))
+
+            if visualize:
+                chunk_reconciliation = reconcile(toolkit.expected, chunk_predictions)
+                matched = np.minimum(chunk_reconciliation.found, chunk_reconciliation.expected).sum(axis=1)
+                position = int(matched.argmax())
+                if best is None or matched[position] > best[0]:
+                    best = (int(matched[position]), chunk[position].frame, chunk_detections[position])
+
+        if not frame_results:
+            raise HTTPException(status_code=400, detail="Не удалось прочитать ни одного кадра")
+
+        with stage("compare"):
+            reconciliation = reconcile(toolkit.expected, predictions).combine()
+            found_tools, hand_check, tool_counts = self._compare_predictions_with_toolkit(reconciliation, 0)
+
+        processed_image_url = None
+        if best is not None:
+            with stage("visualization"):
+                _, frame, detections = best
+                content = await decode_pool.run(encode_frame, frame)
+                processed_image_url = await visualization_store.save(content, frame, detections)
+
+        return VideoPredictResponse(
+            found_tools=found_tools,
+            hand_check=hand_check,
+            reconciliation=tool_counts,
+            processed_image_url=processed_image_url,
+            ml_predictions=reconciliation.predictions(0),
+            inference_time_ms=inference_time,
+            frames_sampled=similar.seen + frames.failed,
+            frames_processed=similar.processed,
+            frames_skipped=similar.skipped,
+            frames_failed=frames.failed,
+            frames=frame_results
+        )
+
+    @staticmethod
+    async def _next_chunk(queue: asyncio.Queue, stage_name: str) -> _Chunk | None:
+        """Следующий кусок из очереди; None — конец пакета, ошибка предыдущей стадии пробрасывается"""
+        item = await batch_pipeline.get(queue, stage_name)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    async def _decode_stage(
+        self,
+        images: Iterable[UploadFile],
+        confidence: float,
+        cache_imgsz: int | str,
+        duplicates: DuplicateIndex,
+        output: asyncio.Queue
+    ):
+        iterator = iter(images)
+        offset = 0
+        try:
+            while True:
+                with batch_pipeline.busy("decode"):
+                    chunk_images = await asyncio.to_thread(lambda: list(islice(iterator, settings.ML_BATCH_SIZE)))
+                    if not chunk_images:
+                        break
+                    chunk = await self._prepare_chunk(chunk_images, offset, confidence, cache_imgsz, duplicates)
+                offset += len(chunk_images)
+                await batch_pipeline.put(output, chunk, "decode", "decoded")
+            item = None
+        except Exception as e:
+            item = e
+        await batch_pipeline.put(output, item, "decode", "decoded")
+
+    async def _inference_stage(
+        self,
+        confidence: float,
+        toolkit: ToolkitSnapshot,
+        duplicates: DuplicateIndex,
+        source: asyncio.Queue,
+        output: asyncio.Queue
+    ):
+        try:
+            while (chunk := await self._next_chunk(source, "inference")) is not None:
+                with batch_pipeline.busy("inference"):
+                    await self._infer_chunk(chunk, confidence, toolkit)
+                    self._resolve_duplicates(chunk, duplicates)
+                await batch_pipeline.put(output, chunk, "inference", "inferred")
+            item = None
+        except Exception as e:
+            item = e
+        await batch_pipeline.put(output, item, "inference", "inferred")
+
+    async def _prepare_chunk(
+        self,
+        images: List[UploadFile],
+        offset: int,
+        confidence: float,
+        cache_imgsz: int | str,
+        duplicates: DuplicateIndex
+    ) -> _Chunk:
+        """Чтение, проверка кэша, параллельное декодирование промахов и поиск почти одинаковых снимков"""
+        chunk = _Chunk(images, offset)
+        for position, image in enumerate(images):
+            try:
+                chunk.contents[position] = await self._read_upload(image)
             except Exception as e:
-                batch_result = BatchImageResult(
-                    filename=image.filename or "unknown",
-                    success=False,
-                    found_tools=[],
-                    hand_check=True,
-                    error_message=str(e)
+                chunk.failures[position] = self._failed_result(image, e)
+
+        positions = list(chunk.contents)
+        with stage("cache_lookup"):
+            cached = await asyncio.gather(
+                *(
+                    predict_cache.get(chunk.contents[position], conf=confidence, imgsz=cache_imgsz)
+                    for position in positions
                 )
-                results.append(batch_result)
-                failed_count += 1
-        
-        return BatchPredictResponse(
-            successful_images=successful_count,
-            failed_images=failed_count,
-            results=results
+            )
+        misses = []
+        for position, detections in zip(positions, cached):
+            if detections is not None:
+                chunk.detections[position], chunk.times[position] = detections, 0.0
+            else:
+                misses.append(position)
+
+        frames = await asyncio.gather(
+            *(self._decode(chunk.contents[position]) for position in misses), return_exceptions=True
         )
+        for position, frame in zip(misses, frames):
+            if isinstance(frame, Exception):
+                chunk.failures[position] = self._failed_result(images[position], frame)
+            else:
+                chunk.frames[position] = frame
 
-    async def _cleanup_temp_files(self, *file_paths: str):
-        """Удаляет временные файлы"""
-        for file_path in file_paths:
-            if file_path and os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except OSError:
-                    pass  
\ No newline at end of file
+        if duplicates.enabled and chunk.frames:
+            positions = list(chunk.frames)
+            with stage("dedup"):
+                hashes = await decode_pool.run(duplicates.hashes, [chunk.frames[position] for position in positions])
+                representatives = duplicates.assign(hashes, [offset + position for position in positions])
+            for position, representative in zip(positions, representatives):
+                if representative is not None:
+                    chunk.duplicates[position] = representative
+                    del chunk.frames[position]
+        return chunk
+
+    async def _infer_chunk(self, chunk: _Chunk, confidence: float, toolkit: ToolkitSnapshot):
+        """
+        Один прямой проход модели на кусок пакета (и по одному на каждую следующую ступень каскада
+        для кадров, которые туда ушли); изображения из кэша в модель не идут
+        """
+        if not chunk.frames:
+            return
+        positions = list(chunk.frames)
+        try:
+            with stage("inference"):
+                chunk_detections, tiers, inference_time = await inference_cascade.detect(
+                    [chunk.frames[position] for position in positions],
+                    confidence,
+                    tiled_inference.wrap(self._detect),
+                    self._needs_check(toolkit)
+                )
+            record_stage("forward", inference_time / 1000)
+        except Exception as e:
+            for position in positions:
+                chunk.failures[position] = self._failed_result(chunk.images[position], e)
+            return
+
+        per_image_time = inference_time / len(positions)
+        for position, image_detections, tier in zip(positions, chunk_detections, tiers):
+            chunk.detections[position], chunk.times[position] = image_detections, per_image_time
+            chunk.tiers[position] = tier
+
+    def _resolve_duplicates(self, chunk: _Chunk, duplicates: DuplicateIndex):
+        """
+        Запоминает результаты представителей групп и копирует их дублям. Представитель всегда раньше
+        в запросе, а куски проходят инференс по порядку, поэтому его результат к этому моменту готов
+        """
+        if not duplicates.enabled:
+            return
+        for position in chunk.frames:
+            if position in chunk.failures:
+                duplicates.results[chunk.offset + position] = chunk.failures[position].error_message or ""
+            else:
+                duplicates.results[chunk.offset + position] = (chunk.detections[position], chunk.tiers.get(position))
+        for position, representative in chunk.duplicates.items():
+            result = duplicates.results.get(representative)
+            if not isinstance(result, tuple):
+                error = ValueError(f"Дубль изображения {representative}, которое не удалось обработать: {result or ''}")
+                chunk.failures[position] = self._failed_result(chunk.images[position], error)
+                continue
+            chunk.detections[position], chunk.tiers[position] = result
+            chunk.times[position] = 0.0
+
+    async def _postprocess(
+        self,
+        chunk: _Chunk,
+        position: int,
+        confidence: float,
+        cache_imgsz: int | str,
+        visualize: bool
+    ) -> BatchImageResult:
+        image = chunk.images[position]
+        if position in chunk.failures:
+            return chunk.failures[position]
+        try:
+            detections = chunk.detections[position]
+            if position in chunk.frames:
+                with stage("cache_store"):
+                    await predict_cache.set(
+                        chunk.contents[position], detections, conf=confidence, imgsz=cache_imgsz
+                    )
+            with stage("visualization"):
+                processed_image_url = (
+                    await visualization_store.save(chunk.contents[position], chunk.frames.get(position), detections)
+                    if visualize else None
+                )
+            found_tools, hand_check, tool_counts = self._compare_predictions_with_toolkit(
+                chunk.reconciliation, chunk.rows[position]
+            )
+            return BatchImageResult(
+                filename=image.filename or "unknown",
+                success=True,
+                found_tools=found_tools,
+                hand_check=hand_check,
+                reconciliation=tool_counts,
+                processed_image_url=processed_image_url,
+                ml_predictions=chunk.predictions[position],
+                inference_time_ms=chunk.times[position],
+                cascade_tier=chunk.tiers.get(position),
+                duplicate_of=chunk.duplicates.get(position)
+            )
+        except Exception as e:
+            return self._failed_result(image, e)
+
+    @staticmethod
+    def _reconcile_chunk(chunk: _Chunk, toolkit: ToolkitSnapshot):
+        """Сверка всех изображений куска с набором одним векторным вызовом"""
+        positions = [position for position in chunk.detections if position not in chunk.failures]
+        for row, position in enumerate(positions):
+            chunk.predictions[position] = to_tool_ids(chunk.detections[position])
+            chunk.rows[position] = row
+        chunk.reconciliation = reconcile(toolkit.expected, [chunk.predictions[position] for position in positions])
+
+    async def _read_upload(self, image: UploadFile) -> bytes:
+        with stage("read_upload"):
+            await image.seek(0)
+            return await image.read()
+
+    async def _decode(self, content: bytes):
+        """Декодирует загруженный файл в кадр без записи на диск"""
+        with stage("decode"):
+            frame = await decode_pool.run(decode_image, content)
+        if frame is None:
+            raise ValueError("Не удалось декодировать изображение")
+        return frame
+
+    def _failed_result(self, image: UploadFile, error: Exception) -> BatchImageResult:
+        return BatchImageResult(
+            filename=image.filename or "unknown",
+            success=False,
+            found_tools=[],
+            hand_check=True,
+            error_message=str(error)
+        )
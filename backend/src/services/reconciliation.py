@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+from src.schemas.predict import ToolCount, ToolInfo
+
+
+@dataclass
+class Reconciliation:
+    """
+    Сверка пакета изображений с набором: матрицы (изображение x id инструмента).
+    missing — сколько ожидаемых не нашли, unexpected — найдено сверх количества в наборе
+    (включая инструменты не из набора)
+    """
+    expected: np.ndarray
+    found: np.ndarray
+    missing: np.ndarray
+    unexpected: np.ndarray
+
+    def hand_check(self, index: int) -> bool:
+        """Ручная проверка нужна, если на изображении не хватает инструментов набора"""
+        return bool(self.missing[index].any())
+
+    def hand_checks(self) -> list[bool]:
+        return self.missing.any(axis=1).tolist()
+
+    def matched_ids(self, index: int) -> list[int]:
+        """id инструментов набора, найденных на изображении"""
+        return np.flatnonzero(np.minimum(self.found[index], self.expected) > 0).tolist()
+
+    def tool_counts(self, index: int, tools: dict[int, ToolInfo]) -> list[ToolCount]:
+        """Строки сверки по инструментам, которые ожидались или были найдены"""
+        found = self.found[index]
+        missing = self.missing[index]
+        unexpected = self.unexpected[index]
+        return [
+            ToolCount(
+                tool_id=tool_id,
+                name=tools[tool_id].name if tool_id in tools else None,
+                expected=int(self.expected[tool_id]),
+                found=int(found[tool_id]),
+                missing=int(missing[tool_id]),
+                unexpected=int(unexpected[tool_id]),
+            )
+            for tool_id in np.flatnonzero((self.expected > 0) | (found > 0)).tolist()
+        ]
+
+    def combine(self) -> "Reconciliation":
+        """
+        Одна сверка по всем изображениям как по снимкам одного набора (кадры видео):
+        найденное количество инструмента — максимум по кадрам, а не сумма,
+        иначе инструмент, попавший в несколько кадров, посчитается несколько раз
+        """
+        found = self.found.max(axis=0, initial=0)[None, :]
+        return Reconciliation(
+            expected=self.expected,
+            found=found,
+            missing=np.clip(self.expected - found, 0, None),
+            unexpected=np.clip(found - self.expected, 0, None),
+        )
+
+    def predictions(self, index: int) -> list[int]:
+        """Найденные id инструментов изображения с повторами по количеству"""
+        return np.repeat(np.arange(self.found.shape[1]), self.found[index]).tolist()
+
+
+def reconcile(expected: np.ndarray, predictions: Sequence[Sequence[int]]) -> Reconciliation:
+    """
+    Сверка за один векторный вызов: найденные количества всех изображений пакета считаются
+    одним np.bincount по ключу (номер изображения, id инструмента) и сравниваются
+    с вектором ожидаемых количеств набора
+    """
+    counts = np.fromiter((len(ids) for ids in predictions), dtype=np.int64, count=len(predictions))
+    tool_ids = np.fromiter(
+        (tool_id for ids in predictions for tool_id in ids), dtype=np.int64, count=int(counts.sum())
+    )
+    size = max(len(expected), int(tool_ids.max()) + 1 if tool_ids.size else 0)
+    expected = np.pad(expected, (0, size - len(expected)))
+
+    images = np.repeat(np.arange(len(predictions)), counts)
+    found = np.bincount(images * size + tool_ids, minlength=len(predictions) * size).reshape(len(predictions), size)
+    return Reconciliation(
+        expected=expected,
+        found=found,
+        missing=np.clip(expected - found, 0, None),
+        unexpected=np.clip(found - expected, 0, None),
+    )
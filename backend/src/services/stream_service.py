@@ -0,0 +1,112 @@
+import asyncio
+import json
+import shutil
+import tempfile
+from contextlib import aclosing
+from typing import AsyncIterator, BinaryIO, Iterable, List
+
+from fastapi import HTTPException, UploadFile
+
+from src.services.predict_service import PredictService
+from src.utils.database import db_manager
+from src.utils.metrics import BATCH_IMAGES, FAILED_IMAGES, track_request
+from src.utils.unzip import ZipImages
+from src.utils.uploads import iter_saved_uploads, open_saved_archive, save_archive, save_uploads
+
+# формат потока -> media type ответа
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def format_record(stream_format: str, record_type: str, payload: dict) -> str:
+    """
+    Одна запись потока: строка JSON для ndjson или событие для SSE.
+    Тип записи (result / summary / error) есть и в самом JSON, и в имени события SSE
+    """
+    data = json.dumps({"type": record_type, **payload}, ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {record_type}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+class PredictStream:
+    """
+    Потоковый вариант пакетной обработки: каждый BatchImageResult отправляется клиенту,
+    как только готов, в конце — запись summary.
+    Тело ответа отдаётся уже после выхода из эндпоинта, поэтому загруженные файлы
+    копируются во временную папку, а сессия БД открывается на время потока
+    """
+
+    def __init__(self, stream_format: str, endpoint: str):
+        if stream_format not in STREAM_FORMATS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Неизвестный формат потока, ожидается: {', '.join(STREAM_FORMATS)}"
+            )
+        self.stream_format = stream_format
+        self.media_type = STREAM_FORMATS[stream_format]
+        self.endpoint = endpoint
+        self.total = 0
+        self._images: Iterable[UploadFile] = ()
+        self._archive_file: BinaryIO | None = None
+        self._tmp_dir = tempfile.mkdtemp(prefix="predict_stream_")
+
+    async def prepare_batch(self, images: List[UploadFile]):
+        try:
+            paths = await asyncio.to_thread(save_uploads, self._tmp_dir, images)
+        except Exception:
+            self.cleanup()
+            raise
+        self.total = len(paths)
+        self._images = iter_saved_uploads(paths)
+
+    async def prepare_zip(self, zip_file: UploadFile):
+        try:
+            path = await asyncio.to_thread(save_archive, self._tmp_dir, zip_file)
+            self._archive_file, self._images = open_saved_archive(path, zip_file.filename)
+        except Exception:
+            self.cleanup()
+            raise
+        self.total = len(self._images)
+
+    async def records(self, toolkit_id: int, confidence: float, visualize: bool) -> AsyncIterator[str]:
+        successful = failed = 0
+        try:
+            with track_request(self.endpoint):
+                BATCH_IMAGES.observe(self.total, endpoint=self.endpoint)
+                if db_manager.session_factory is None:
+                    await db_manager.create_engine()
+                async with db_manager.session_factory() as session:
+                    # клиент отключился — стадии конвейера останавливаются сразу, а не при сборке мусора
+                    results = PredictService(session).iter_predict_batch(
+                        self._images, toolkit_id, confidence, visualize
+                    )
+                    async with aclosing(results):
+                        async for result in results:
+                            if result.success:
+                                successful += 1
+                            else:
+                                failed += 1
+                            yield format_record(self.stream_format, "result", result.model_dump())
+            FAILED_IMAGES.inc(failed, endpoint=self.endpoint)
+            yield format_record(self.stream_format, "summary", {
+                "total": self.total,
+                "successful_images": successful,
+                "failed_images": failed,
+            })
+        except HTTPException as e:
+            # заголовки уже отправлены: ошибка посреди потока приходит отдельной записью
+            yield format_record(self.stream_format, "error", {"detail": str(e.detail)})
+        except Exception as e:
+            yield format_record(self.stream_format, "error", {"detail": str(e)})
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        if isinstance(self._images, ZipImages):
+            self._images.close()
+        if self._archive_file is not None:
+            self._archive_file.close()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
@@ -0,0 +1,87 @@
+from typing import List
+
+import numpy as np
+
+from src.config import Settings
+from src.ML.detections import Detections
+from src.ML.tiling import merge_tiles, tile_grid
+from src.services.cascade import DetectFn
+from src.utils.metrics import registry
+
+settings = Settings()
+
+TILES = registry.counter("predict_tiles_total", "Тайлы, прогнанные через модель в тайловом режиме")
+
+
+class TiledInference:
+    """
+    Тайловый режим: кадры больше одного тайла режутся на перекрывающиеся тайлы, которые вместе
+    с уменьшенным целым кадром (крупные инструменты, разрезанные стыками) уходят в модель одним батчем.
+    Оборачивает функцию прямого прохода, поэтому работает и для одиночных запросов, и для пакетов,
+    и на каждой ступени каскада
+    """
+
+    def __init__(self, enabled: bool, tile_size: int, overlap: float, max_tiles: int, merge_threshold: float):
+        self.enabled = enabled
+        self.tile_size = tile_size
+        self.overlap = min(max(overlap, 0.0), 0.9)
+        self.max_tiles = max(max_tiles, 1)
+        self.merge_threshold = merge_threshold
+        self._images = 0
+        self._tiled_images = 0
+        self._tiles = 0
+
+    def cache_variant(self) -> str:
+        """Часть ключа кэша детекций: при включённых тайлах ответ зависит от их параметров"""
+        if not self.enabled:
+            return ""
+        return f"tiles:{self.tile_size}:{self.overlap}:{self.max_tiles}:{self.merge_threshold}"
+
+    def wrap(self, detect_fn: DetectFn) -> DetectFn:
+        if not self.enabled:
+            return detect_fn
+
+        async def detect(frames: List[np.ndarray], conf: float, imgsz: int) -> tuple[List[Detections], float]:
+            crops, owners, offsets = [], [], []
+            for index, frame in enumerate(frames):
+                height, width = frame.shape[:2]
+                windows = tile_grid(height, width, self.tile_size, self.overlap, self.max_tiles)
+                if len(windows) > 1:
+                    for x1, y1, x2, y2 in windows.tolist():
+                        crops.append(frame[y1:y2, x1:x2])
+                        owners.append(index)
+                        offsets.append((x1, y1))
+                    self._tiled_images += 1
+                    self._tiles += len(windows)
+                    TILES.inc(len(windows))
+                crops.append(frame)
+                owners.append(index)
+                offsets.append((0, 0))
+            self._images += len(frames)
+
+            if len(crops) == len(frames):
+                return await detect_fn(frames, conf, imgsz)
+            detections, inference_time = await detect_fn(crops, conf, imgsz)
+            return merge_tiles(detections, owners, offsets, len(frames), self.merge_threshold), inference_time
+
+        return detect
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "tile_size": self.tile_size,
+            "overlap": self.overlap,
+            "max_tiles": self.max_tiles,
+            "images": self._images,
+            "tiled_images": self._tiled_images,
+            "tiles_per_tiled_image": self._tiles / self._tiled_images if self._tiled_images else 0.0,
+        }
+
+
+tiled_inference = TiledInference(
+    enabled=settings.TILED_INFERENCE,
+    tile_size=settings.TILE_SIZE,
+    overlap=settings.TILE_OVERLAP,
+    max_tiles=settings.TILE_MAX_TILES,
+    merge_threshold=settings.TILE_MERGE_THRESHOLD,
+)
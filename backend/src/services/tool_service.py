@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from src.models.models import Tool
 from src.schemas.tool import ToolCreate, ToolUpdate, ToolRead
 from src.repo.crud_repos import ToolRepo
+from src.services.catalog_service import tool_catalog
 
 class ToolService:
     def __init__(self, session: AsyncSession):
@@ -37,6 +38,7 @@ class ToolService:
             await self.session.rollback()
             raise HTTPException(500, "Не удалось создать инструмент")
         await self.session.commit()
+        tool_catalog.invalidate()
         return created
 
     async def update(self, tool_id: int, payload: ToolUpdate) -> ToolRead:
@@ -63,10 +65,12 @@ class ToolService:
 
         updated = await self.get(tool_id)
         await self.session.commit()
+        tool_catalog.invalidate()
         return updated
 
     async def delete(self, tool_id: int) -> None:
         deleted = await self.repo.delete(Tool.id == tool_id, commit=False)
         if not deleted:
             raise HTTPException(404, "Инструмент не найден")
-        await self.session.commit()
\ No newline at end of file
+        await self.session.commit()
+        tool_catalog.invalidate()
@@ -3,6 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from src.models.models import ToolKit
 from src.schemas.toolkit import ToolKitCreate, ToolKitUpdate, ToolKitRead, ToolKitReadFull
 from src.repo.crud_repos import ToolKitRepo
+from src.services.catalog_service import tool_catalog
 
 class ToolKitService:
     def __init__(self, session: AsyncSession):
@@ -32,6 +33,7 @@ class ToolKitService:
             await self.session.rollback()
             raise HTTPException(500, "Не удалось создать набор")
         await self.session.commit()
+        tool_catalog.invalidate()
         return ToolKitRead.model_validate(kit[0], from_attributes=True)
 
     async def update(self, toolkit_id: int, payload: ToolKitUpdate) -> ToolKitRead:
@@ -51,6 +53,7 @@ class ToolKitService:
 
         updated = await self.repo.get_by_id(toolkit_id)
         await self.session.commit()
+        tool_catalog.invalidate()
         return ToolKitRead.model_validate(updated, from_attributes=True)
 
     async def delete(self, toolkit_id: int) -> None:
@@ -60,4 +63,5 @@ class ToolKitService:
         changed = await self.repo.delete(ToolKit.id == toolkit_id, commit=False)
         if not changed:
             raise HTTPException(404, "Набор не найден")
-        await self.session.commit()
\ No newline at end of file
+        await self.session.commit()
+        tool_catalog.invalidate()
@@ -3,6 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from src.models.models import ToolKitItem
 from src.schemas.toolkititems import ToolKitItemCreate, ToolKitItemUpdate, ToolKitItemRead
 from src.repo.crud_repos import ToolKitItemRepo
+from src.services.catalog_service import tool_catalog
 
 class ToolKitItemService:
     def __init__(self, session: AsyncSession):
@@ -22,6 +23,7 @@ class ToolKitItemService:
     async def create_or_replace(self, toolkit_id: int, payload: ToolKitItemCreate) -> ToolKitItemRead:
         item = await self.repo.upsert(toolkit_id=toolkit_id, tool_id=payload.tool_id, quantity=payload.quantity)
         await self.session.commit()
+        tool_catalog.invalidate()
         item = await self.repo.get_for_toolkit(toolkit_id, item.id) or item
         return ToolKitItemRead.model_validate(item, from_attributes=True)
 
@@ -37,6 +39,7 @@ class ToolKitItemService:
 
         await self.session.flush()
         await self.session.commit()
+        tool_catalog.invalidate()
         return ToolKitItemRead.model_validate(item, from_attributes=True)
 
     async def delete(self, toolkit_id: int, item_id: int) -> None:
@@ -45,8 +48,10 @@ class ToolKitItemService:
             raise HTTPException(404, "Позиция набора не найдена")
         await self.repo.delete(ToolKitItem.id == item_id, commit=False)
         await self.session.commit()
+        tool_catalog.invalidate()
 
     async def clear_all(self, toolkit_id: int) -> int:
         changed = await self.repo.delete(ToolKitItem.toolkit_id == toolkit_id, commit=False)
         await self.session.commit()
+        tool_catalog.invalidate()
         return changed
@@ -0,0 +1,173 @@
+import asyncio
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.config import Settings
+from src.ML.detections import Detections
+from src.utils.executor import inference_executor
+
+settings = Settings()
+
+
+@dataclass
+class _PendingRequest:
+    frame: np.ndarray
+    conf: float
+    key: tuple[float, int, int]   # (iou, imgsz, max_det) — запросы с одинаковым ключом идут в один батч
+    future: asyncio.Future
+
+
+class MicroBatcher:
+    """
+    Собирает одновременные запросы в батч (до max_batch_size кадров или max_wait_ms ожидания)
+    и прогоняет их через модель за один прямой проход.
+    Батчи идут в модель параллельно, не больше max_concurrent сразу (по умолчанию — сколько
+    прямых проходов тянет пул инференса). Пока все места заняты, запросы копятся в очереди
+    и уходят следующим, более крупным батчем
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float, max_concurrent: int | None = None):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_concurrent = max_concurrent
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._in_flight: set[asyncio.Task] = set()
+        self._batches = 0
+        self._requests = 0
+        self._batch_sizes: Counter = Counter()
+
+    def start(self):
+        """Запуск фоновой задачи сборки батчей (на текущем event loop)"""
+        if self._worker is None:
+            # размер пула известен только после старта: пул процессов мог не подняться
+            if self.max_concurrent is None:
+                self.max_concurrent = inference_executor.concurrency
+            self.max_concurrent = max(1, self.max_concurrent)
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка воркера, ожидающие запросы получают ошибку"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        # батчи, которые уже в модели, дорабатывают
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        while not self._queue.empty():
+            self._fail([self._queue.get_nowait()], RuntimeError("Сервис инференса остановлен"))
+        self._worker = None
+        self._queue = None
+
+    async def submit(
+        self,
+        frame: np.ndarray,
+        conf: float = 0.67,
+        iou: float = 0.6,
+        imgsz: int = 640,
+        max_det: int = 150,
+    ) -> tuple[Detections, float]:
+        """Ставит кадр в очередь и ждёт его детекции и время прямого прохода батча в мс"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingRequest(frame, conf, (iou, imgsz, max_det), future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # свободное место занимается до сборки батча: пока модель занята, очередь растёт
+            await self._slots.acquire()
+            batch: list[_PendingRequest] = []
+            try:
+                batch.append(await self._queue.get())
+                deadline = loop.time() + self.max_wait
+
+                while len(batch) < self.max_batch_size:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except BaseException:
+                # остановка посреди сборки: собранные запросы не должны ждать вечно
+                self._slots.release()
+                self._fail(batch, RuntimeError("Сервис инференса остановлен"))
+                raise
+
+            task = asyncio.create_task(self._process(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        self._in_flight.discard(task)
+        self._slots.release()
+
+    async def _process(self, batch: list[_PendingRequest]):
+        groups: dict[tuple, list[_PendingRequest]] = defaultdict(list)
+        for request in batch:
+            if not request.future.done():
+                groups[request.key].append(request)
+
+        for (iou, imgsz, max_det), requests in groups.items():
+            # NMS не зависит от порога: гоняем батч по минимальному conf и дофильтровываем для каждого запроса
+            conf = min(request.conf for request in requests)
+            try:
+                detections, dt = await inference_executor.detect(
+                    [request.frame for request in requests],
+                    model_conf=conf,
+                    iou=iou,
+                    imgsz=imgsz,
+                    max_det=max_det,
+                )
+            except Exception as e:
+                self._fail(requests, e)
+                continue
+
+            self._batches += 1
+            self._requests += len(requests)
+            self._batch_sizes[len(requests)] += 1
+
+            for request, image_detections in zip(requests, detections):
+                if not request.future.done():
+                    request.future.set_result((image_detections.filter(request.conf), dt))
+
+    @staticmethod
+    def _fail(requests: list[_PendingRequest], error: Exception):
+        for request in requests:
+            if not request.future.done():
+                request.future.set_exception(error)
+
+    def stats(self) -> dict:
+        """Глубина очереди и достигнутые размеры батчей"""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_concurrent": self.max_concurrent,
+            "in_flight": len(self._in_flight),
+            "batches": self._batches,
+            "requests": self._requests,
+            "avg_batch_size": self._requests / self._batches if self._batches else 0.0,
+            "batch_sizes": dict(sorted(self._batch_sizes.items())),
+        }
+
+
+micro_batcher = MicroBatcher(
+    max_batch_size=settings.MICROBATCH_MAX_BATCH_SIZE,
+    max_wait_ms=settings.MICROBATCH_MAX_WAIT_MS,
+)
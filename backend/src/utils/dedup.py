@@ -0,0 +1,89 @@
+from typing import List
+
+import cv2
+import numpy as np
+
+from src.ML.detections import Detections
+from src.utils.metrics import registry
+
+DUPLICATES = registry.counter(
+    "predict_duplicates_total", "Изображения пакета, результат которых скопирован с почти такого же снимка"
+)
+
+
+def perceptual_hashes(frames: List[np.ndarray], hash_size: int = 16) -> np.ndarray:
+    """
+    dHash кадров: серые миниатюры (hash_size + 1) x hash_size, бит — ярче ли пиксель соседа справа.
+    Миниатюры сравниваются одной векторной операцией на весь кусок, результат — (n, hash_size**2 / 8) uint8
+    """
+    if not frames:
+        return np.empty((0, hash_size * hash_size // 8), dtype=np.uint8)
+    thumbnails = np.stack([
+        cv2.resize(
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame,
+            (hash_size + 1, hash_size),
+            interpolation=cv2.INTER_AREA,
+        )
+        for frame in frames
+    ])
+    bits = thumbnails[:, :, 1:] > thumbnails[:, :, :-1]
+    return np.packbits(bits.reshape(len(frames), -1), axis=1)
+
+
+class DuplicateIndex:
+    """
+    Почти одинаковые снимки в пределах одного запроса: первый снимок группы (представитель) идёт в модель,
+    остальные получают его детекции. Снимки считаются дублями, если расстояние Хэмминга между их
+    dHash не больше max_distance бит (0 — только совпадающие хэши, отрицательное — поиск выключен)
+    """
+
+    def __init__(self, max_distance: int, hash_size: int = 16):
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self._hashes = np.empty((0, hash_size * hash_size // 8), dtype=np.uint8)
+        self._owners: list[int] = []
+        # детекции и ступень каскада представителей (или текст ошибки их обработки) по номеру в запросе
+        self.results: dict[int, tuple[Detections, int | None] | str] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_distance >= 0
+
+    def hashes(self, frames: List[np.ndarray]) -> np.ndarray:
+        return perceptual_hashes(frames, self.hash_size)
+
+    def assign(self, hashes: np.ndarray, indices: List[int]) -> list[int | None]:
+        """
+        Для каждого снимка куска — номер представителя в запросе или None, если снимок сам становится
+        представителем новой группы. Расстояния до известных групп и внутри куска считаются
+        двумя матричными операциями
+        """
+        known = _hamming(hashes, self._hashes)
+        inner = _hamming(hashes, hashes)
+        representatives: list[int | None] = []
+        new_groups: list[int] = []
+        for position, index in enumerate(indices):
+            match = None
+            if known.shape[1]:
+                nearest = int(known[position].argmin())
+                if known[position, nearest] <= self.max_distance:
+                    match = self._owners[nearest]
+            if match is None and new_groups:
+                distances = inner[position, new_groups]
+                nearest = int(distances.argmin())
+                if distances[nearest] <= self.max_distance:
+                    match = indices[new_groups[nearest]]
+            if match is None:
+                new_groups.append(position)
+            else:
+                DUPLICATES.inc()
+            representatives.append(match)
+
+        self._hashes = np.concatenate([self._hashes, hashes[new_groups]])
+        self._owners.extend(indices[position] for position in new_groups)
+        return representatives
+
+
+def _hamming(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Попарные расстояния Хэмминга (len(left), len(right)) между упакованными хэшами"""
+    return np.unpackbits(np.bitwise_xor(left[:, None, :], right[None, :, :]), axis=2).sum(axis=2)
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+import numpy as np
+
+from src.config import Settings
+from src.ML.detections import Detections
+from src.ML.worker_pool import InferenceWorkerPool
+from src.ML.yolo import ML_WARMUP_IMGSZ, detect, get_fixed_imgsz, set_class_names, warmup
+from src.services.cascade import inference_cascade
+
+settings = Settings()
+
+
+class InferenceExecutor:
+    """
+    Пул потоков для инференса (декодирование и отрисовка идут в своих пулах, src.utils.pipeline).
+    Синхронные вызовы уходят с event loop; при занятом пуле задачи ждут в очереди пула.
+    При process_workers > 0 прямой проход модели выполняется в пуле процессов
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        process_workers: int = 0,
+        threads_per_process: int = 0,
+        warmup_batch_sizes: list[int] | None = None,
+        warmup_imgsz: list[int] | None = None,
+    ):
+        self.max_workers = max(1, max_workers)
+        self.warmup_batch_sizes = warmup_batch_sizes
+        self.warmup_imgsz = warmup_imgsz
+        self.worker_pool = (
+            InferenceWorkerPool(process_workers, threads_per_process, warmup_batch_sizes, warmup_imgsz)
+            if process_workers > 0 else None
+        )
+        # готовность к трафику: модель загружена и прогрета (или прогрев не удался — тогда degraded)
+        self.ready = False
+        # ошибка загрузки модели: сервис принимает трафик, а предикт пробует загрузить модель заново на запросе
+        self.degraded: str | None = None
+        self.warmup_time: float | None = None
+        self._pool: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._running = 0
+        self._completed = 0
+
+    def start(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+
+    async def start_worker_pool(self):
+        """Запуск процессов с моделью (блокирующая загрузка уходит в отдельный поток)"""
+        if self.worker_pool is not None:
+            await asyncio.to_thread(self.worker_pool.start)
+            set_class_names(self.worker_pool.class_names)
+
+    async def warmup(self) -> float:
+        """
+        Загрузка и прогрев модели до приёма трафика: в пуле процессов (воркеры прогреваются при старте)
+        или в процессе API. Если пул не поднялся, модель прогревается в процессе API.
+        Если не загрузилась и там, сервис всё равно помечается готовым в режиме degraded
+        (остальные эндпоинты работают), а ошибка пробрасывается для лога. Возвращает время в секундах
+        """
+        start = time.perf_counter()
+        try:
+            if self.worker_pool is not None:
+                try:
+                    await self.start_worker_pool()
+                except Exception as e:
+                    print(f" Пул воркеров инференса не запустился, модель прогревается в процессе API: {e}")
+                    self.worker_pool = None
+            if self.worker_pool is None:
+                await self.run(warmup, self.warmup_batch_sizes, self.warmup_imgsz)
+        except Exception as e:
+            self.degraded = str(e) or type(e).__name__
+            raise
+        finally:
+            self.warmup_time = time.perf_counter() - start
+            self.ready = True
+        return self.warmup_time
+
+    def fixed_imgsz(self) -> tuple[int, int] | None:
+        """Размер входа статической модели: из воркеров пула или из модели в процессе API"""
+        if self.degraded is not None:
+            return None
+        if self.worker_pool is not None:
+            return self.worker_pool.fixed_imgsz
+        return get_fixed_imgsz()
+
+    def shutdown(self):
+        self.ready = False
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Выполняет fn в пуле и ждёт результат, не блокируя event loop"""
+        self.start()
+        with self._lock:
+            self._submitted += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._pool, partial(self._call, fn, *args, **kwargs)
+            )
+        finally:
+            with self._lock:
+                self._submitted -= 1
+
+    @property
+    def concurrency(self) -> int:
+        """Сколько прямых проходов модели идёт одновременно: процессов в пуле или потоков"""
+        return self.worker_pool.num_workers if self.worker_pool is not None else self.max_workers
+
+    async def detect(self, frames: list[np.ndarray], **params) -> tuple[list[Detections], float]:
+        """Прямой проход модели: в пуле процессов, если он включён, иначе в пуле потоков"""
+        if self.worker_pool is not None:
+            return await self.worker_pool.detect(frames, **params)
+        return await self.run(detect, frames, **params)
+
+    def _call(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    def stats(self) -> dict:
+        """Размер пула и число задач в работе/в очереди"""
+        with self._lock:
+            stats = {
+                "workers": self.max_workers,
+                "in_flight": self._submitted,
+                "running": self._running,
+                "queued": max(self._submitted - self._running, 0),
+                "completed": self._completed,
+                "ready": self.ready,
+                "degraded": self.degraded,
+                "warmup_time_s": self.warmup_time,
+            }
+        if self.worker_pool is not None:
+            stats["process_pool"] = self.worker_pool.stats()
+        return stats
+
+
+inference_executor = InferenceExecutor(
+    max_workers=settings.INFERENCE_WORKERS,
+    process_workers=settings.ML_WORKERS,
+    threads_per_process=settings.ML_WORKER_THREADS,
+    # тайловый режим не меняет imgsz, но гоняет кадр вместе с тайлами: до TILE_MAX_TILES + 1 кадров за проход
+    warmup_batch_sizes=sorted(
+        {1, settings.ML_BATCH_SIZE, settings.MICROBATCH_MAX_BATCH_SIZE}
+        | ({settings.TILE_MAX_TILES + 1} if settings.TILED_INFERENCE else set())
+    ),
+    # все размеры входа, на которых модель будет работать: ML_WARMUP_IMGSZ и ступени каскада
+    warmup_imgsz=sorted(set(ML_WARMUP_IMGSZ) | set(inference_cascade.tiers)),
+)
@@ -0,0 +1,319 @@
+import asyncio
+import os
+import re
+import threading
+import time
+
+from src.config import Settings
+from src.ML.render import FORMATS
+from src.ML.yolo import MEDIA_DIR
+from src.utils.metrics import registry
+
+settings = Settings()
+
+RESULT_PREFIX = "processed_"
+# расширение результата задаёт формат отрисовки (VISUALIZATION_FORMAT)
+RESULT_SUFFIXES = tuple(extension for extension, _ in FORMATS.values())
+_SUFFIXES = "|".join(re.escape(suffix) for suffix in RESULT_SUFFIXES)
+# id результата — uuid4().hex, первые два символа задают шард
+_RESULT_NAME = re.compile(rf"^{RESULT_PREFIX}([0-9a-f]{{32}})({_SUFFIXES})$")
+# файлы результата в шарде: само изображение и его миниатюры processed_<id>.w<ширина>.webp
+_RESULT_FILE = re.compile(rf"^{RESULT_PREFIX}([0-9a-f]{{32}})(?:{_SUFFIXES}|\.w\d+\.webp)$")
+_PENDING_NAME = re.compile(rf"^([0-9a-f]{{32}})\.(?:img|json|render(?:\.[0-9a-f]{{32}})?(?:{_SUFFIXES}))$")
+# результаты старых версий: processed_<uuid4 с дефисами>.jpg в корне media/. Их id — тот же uuid без дефисов,
+# при первом проходе уборки они переносятся в шарды, а старые url продолжают работать
+_LEGACY_RESULT_NAME = re.compile(rf"^{RESULT_PREFIX}([0-9a-f]{{8}}(?:-[0-9a-f]{{4}}){{3}}-[0-9a-f]{{12}})(\.jpg)$")
+# временные файлы старой версии предикта в корне media/
+_LEGACY_TEMP_PREFIX = "temp_"
+# файлы, которые старый run_inference перезаписывал на каждый запрос; их больше никто не читает
+_LEGACY_FILES = ("predictions.json", "vis_result.jpg")
+
+REMOVED = registry.counter(
+    "media_store_removed_total",
+    "Удалённые файлы результатов: age — старше срока хранения, quota — вытеснены по LRU, orphan — мусор",
+    ("reason",),
+)
+
+
+class MediaStore:
+    """
+    Хранилище результатов предикта в media/.
+    Готовые изображения лежат в results/<shard>/processed_<id>.jpg (или .webp), несохранённые отрисовки —
+    в pending/<shard>/<id>.*, где shard — первые два символа id: в одном каталоге сотни файлов,
+    а не сотни тысяч. Url при этом остаются плоскими (/media/processed_<id>.jpg).
+
+    Источник правды — сам диск: фоновая уборка раз в sweep_interval секунд обходит шарды,
+    удаляет результаты старше max_age (по времени создания), затем вытесняет давно не открывавшиеся
+    (время доступа выставляется при каждой выдаче), пока размер не опустится ниже max_bytes,
+    и убирает мусор от упавших запросов. Поэтому уборка корректна и при нескольких процессах API.
+    media/jobs (файлы фоновых задач) хранилище не трогает
+    """
+
+    # после вытеснения по квоте остаётся запас, чтобы не убирать на каждой новой записи
+    LOW_WATERMARK = 0.9
+
+    def __init__(self, media_dir: str, max_bytes: int, max_age: float, sweep_interval: float, orphan_age: float):
+        self.media_dir = media_dir
+        self.results_dir = os.path.join(media_dir, "results")
+        self.pending_dir = os.path.join(media_dir, "pending")
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sweep_interval = max(sweep_interval, 1.0)
+        self.orphan_age = orphan_age
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._files = 0
+        self._results = 0
+        self._pending = 0
+        self._removed = {"age": 0, "quota": 0, "orphan": 0}
+        self._sweeps = 0
+        self._last_sweep: float | None = None
+        self._last_sweep_s = 0.0
+        self._worker: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @staticmethod
+    def _match(filename: str) -> tuple[str, str] | None:
+        """(id, расширение) результата по имени из url, в том числе старого формата"""
+        match = _RESULT_NAME.match(filename)
+        if match is not None:
+            return match.group(1), match.group(2)
+        match = _LEGACY_RESULT_NAME.match(filename)
+        if match is not None:
+            return match.group(1).replace("-", ""), match.group(2)
+        return None
+
+    @classmethod
+    def result_id(cls, filename: str) -> str | None:
+        match = cls._match(filename)
+        return match[0] if match else None
+
+    def result_path(self, result_id: str, suffix: str = RESULT_SUFFIXES[0]) -> str:
+        return os.path.join(self.results_dir, result_id[:2], f"{RESULT_PREFIX}{result_id}{suffix}")
+
+    def thumbnail_path(self, result_id: str, width: int) -> str:
+        """Миниатюры лежат рядом с изображением и убираются вместе с ним"""
+        return os.path.join(self.results_dir, result_id[:2], f"{RESULT_PREFIX}{result_id}.w{width}.webp")
+
+    def pending_paths(self, result_id: str) -> tuple[str, str]:
+        shard = os.path.join(self.pending_dir, result_id[:2])
+        return os.path.join(shard, f"{result_id}.img"), os.path.join(shard, f"{result_id}.json")
+
+    def path(self, filename: str) -> str:
+        """Путь к файлу по имени из url: результаты — в своём шарде, остальное — в корне media/"""
+        match = self._match(filename)
+        if match is None:
+            return os.path.join(self.media_dir, filename)
+        path = self.result_path(*match)
+        flat = os.path.join(self.media_dir, filename)
+        # результат старой версии, который уборка ещё не перенесла в шард
+        if not os.path.exists(path) and os.path.isfile(flat):
+            return flat
+        return path
+
+    def added(self, nbytes: int, files: int = 1):
+        """Учёт записанного результата; при превышении квоты уборка запускается сразу, не дожидаясь периода"""
+        with self._lock:
+            self._bytes += nbytes
+            self._files += files
+            over_quota = self.max_bytes > 0 and self._bytes > self.max_bytes
+        if over_quota and self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    @staticmethod
+    def touch(path: str, stat: os.stat_result | None = None):
+        """Отметка доступа для LRU: меняется только atime, время создания (mtime) остаётся для срока хранения"""
+        try:
+            os.utime(path, ns=(time.time_ns(), (stat or os.stat(path)).st_mtime_ns))
+        except OSError:
+            pass
+
+    def start(self):
+        """Запуск фоновой уборки (на текущем event loop); первый проход — сразу"""
+        if self._worker is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._wake.set()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.sweep_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f" Ошибка уборки media: {e}")
+
+    def sweep(self):
+        """Один проход уборки (выполняется в потоке)"""
+        started = time.perf_counter()
+        now = time.time()
+        self._migrate_flat_layout()
+        self._remove_legacy_files(now)
+
+        # id результата -> [размер, создан, последний доступ, пути]
+        entries: dict[str, list] = {}
+        pending = set()
+        for kind, base in (("result", self.results_dir), ("pending", self.pending_dir)):
+            for path, name, stat in self._scan(base):
+                result_id = self._entry_id(kind, name)
+                if result_id is None:
+                    # брошенный временный файл миниатюры
+                    if name.endswith(".tmp") and now - stat.st_mtime >= self.orphan_age:
+                        self._remove([path], "orphan")
+                    continue
+                if kind == "pending":
+                    if self._is_orphan(path, name, stat, now):
+                        self._remove([path], "orphan")
+                        continue
+                    pending.add(result_id)
+                entry = entries.setdefault(result_id, [0, stat.st_mtime, 0.0, []])
+                entry[0] += stat.st_size
+                entry[1] = min(entry[1], stat.st_mtime)
+                entry[2] = max(entry[2], stat.st_atime, stat.st_mtime)
+                entry[3].append(path)
+
+        if self.max_age > 0:
+            for result_id in [key for key, entry in entries.items() if now - entry[1] > self.max_age]:
+                self._remove(entries.pop(result_id)[3], "age")
+
+        total = sum(entry[0] for entry in entries.values())
+        if self.max_bytes > 0 and total > self.max_bytes:
+            for result_id in sorted(entries, key=lambda key: entries[key][2]):
+                if total <= self.max_bytes * self.LOW_WATERMARK:
+                    break
+                size, _, _, paths = entries.pop(result_id)
+                self._remove(paths, "quota")
+                total -= size
+
+        with self._lock:
+            self._bytes = total
+            self._files = sum(len(entry[3]) for entry in entries.values())
+            self._pending = len(pending & entries.keys())
+            self._results = len(entries) - self._pending
+            self._sweeps += 1
+            self._last_sweep = now
+            self._last_sweep_s = time.perf_counter() - started
+
+    @staticmethod
+    def _scan(base: str):
+        if not os.path.isdir(base):
+            return
+        with os.scandir(base) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        try:
+                            yield entry.path, entry.name, entry.stat()
+                        except FileNotFoundError:
+                            continue
+
+    @staticmethod
+    def _entry_id(kind: str, name: str) -> str | None:
+        match = (_RESULT_FILE if kind == "result" else _PENDING_NAME).match(name)
+        return match.group(1) if match else None
+
+    def _is_orphan(self, path: str, name: str, stat: os.stat_result, now: float) -> bool:
+        """
+        Мусор в pending: брошенный временный файл отрисовки или исходник без json детекций
+        (json пишется последним — запрос упал посреди сохранения), старше orphan_age
+        """
+        if now - stat.st_mtime < self.orphan_age:
+            return False
+        if ".render." in name:
+            return True
+        if name.endswith(".img"):
+            return not os.path.exists(path[:-len(".img")] + ".json")
+        if name.endswith(".json"):
+            return not os.path.exists(path[:-len(".json")] + ".img")
+        return False
+
+    def _remove_legacy_files(self, now: float):
+        """temp_* от запросов, упавших в старой версии, и выходные файлы старого run_inference в корне media/"""
+        with os.scandir(self.media_dir) as entries:
+            for entry in entries:
+                if (
+                    (entry.name.startswith(_LEGACY_TEMP_PREFIX) or entry.name in _LEGACY_FILES)
+                    and entry.is_file()
+                    and now - entry.stat().st_mtime >= self.orphan_age
+                ):
+                    self._remove([entry.path], "orphan")
+
+    def _migrate_flat_layout(self):
+        """
+        Результаты, сохранённые плоско (в корне media/ и pending/), переносятся в шарды.
+        Результаты старого формата при переносе получают имя по id без дефисов; время создания
+        и доступа сохраняется, поэтому дальше на них действуют срок хранения и квота
+        """
+        if os.path.isdir(self.media_dir):
+            for path, name in self._flat_files(self.media_dir):
+                match = self._match(name)
+                if match is not None:
+                    self._move(path, self.result_path(*match))
+        if os.path.isdir(self.pending_dir):
+            for path, name in self._flat_files(self.pending_dir):
+                match = _PENDING_NAME.match(name)
+                if match is not None:
+                    self._move(path, os.path.join(self.pending_dir, match.group(1)[:2], name))
+
+    @staticmethod
+    def _flat_files(base: str) -> list[tuple[str, str]]:
+        with os.scandir(base) as entries:
+            return [(entry.path, entry.name) for entry in entries if entry.is_file()]
+
+    @staticmethod
+    def _move(path: str, target: str):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+
+    def _remove(self, paths: list[str], reason: str):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            REMOVED.inc(reason=reason)
+            with self._lock:
+                self._removed[reason] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "bytes": self._bytes,
+                "files": self._files,
+                "results": self._results,
+                "pending": self._pending,
+                "max_bytes": self.max_bytes,
+                "max_age_s": self.max_age,
+                "usage": self._bytes / self.max_bytes if self.max_bytes else None,
+                "removed": dict(self._removed),
+                "sweeps": self._sweeps,
+                "last_sweep_at": self._last_sweep,
+                "last_sweep_s": self._last_sweep_s,
+            }
+
+
+media_store = MediaStore(
+    MEDIA_DIR,
+    max_bytes=settings.MEDIA_MAX_MB * 2**20,
+    max_age=settings.MEDIA_MAX_AGE_HOURS * 3600,
+    sweep_interval=settings.MEDIA_SWEEP_INTERVAL,
+    orphan_age=settings.MEDIA_ORPHAN_AGE,
+)
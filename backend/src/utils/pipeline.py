@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable
+
+from src.config import Settings
+
+settings = Settings()
+
+
+class DecodePool:
+    """
+    Отдельный пул потоков для декодирования загрузок (cv2.imdecode отпускает GIL),
+    чтобы декодирование следующих кусков пакета шло параллельно и не занимало потоки инференса.
+    Так же устроен пул отрисовки и записи результатов (render_pool)
+    """
+
+    def __init__(self, max_workers: int, name: str = "decode"):
+        self.max_workers = max(1, max_workers)
+        self.name = name
+        self._pool: ThreadPoolExecutor | None = None
+
+    def start(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        self.start()
+        return await asyncio.get_running_loop().run_in_executor(self._pool, partial(fn, *args, **kwargs))
+
+
+class PipelineStats:
+    """
+    Загрузка стадий конвейера пакетной обработки (decode -> inference -> postprocess).
+    По каждой стадии копится время работы (busy), ожидания входа (starved — предыдущая стадия не успевает)
+    и ожидания места в выходной очереди (blocked — следующая стадия не успевает).
+    utilization — доля busy от суммарного времени работы конвейеров
+    """
+
+    STAGES = ("decode", "inference", "postprocess")
+    QUEUES = ("decoded", "inferred")
+
+    def __init__(self, queue_size: int):
+        self.queue_size = max(1, queue_size)
+        self._lock = threading.Lock()
+        self._stages = {name: {"busy": 0.0, "starved": 0.0, "blocked": 0.0} for name in self.STAGES}
+        self._queues: dict[str, set[asyncio.Queue]] = {name: set() for name in self.QUEUES}
+        self._max_depth = dict.fromkeys(self.QUEUES, 0)
+        self._active = 0
+        self._runs = 0
+        self._wall = 0.0
+
+    @contextmanager
+    def run(self):
+        """Один конвейер: создаёт его очереди и учитывает время работы"""
+        queues = {name: asyncio.Queue(maxsize=self.queue_size) for name in self.QUEUES}
+        with self._lock:
+            self._active += 1
+            self._runs += 1
+            for name, queue in queues.items():
+                self._queues[name].add(queue)
+        start = time.perf_counter()
+        try:
+            yield queues
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._wall += time.perf_counter() - start
+                for name, queue in queues.items():
+                    self._queues[name].discard(queue)
+
+    def _add(self, stage: str, kind: str, seconds: float):
+        with self._lock:
+            self._stages[stage][kind] += seconds
+
+    @contextmanager
+    def busy(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(stage, "busy", time.perf_counter() - start)
+
+    async def get(self, queue: asyncio.Queue, stage: str) -> Any:
+        start = time.perf_counter()
+        item = await queue.get()
+        self._add(stage, "starved", time.perf_counter() - start)
+        return item
+
+    async def put(self, queue: asyncio.Queue, item: Any, stage: str, name: str):
+        start = time.perf_counter()
+        await queue.put(item)
+        self._add(stage, "blocked", time.perf_counter() - start)
+        with self._lock:
+            self._max_depth[name] = max(self._max_depth[name], queue.qsize())
+
+    def queue_depth(self, name: str) -> int:
+        with self._lock:
+            return sum(queue.qsize() for queue in self._queues[name])
+
+    def stats(self) -> dict:
+        with self._lock:
+            wall = self._wall
+            stages = {name: dict(values) for name, values in self._stages.items()}
+            max_depth = dict(self._max_depth)
+            active, runs = self._active, self._runs
+        return {
+            "active": active,
+            "runs": runs,
+            "queue_size": self.queue_size,
+            "queues": {
+                name: {"depth": self.queue_depth(name), "max_depth": max_depth[name]} for name in self.QUEUES
+            },
+            "stages": {
+                name: {
+                    **{f"{kind}_s": round(seconds, 3) for kind, seconds in values.items()},
+                    "utilization": round(values["busy"] / wall, 3) if wall else 0.0,
+                }
+                for name, values in stages.items()
+            },
+        }
+
+
+decode_pool = DecodePool(max_workers=settings.DECODE_WORKERS)
+# запись результатов предикта, отрисовка и миниатюры: ответы /predict/ и галерея не ждут прямых проходов модели
+render_pool = DecodePool(max_workers=settings.RENDER_WORKERS, name="render")
+batch_pipeline = PipelineStats(queue_size=settings.PIPELINE_QUEUE_SIZE)
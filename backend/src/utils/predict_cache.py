@@ -0,0 +1,84 @@
+import asyncio
+import hashlib
+import json
+import time
+
+from src.config import Settings
+from src.ML.detections import Detections
+from src.ML.yolo import MODEL_VERSION
+from src.utils.redis_client import RedisClient, redis_client
+
+settings = Settings()
+
+# после ошибки Redis кэш отключается на это время, чтобы недоступный Redis не тормозил каждый запрос
+RETRY_AFTER_SECONDS = 30.0
+
+
+class PredictCache:
+    """
+    Кэш сырых детекций в Redis. Ключ — sha256 байтов изображения, версия модели
+    и параметры инференса, поэтому повторная загрузка того же фото не идёт в модель
+    """
+
+    def __init__(self, client: RedisClient, ttl: int, enabled: bool = True):
+        self.client = client
+        self.ttl = ttl
+        self.enabled = enabled
+        self._hits = 0
+        self._misses = 0
+        self._errors = 0
+        self._unavailable_until = 0.0
+
+    @staticmethod
+    def key(content: bytes, conf: float, iou: float = 0.6, imgsz: int | str = 640, max_det: int = 150) -> str:
+        digest = hashlib.sha256(content).hexdigest()
+        return f"predict:{MODEL_VERSION}:{digest}:{conf}:{iou}:{imgsz}:{max_det}"
+
+    def _available(self) -> bool:
+        return self.enabled and time.monotonic() >= self._unavailable_until
+
+    def _call(self, fn):
+        try:
+            return fn(self.client.connect())
+        except Exception:
+            self._errors += 1
+            self._unavailable_until = time.monotonic() + RETRY_AFTER_SECONDS
+            return None
+
+    async def get(self, content: bytes, **params) -> Detections | None:
+        if not self._available():
+            return None
+        key = self.key(content, **params)
+        # redis-клиент синхронный, поэтому запрос уходит с event loop
+        raw = await asyncio.to_thread(self._call, lambda redis: redis.get(key))
+        if raw is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return Detections.from_dict(json.loads(raw))
+
+    async def set(self, content: bytes, detections: Detections, **params):
+        if not self._available():
+            return
+        key = self.key(content, **params)
+        value = json.dumps(detections.to_dict())
+        await asyncio.to_thread(self._call, lambda redis: redis.set(key, value, ex=self.ttl))
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "ttl": self.ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+            "errors": self._errors,
+            "available": self._available(),
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+        }
+
+
+predict_cache = PredictCache(
+    client=redis_client,
+    ttl=settings.PREDICT_CACHE_TTL,
+    enabled=settings.PREDICT_CACHE_ENABLED,
+)
@@ -98,6 +98,33 @@ class RedisClient:
         except Exception:
             return -1
     
+    def rpush(self, key: str, *values: Any, ex: Optional[int] = None) -> int:
+        """Добавление в конец списка (с обновлением ttl)"""
+        try:
+            client = self.connect()
+            values = [json.dumps(v) if isinstance(v, (dict, list)) else v for v in values]
+            pipe = client.pipeline()
+            pipe.rpush(key, *values)
+            if ex:
+                pipe.expire(key, ex)
+            return pipe.execute()[0]
+        except Exception:
+            return 0
+    
+    def lrange(self, key: str, start: int = 0, end: int = -1) -> list:
+        """Получение элементов списка"""
+        try:
+            client = self.connect()
+            values = []
+            for value in client.lrange(key, start, end):
+                try:
+                    values.append(json.loads(value))
+                except (json.JSONDecodeError, TypeError):
+                    values.append(value)
+            return values
+        except Exception:
+            return []
+    
     def keys(self, pattern: str = "*") -> list:
         """Проверка паттерна ключей"""
         try:
@@ -1,41 +1,110 @@
 import io
-from typing import List
-import zipfile
 import os
-from fastapi import  UploadFile, HTTPException
+import zipfile
+import zlib
+from typing import Iterator
+
+from fastapi import UploadFile, HTTPException
+
+from src.config import Settings
+
+settings = Settings()
+
+SUPPORTED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp'}
+
+
+class ZipImages:
+    """
+    Изображения из zip без распаковки архива в память.
+    Архив читается прямо из загруженного файла (starlette держит его на диске),
+    оглавление проверяется по лимитам сразу, а содержимое файлов читается
+    по одному при итерации — в памяти только то, что сейчас обрабатывается
+    """
+
+    def __init__(
+        self,
+        zip_file: UploadFile,
+        max_members: int = settings.ZIP_MAX_MEMBERS,
+        max_member_bytes: int = settings.ZIP_MAX_MEMBER_MB * 2**20,
+        max_total_bytes: int = settings.ZIP_MAX_TOTAL_MB * 2**20,
+        max_compression_ratio: float = settings.ZIP_MAX_COMPRESSION_RATIO,
+    ):
+        self.max_member_bytes = max_member_bytes
+        self.max_total_bytes = max_total_bytes
+        try:
+            zip_file.file.seek(0)
+            self._zip = zipfile.ZipFile(zip_file.file, 'r')
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail="Некорректный ZIP-архив")
+
+        self.members = [
+            info for info in self._zip.infolist()
+            if not info.is_dir()
+            and not os.path.basename(info.filename).startswith('._')
+            and os.path.splitext(info.filename)[1].lower() in SUPPORTED_EXTENSIONS
+        ]
+
+        if len(self.members) > max_members:
+            self.close()
+            raise HTTPException(
+                status_code=413,
+                detail=f"В ZIP-архиве больше {max_members} изображений"
+            )
+        # размеры из оглавления — первая проверка; при чтении они контролируются ещё раз
+        declared_total = 0
+        for info in self.members:
+            declared_total += info.file_size
+            self._check_member(info)
+            if info.file_size / max(info.compress_size, 1) > max_compression_ratio:
+                self.close()
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Подозрительная степень сжатия у {info.filename}"
+                )
+        if declared_total > max_total_bytes:
+            self.close()
+            raise HTTPException(status_code=413, detail="Распакованный ZIP-архив слишком большой")
+
+    def _check_member(self, info: zipfile.ZipInfo, size: int | None = None):
+        if (info.file_size if size is None else size) > self.max_member_bytes:
+            self.close()
+            raise HTTPException(status_code=413, detail=f"Файл {info.filename} в ZIP-архиве слишком большой")
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def __iter__(self) -> Iterator[UploadFile]:
+        total = 0
+        for info in self.members:
+            # читаем не больше лимита + 1 байт: поддельный размер в заголовке не раздует память
+            try:
+                with self._zip.open(info) as member:
+                    content = member.read(self.max_member_bytes + 1)
+            except (zipfile.BadZipFile, zlib.error, EOFError):
+                self.close()
+                raise HTTPException(status_code=400, detail=f"Повреждённый файл {info.filename} в ZIP-архиве")
+            self._check_member(info, len(content))
+            total += len(content)
+            if total > self.max_total_bytes:
+                self.close()
+                raise HTTPException(status_code=413, detail="Распакованный ZIP-архив слишком большой")
+
+            yield UploadFile(
+                filename=os.path.basename(info.filename),
+                file=io.BytesIO(content)
+            )
+
+    def close(self):
+        self._zip.close()
+
 
-def extract_images_from_zip(zip_file: UploadFile) -> List[UploadFile]:
+def extract_images_from_zip(zip_file: UploadFile) -> ZipImages:
     """
-    Извлечение изображения из zip
+    Извлечение изображения из zip (лениво, см. ZipImages)
     """
     try:
-        zip_content = zip_file.file.read()
-        zip_file.file.seek(0)  
-        
-        zip_buffer = io.BytesIO(zip_content)
-        
-        images = []
-        supported_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp'}
-        
-        with zipfile.ZipFile(zip_buffer, 'r') as zip_ref:
-            for file_info in zip_ref.filelist:
-                if not file_info.is_dir():
-                    if os.path.basename(file_info.filename).startswith('._'):
-                        continue
-                    
-                    file_ext = os.path.splitext(file_info.filename)[1].lower()
-                    if file_ext in supported_extensions:
-                        file_content = zip_ref.read(file_info.filename)
-                        
-                        image_file = UploadFile(
-                            filename=os.path.basename(file_info.filename),
-                            file=io.BytesIO(file_content)
-                        )
-                        images.append(image_file)
-        
-        return images
-        
-    except zipfile.BadZipFile:
-        raise HTTPException(status_code=400, detail="Некорректный ZIP-архив")
+        return ZipImages(zip_file)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка при обработке ZIP-архива: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Ошибка при обработке ZIP-архива: {str(e)}")
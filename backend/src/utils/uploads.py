@@ -0,0 +1,58 @@
+import io
+import os
+import shutil
+from typing import BinaryIO, Iterator, List
+
+from fastapi import HTTPException, UploadFile
+
+from src.utils.unzip import ZipImages, extract_images_from_zip
+
+
+def save_uploads(target_dir: str, images: List[UploadFile]) -> list[tuple[str, str]]:
+    """
+    Копирует загруженные файлы в target_dir, чтобы обработка могла пережить запрос
+    (starlette закрывает и удаляет свои временные файлы вместе с ним).
+    Возвращает пары (путь, исходное имя файла)
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    paths = []
+    for index, image in enumerate(images):
+        path = os.path.join(target_dir, f"{index:06d}")
+        image.file.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(image.file, f)
+        paths.append((path, image.filename or "unknown"))
+    return paths
+
+
+def save_archive(target_dir: str, zip_file: UploadFile) -> str:
+    os.makedirs(target_dir, exist_ok=True)
+    path = os.path.join(target_dir, "archive.zip")
+    zip_file.file.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(zip_file.file, f)
+    return path
+
+
+def iter_saved_uploads(paths: list[tuple[str, str]]) -> Iterator[UploadFile]:
+    """Сохранённые файлы читаются с диска по одному, как и члены архива"""
+    for path, filename in paths:
+        with open(path, "rb") as f:
+            yield UploadFile(filename=filename, file=io.BytesIO(f.read()))
+
+
+def open_saved_archive(path: str, filename: str | None) -> tuple[BinaryIO, ZipImages]:
+    """
+    Открывает сохранённый архив и сразу проверяет оглавление,
+    чтобы ошибки лимитов вернулись в ответе на запрос, а не посреди обработки
+    """
+    archive_file = open(path, "rb")
+    try:
+        images = extract_images_from_zip(UploadFile(file=archive_file, filename=filename))
+        if not images:
+            images.close()
+            raise HTTPException(status_code=400, detail="В ZIP-архиве не найдено изображений")
+    except HTTPException:
+        archive_file.close()
+        raise
+    return archive_file, images
@@ -0,0 +1,173 @@
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List
+
+import cv2
+import numpy as np
+from fastapi import HTTPException, UploadFile
+
+from src.config import Settings
+from src.ML.yolo import decode_image
+from src.utils.metrics import registry
+
+settings = Settings()
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v'}
+COPY_CHUNK_SIZE = 2**20
+
+FRAMES = registry.counter(
+    "video_frames_total",
+    "Кадры видео и последовательностей: processed — ушли в модель, skipped — почти совпали с предыдущим",
+    ("outcome",),
+)
+
+
+@dataclass
+class VideoFrame:
+    """Кадр видео (или файл последовательности) с номером и временем от начала в мс"""
+    index: int
+    timestamp_ms: float | None
+    frame: np.ndarray
+
+
+class VideoFrames:
+    """
+    Кадры видеофайла с прореживанием до sample_fps: пропущенные кадры только захватываются
+    (cap.grab), без преобразования в BGR. Видео читается по одному кадру при итерации,
+    в памяти не больше куска, который сейчас обрабатывается
+    """
+
+    def __init__(self, path: str, sample_fps: float, max_frames: int, remove_on_close: bool = False):
+        self.path = path
+        self.max_frames = max(max_frames, 1)
+        self.failed = 0
+        self._remove_on_close = remove_on_close
+        self._capture = cv2.VideoCapture(path)
+        if not self._capture.isOpened():
+            self.close()
+            raise HTTPException(status_code=400, detail="Не удалось открыть видео")
+
+        fps = self._capture.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else 25.0
+        self.step = max(1, round(self.fps / sample_fps)) if sample_fps > 0 else 1
+
+    def __iter__(self) -> Iterator[VideoFrame]:
+        index = 0
+        sampled = 0
+        while sampled < self.max_frames and self._capture.grab():
+            if index % self.step == 0:
+                sampled += 1
+                ok, frame = self._capture.retrieve()
+                if ok:
+                    yield VideoFrame(index=index, timestamp_ms=index * 1000 / self.fps, frame=frame)
+                else:
+                    self.failed += 1
+            index += 1
+
+    def close(self):
+        self._capture.release()
+        if self._remove_on_close and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class FrameSequence:
+    """Последовательность кадров, загруженных отдельными изображениями; нечитаемые файлы пропускаются"""
+
+    def __init__(self, images: List[UploadFile], max_frames: int):
+        self.images = images[:max(max_frames, 1)]
+        self.failed = 0
+
+    def __iter__(self) -> Iterator[VideoFrame]:
+        for index, image in enumerate(self.images):
+            image.file.seek(0)
+            frame = decode_image(image.file.read())
+            if frame is None:
+                self.failed += 1
+                continue
+            yield VideoFrame(index=index, timestamp_ms=None, frame=frame)
+
+    def close(self):
+        pass
+
+
+class SimilarFrameFilter:
+    """
+    Отбрасывает кадры, почти совпадающие с последним оставленным: кадры сравниваются
+    по уменьшенной до size x size серой копии (средняя абсолютная разница яркости в долях от 255).
+    Сравнение идёт с последним оставленным, а не с соседним кадром, поэтому медленный проход камерой
+    накапливает разницу и всё равно даёт новые кадры. threshold <= 0 отключает фильтр
+    """
+
+    def __init__(self, threshold: float, size: int = 32):
+        self.threshold = threshold
+        self.size = size
+        self.seen = 0
+        self.skipped = 0
+        self._last: np.ndarray | None = None
+
+    def signature(self, frame: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, (self.size, self.size), interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+
+    def __call__(self, frames: Iterable[VideoFrame]) -> Iterator[VideoFrame]:
+        for frame in frames:
+            self.seen += 1
+            if self.threshold > 0:
+                signature = self.signature(frame.frame)
+                if self._last is not None and float(np.abs(signature - self._last).mean()) < self.threshold:
+                    self.skipped += 1
+                    FRAMES.inc(outcome="skipped")
+                    continue
+                self._last = signature
+            FRAMES.inc(outcome="processed")
+            yield frame
+
+    @property
+    def processed(self) -> int:
+        return self.seen - self.skipped
+
+
+def open_uploaded_video(
+    video: UploadFile,
+    sample_fps: float = settings.VIDEO_SAMPLE_FPS,
+    max_frames: int = settings.VIDEO_MAX_FRAMES,
+    max_bytes: int = settings.VIDEO_MAX_MB * 2**20,
+) -> VideoFrames:
+    """
+    OpenCV читает видео только по пути, поэтому загрузка копируется во временный файл
+    (удаляется при close) с проверкой размера
+    """
+    suffix = os.path.splitext(video.filename or "")[1].lower()
+    if suffix not in VIDEO_EXTENSIONS:
+        raise HTTPException(
+            status_code=400, detail=f"Неподдерживаемый формат видео, ожидается: {', '.join(sorted(VIDEO_EXTENSIONS))}"
+        )
+
+    too_large = HTTPException(status_code=413, detail=f"Видео больше {max_bytes // 2**20} МБ")
+    # заявленный размер отсекает заведомо большое видео ещё до копирования
+    if video.size is not None and video.size > max_bytes:
+        raise too_large
+
+    fd, path = tempfile.mkstemp(prefix="predict_video_", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            video.file.seek(0)
+            # копирование кусками: большое видео не успевает заполнить /tmp до 413
+            while chunk := video.file.read(COPY_CHUNK_SIZE):
+                f.write(chunk)
+                if f.tell() > max_bytes:
+                    raise too_large
+        return VideoFrames(path, sample_fps, max_frames, remove_on_close=True)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+def encode_frame(frame: np.ndarray) -> bytes:
+    """Кадр видео в JPEG для визуализации (хранилищу нужны байты изображения, как у загрузки)"""
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise ValueError("Не удалось закодировать кадр")
+    return buffer.tobytes()
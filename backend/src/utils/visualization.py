@@ -0,0 +1,244 @@
+import asyncio
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from src.config import Settings
+from src.ML.detections import Detections
+from src.ML.render import FORMATS, tool_labels
+from src.ML.yolo import decode_image, get_class_names, save_visualization
+from src.services.catalog_service import tool_catalog
+from src.utils.media_store import RESULT_PREFIX, MediaStore, media_store
+from src.utils.pipeline import render_pool
+
+settings = Settings()
+
+
+class VisualizationStore:
+    """
+    Отложенная отрисовка результатов. В запросе сохраняются только исходный файл
+    и детекции под id результата, изображение с разметкой рисуется при первом обращении
+    (или фоновой задачей) и дальше отдаётся с диска. Где лежат файлы и сколько они хранятся,
+    решает MediaStore. Подписи — названия инструментов из справочника (tool_catalog),
+    формат, качество и уменьшение перед отрисовкой — VISUALIZATION_FORMAT/QUALITY/MAX_SIDE
+    """
+
+    MODES = ("lazy", "background", "eager")
+
+    def __init__(
+        self,
+        store: MediaStore,
+        mode: str = "lazy",
+        fmt: str = "jpeg",
+        quality: int = 85,
+        max_side: int = 0,
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"VISUALIZATION_MODE должен быть одним из {self.MODES}, получено {mode!r}")
+        if fmt not in FORMATS:
+            raise ValueError(f"VISUALIZATION_FORMAT должен быть одним из {tuple(FORMATS)}, получено {fmt!r}")
+        self.store = store
+        self.mode = mode
+        self.format = fmt
+        self.suffix = FORMATS[fmt][0]
+        self.quality = quality
+        self.max_side = max_side
+        self._labels: dict[int, str] | None = None
+        self._labels_source: dict | None = None
+        # ключ -> [блокировка, сколько потоков её держат или ждут]
+        self._locks: dict[str, list] = {}
+        self._locks_guard = threading.Lock()
+        self._background: set[asyncio.Task] = set()
+        self._stored = 0
+        self._rendered = 0
+        self._thumbnails = 0
+
+    async def save(self, content: bytes, frame: np.ndarray | None, detections: Detections) -> str:
+        """
+        Регистрирует результат и возвращает url будущего изображения.
+        frame может быть None (результат из кэша) — тогда кадр декодируется из content при отрисовке
+        """
+        result_id = uuid.uuid4().hex
+        filename = f"{RESULT_PREFIX}{result_id}{self.suffix}"
+
+        if self.mode == "eager":
+            await render_pool.run(
+                self._render_now, content, frame, detections, self.store.result_path(result_id, self.suffix)
+            )
+            self._rendered += 1
+        else:
+            await render_pool.run(self._store_pending, result_id, content, detections)
+            if self.mode == "background":
+                task = asyncio.create_task(render_pool.run(self.render, filename))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+
+        return f"/media/{filename}"
+
+    def _render_now(self, content: bytes, frame: np.ndarray | None, detections: Detections, path: str):
+        if frame is None:
+            frame = decode_image(content)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._draw(frame, detections, path)
+        self.store.added(os.path.getsize(path))
+
+    def _draw(self, frame: np.ndarray, detections: Detections, path: str):
+        save_visualization(frame, detections, path, self.labels(), self.max_side, self.quality)
+
+    def labels(self) -> dict[int, str]:
+        """Подписи классов модели названиями инструментов; пересобираются, когда справочник перечитан"""
+        tools = tool_catalog.tools
+        if self._labels is None or self._labels_source is not tools:
+            self._labels = tool_labels(get_class_names(), {tool_id: tool.name for tool_id, tool in tools.items()})
+            self._labels_source = tools
+        return self._labels
+
+    def _store_pending(self, result_id: str, content: bytes, detections: Detections):
+        image_path, meta_path = self.store.pending_paths(result_id)
+        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+        with open(image_path, "wb") as f:
+            f.write(content)
+        # json пишется последним: его наличие означает, что результат сохранён целиком
+        meta = json.dumps(detections.to_dict())
+        with open(meta_path, "w") as f:
+            f.write(meta)
+        self._stored += 1
+        self.store.added(len(content) + len(meta), files=2)
+
+    @contextmanager
+    def _locked(self, key: str):
+        """
+        Параллельные вызовы с одним ключом выполняются по очереди. Запись о блокировке убирается,
+        только когда её никто не держит и не ждёт, иначе новый вызов получил бы другую блокировку
+        """
+        with self._locks_guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def render(self, filename: str) -> str | None:
+        """
+        Путь к изображению с разметкой; при первом обращении рисует его.
+        None — если такого результата нет
+        """
+        result_id = self.store.result_id(filename)
+        if result_id is None:
+            return None
+        path = self.store.path(filename)
+        if os.path.exists(path):
+            return path
+        image_path, meta_path = self.store.pending_paths(result_id)
+
+        # параллельные GET одного результата рисуют его один раз
+        with self._locked(result_id):
+            if os.path.exists(path):
+                return path
+            if not (os.path.exists(meta_path) and os.path.exists(image_path)):
+                return None
+
+            try:
+                with open(meta_path) as f:
+                    detections = Detections.from_dict(json.load(f))
+                with open(image_path, "rb") as f:
+                    content = f.read()
+            except FileNotFoundError:
+                # результат успела убрать уборка хранилища
+                return None
+            frame = decode_image(content)
+            if frame is None:
+                return None
+
+            # запись во временный файл и rename — чтобы не отдать недописанный файл;
+            # имя уникально, даже если этот же результат параллельно рисует другой процесс API
+            suffix = os.path.splitext(filename)[1]
+            tmp_path = os.path.join(os.path.dirname(image_path), f"{result_id}.render.{uuid.uuid4().hex}{suffix}")
+            self._draw(frame, detections, tmp_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            self._rendered += 1
+
+            try:
+                pending_size = len(content) + os.path.getsize(meta_path)
+                os.remove(image_path)
+                os.remove(meta_path)
+            except FileNotFoundError:
+                # исходник уже убрал другой процесс, отрисовавший тот же результат
+                return path
+            self.store.added(os.path.getsize(path) - pending_size, files=-1)
+            return path
+
+    def thumbnail(self, filename: str, width: int, quality: int) -> str | None:
+        """
+        Путь к миниатюре результата в WebP шириной не больше width; создаётся один раз
+        из готового изображения (если его ещё нет — сначала рисуется оно).
+        None — если такого результата нет
+        """
+        result_id = self.store.result_id(filename)
+        if result_id is None:
+            return None
+        path = self.store.thumbnail_path(result_id, width)
+        if os.path.exists(path):
+            return path
+        source = self.render(filename)
+        if source is None:
+            return None
+
+        with self._locked(f"{result_id}.w{width}"):
+            if os.path.exists(path):
+                return path
+            frame = cv2.imread(source)
+            if frame is None:
+                return None
+            height, source_width = frame.shape[:2]
+            if source_width > width:
+                size = (width, max(1, round(height * width / source_width)))
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            ok, buffer = cv2.imencode(".webp", frame, [cv2.IMWRITE_WEBP_QUALITY, quality])
+            if not ok:
+                return None
+
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(buffer.tobytes())
+            os.replace(tmp_path, path)
+            self._thumbnails += 1
+            self.store.added(buffer.size)
+            return path
+
+    async def stop(self):
+        """Дожидается фоновой отрисовки перед остановкой пула"""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "format": self.format,
+            "quality": self.quality,
+            "max_side": self.max_side,
+            "stored": self._stored,
+            "rendered": self._rendered,
+            "thumbnails": self._thumbnails,
+            "background_pending": len(self._background),
+        }
+
+
+visualization_store = VisualizationStore(
+    media_store,
+    settings.VISUALIZATION_MODE,
+    fmt=settings.VISUALIZATION_FORMAT,
+    quality=settings.VISUALIZATION_QUALITY,
+    max_side=settings.VISUALIZATION_MAX_SIDE,
+)
@@ -0,0 +1,186 @@
+"""
+Общие фикстуры: тесты идут без настоящей модели, PostgreSQL и Redis.
+Вместо best.onnx — крошечная ONNX-модель с фиксированным выходом, вместо Redis — словарь в памяти,
+вместо запросов к БД — небольшой справочник инструментов и один набор
+"""
+import fnmatch
+import os
+import shutil
+import tempfile
+import types
+
+for name, value in {
+    "DB_NAME": "test", "DB_PORT": "5432", "DB_HOST": "localhost", "DB_USER": "test", "DB_PASSWORD": "test",
+    "REDIS_HOST": "localhost", "REDIS_PORT": "6379", "REDIS_PASSWORD": "", "REDIS_DB": "0",
+    "ML_BACKEND": "onnxruntime",
+}.items():
+    os.environ.setdefault(name, value)
+
+import numpy as np
+import pytest
+
+from src.ML import yolo
+from tests.synthetic_model import build_model
+
+# хранилище результатов берёт путь при импорте, поэтому подменяется до импорта приложения
+MEDIA_DIR = tempfile.mkdtemp(prefix="test_media_")
+yolo.MEDIA_DIR = MEDIA_DIR
+
+TOOLS = {
+    tool_id: types.SimpleNamespace(id=tool_id, name=f"Инструмент {tool_id}", serial_number=f"S{tool_id}", category="test")
+    for tool_id in (1, 2, 3)
+}
+# набор 1: по одному инструменту 1, 2 и 3 — модель находит только 1 и 2
+TOOLKIT_ITEMS = [types.SimpleNamespace(toolkit_id=1, tool_id=tool_id, quantity=1) for tool_id in TOOLS]
+
+
+class FakeRedis:
+    """Минимум redis.Redis (decode_responses=True) для RedisClient и кэша предикта, без TTL"""
+
+    def __init__(self):
+        self.data = {}
+
+    def ping(self):
+        return True
+
+    def close(self):
+        pass
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = str(value)
+        return True
+
+    def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def expire(self, key, time):
+        return key in self.data
+
+    def ttl(self, key):
+        return -1 if key in self.data else -2
+
+    def rpush(self, key, *values):
+        items = self.data.setdefault(key, [])
+        items.extend(str(value) for value in values)
+        return len(items)
+
+    def lrange(self, key, start, end):
+        items = self.data.get(key, [])
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    def keys(self, pattern="*"):
+        return [key for key in self.data if fnmatch.fnmatchcase(key, pattern)]
+
+    def flushdb(self):
+        self.data.clear()
+        return True
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Команды копятся и выполняются по execute(), как в redis.client.Pipeline"""
+
+    def __init__(self, redis: FakeRedis):
+        self._redis = redis
+        self._calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+            return self
+        return call
+
+    def execute(self):
+        calls, self._calls = self._calls, []
+        return [getattr(self._redis, name)(*args, **kwargs) for name, args, kwargs in calls]
+
+
+@pytest.fixture(scope="session")
+def model_path(tmp_path_factory) -> str:
+    path = str(tmp_path_factory.mktemp("model") / "synthetic.onnx")
+    build_model(path)
+    return path
+
+
+@pytest.fixture(scope="session")
+def fake_redis():
+    from src.utils.redis_client import redis_client
+
+    redis = FakeRedis()
+    with pytest.MonkeyPatch.context() as mp:
+        # connect() отдаёт уже созданный клиент, а disconnect() при остановке приложения его не закрывает
+        mp.setattr(redis_client, "_client", redis)
+        mp.setattr(redis_client, "disconnect", lambda: None)
+        yield redis
+
+
+@pytest.fixture(scope="session")
+def app(model_path, fake_redis):
+    """Приложение на синтетической модели, с fake Redis и справочником вместо БД"""
+    from src.repo import predict_repos
+
+    def rows(values):
+        async def get(self, *args, **kwargs):
+            return values
+        return get
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(yolo, "MODEL_PATH", model_path)
+        mp.setattr(yolo, "USE_ORT", True)
+        mp.setattr(predict_repos.ToolRepo, "get", rows(list(TOOLS.values())))
+        mp.setattr(predict_repos.ToolKitRepo, "get", rows([types.SimpleNamespace(id=1)]))
+        mp.setattr(predict_repos.ToolKitItemRepo, "get", rows(TOOLKIT_ITEMS))
+
+        from src.main import app
+        from src.utils import database
+        from src.utils.dependencies import get_db_session
+
+        async def no_session():
+            yield None
+
+        async def no_engine():
+            pass
+
+        # без PostgreSQL: старт приложения не пытается подключиться, снимок каталога читается из подменённых репозиториев
+        mp.setattr(database.db_manager, "create_engine", no_engine)
+        mp.setattr("src.main.create_mock_data", no_engine)
+        mp.setattr(database.db_manager, "session_factory", lambda: _NullSession())
+        app.dependency_overrides[get_db_session] = no_session
+        yield app
+        app.dependency_overrides.clear()
+
+
+class _NullSession:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def jpeg() -> bytes:
+    import cv2
+
+    image = np.random.default_rng(0).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(MEDIA_DIR, ignore_errors=True)
@@ -0,0 +1,45 @@
+"""Крошечная ONNX-модель вместо best.onnx: выход YOLO с заранее известными детекциями"""
+import numpy as np
+import onnx
+from onnx import TensorProto, helper
+
+MODEL_IMGSZ = 64
+# имена классов модели — id инструментов в БД
+CLASS_NAMES = {0: "1", 1: "2", 2: "3"}
+# выход модели (4 + nc, anchors) в координатах входа 64x64: xywh и скоры классов.
+# Второй бокс почти совпадает с первым и уходит в NMS, последний ниже порога уверенности,
+# остальные якоря пустые
+MODEL_OUTPUT = np.array([
+    # x     y     w     h    cls0  cls1  cls2
+    [16.0, 16.0, 8.0, 8.0, 0.9, 0.0, 0.0],
+    [17.0, 17.0, 8.0, 8.0, 0.7, 0.0, 0.0],
+    [40.0, 40.0, 10.0, 10.0, 0.0, 0.8, 0.0],
+    [50.0, 10.0, 4.0, 4.0, 0.0, 0.0, 0.1],
+    *[[0.0] * 7] * 4,
+], dtype=np.float32).T
+
+
+def build_model(path: str):
+    """Y = MODEL_OUTPUT + 0 * mean(X): выход не зависит от кадра, батч динамический, вход 64x64"""
+    mean = helper.make_node("ReduceMean", ["X"], ["mean"], axes=[1, 2, 3], keepdims=0)
+    column = helper.make_node("Reshape", ["mean", "column_shape"], ["column"])
+    zero = helper.make_node("Mul", ["column", "zero"], ["zeros"])
+    output = helper.make_node("Add", ["zeros", "output"], ["Y"])
+    graph = helper.make_graph(
+        [mean, column, zero, output],
+        "synthetic_yolo",
+        [helper.make_tensor_value_info("X", TensorProto.FLOAT, ["batch", 3, MODEL_IMGSZ, MODEL_IMGSZ])],
+        [helper.make_tensor_value_info("Y", TensorProto.FLOAT, ["batch", *MODEL_OUTPUT.shape])],
+        initializer=[
+            helper.make_tensor("column_shape", TensorProto.INT64, [3], [-1, 1, 1]),
+            helper.make_tensor("zero", TensorProto.FLOAT, [], [0.0]),
+            helper.make_tensor(
+                "output", TensorProto.FLOAT, [1, *MODEL_OUTPUT.shape], MODEL_OUTPUT.flatten().tolist()
+            ),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    helper.set_model_props(model, {"names": repr(CLASS_NAMES)})
+    onnx.checker.check_model(model)
+    onnx.save(model, path)
@@ -0,0 +1,85 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def prediction(client, jpeg) -> dict:
+    response = client.post(
+        "/predict/", files={"image": ("tools.jpg", jpeg, "image/jpeg")}, data={"toolkit_id": 1, "confidence": 0.25}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_ready_after_warmup(client):
+    response = client.get("/base/ready")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+
+def test_predict_reconciles_with_toolkit(prediction):
+    # синтетическая модель находит инструменты 1 и 2, инструмента 3 из набора нет
+    assert sorted(prediction["ml_predictions"]) == [1, 2]
+    assert [tool["id"] for tool in prediction["found_tools"]] == [1, 2]
+    assert prediction["hand_check"] is True
+    missing = {row["tool_id"]: row["missing"] for row in prediction["reconciliation"]}
+    assert missing == {1: 0, 2: 0, 3: 1}
+    assert prediction["processed_image_url"].startswith("/media/")
+
+
+@pytest.mark.parametrize("content", [b"", b"not an image"])
+def test_predict_rejects_undecodable_upload(client, content):
+    response = client.post(
+        "/predict/", files={"image": ("broken.jpg", content, "image/jpeg")}, data={"toolkit_id": 1}
+    )
+
+    assert response.status_code == 400
+
+
+def test_media_serves_result_with_etag(client, prediction):
+    response = client.get(prediction["processed_image_url"])
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.content.startswith(b"\xff\xd8")
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["etag"]
+
+
+def test_media_answers_304_for_known_etag(client, prediction):
+    url = prediction["processed_image_url"]
+    etag = client.get(url).headers["etag"]
+
+    response = client.get(url, headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_media_serves_byte_ranges(client, prediction):
+    url = prediction["processed_image_url"]
+    full = client.get(url).content
+
+    response = client.get(url, headers={"Range": "bytes=0-9"})
+
+    assert response.status_code == 206
+    assert response.content == full[:10]
+    assert response.headers["content-range"] == f"bytes 0-9/{len(full)}"
+
+
+def test_media_rejects_unknown_thumbnail_width(client, prediction):
+    response = client.get(prediction["processed_image_url"], params={"size": 123})
+
+    assert response.status_code == 400
+
+
+def test_media_serves_thumbnail(client, prediction):
+    response = client.get(prediction["processed_image_url"], params={"size": 160})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+
+
+def test_media_missing_file_is_404(client):
+    assert client.get("/media/missing.jpg").status_code == 404
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from src.ML.onnx_engine import OnnxEngine, nms
+
+from tests.synthetic_model import CLASS_NAMES, MODEL_IMGSZ, MODEL_OUTPUT
+
+
+@pytest.fixture(scope="module")
+def engine(model_path) -> OnnxEngine:
+    return OnnxEngine(model_path)
+
+
+def test_nms_drops_overlapping_boxes():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30]], dtype=np.float32)
+    scores = np.array([0.9, 0.8, 0.7], dtype=np.float32)
+
+    assert nms(boxes, scores, iou_threshold=0.5, max_det=10).tolist() == [0, 2]
+    # при высоком пороге перекрытие не мешает
+    assert nms(boxes, scores, iou_threshold=0.9, max_det=10).tolist() == [0, 1, 2]
+
+
+def test_nms_orders_by_score_and_respects_max_det():
+    boxes = np.array([[0, 0, 10, 10], [20, 20, 30, 30], [40, 40, 50, 50]], dtype=np.float32)
+    scores = np.array([0.2, 0.9, 0.5], dtype=np.float32)
+
+    assert nms(boxes, scores, iou_threshold=0.5, max_det=10).tolist() == [1, 2, 0]
+    assert nms(boxes, scores, iou_threshold=0.5, max_det=2).tolist() == [1, 2]
+
+
+def test_engine_reads_static_input_and_names(engine):
+    assert engine.fixed_imgsz == (MODEL_IMGSZ, MODEL_IMGSZ)
+    assert engine.fixed_batch is None
+    assert engine.names == CLASS_NAMES
+    assert engine.input_shape(640) == (MODEL_IMGSZ, MODEL_IMGSZ)
+
+
+def test_postprocess_filters_by_confidence_and_nms(engine):
+    detections = engine.postprocess(MODEL_OUTPUT, (MODEL_IMGSZ, MODEL_IMGSZ, 3), 1.0, (0, 0), 0.25, 0.6, 100)
+
+    assert detections.class_ids.tolist() == [0, 1]
+    np.testing.assert_allclose(detections.scores, [0.9, 0.8])
+    np.testing.assert_allclose(detections.boxes, [[12, 12, 20, 20], [35, 35, 45, 45]])
+
+
+def test_postprocess_maps_boxes_back_to_frame(engine):
+    # кадр 64x128 уменьшен вдвое до 32x64 и добит паддингом 16 px сверху и снизу
+    detections = engine.postprocess(MODEL_OUTPUT, (64, 128, 3), 0.5, (0, 16), 0.25, 0.6, 100)
+
+    np.testing.assert_allclose(detections.boxes, [[24, 0, 40, 8], [70, 38, 90, 58]])
+
+
+def test_postprocess_accepts_anchors_first_layout(engine):
+    detections = engine.postprocess(MODEL_OUTPUT.T, (MODEL_IMGSZ, MODEL_IMGSZ, 3), 1.0, (0, 0), 0.25, 0.6, 100)
+
+    assert detections.class_ids.tolist() == [0, 1]
+
+
+def test_postprocess_without_confident_boxes_is_empty(engine):
+    detections = engine.postprocess(MODEL_OUTPUT, (MODEL_IMGSZ, MODEL_IMGSZ, 3), 1.0, (0, 0), 0.95, 0.6, 100)
+
+    assert len(detections.class_ids) == 0
+
+
+def test_predict_runs_batch_through_model(engine):
+    frames = [np.zeros((MODEL_IMGSZ, MODEL_IMGSZ, 3), np.uint8), np.zeros((32, 64, 3), np.uint8)]
+
+    square, wide = engine.predict(frames, conf=0.25, iou=0.6)
+
+    assert square.class_ids.tolist() == [0, 1]
+    # второй кадр входит без масштабирования, с паддингом 16 px сверху: бокс сдвигается и обрезается краем
+    np.testing.assert_allclose(wide.boxes[0], [12, 0, 20, 4])
@@ -0,0 +1,53 @@
+import numpy as np
+
+from src.schemas.predict import ToolInfo
+from src.services.reconciliation import reconcile
+
+# набор: инструмент 1 — одна штука, инструмент 2 — две
+EXPECTED = np.array([0, 1, 2])
+
+
+def test_reconcile_counts_missing_and_unexpected_per_image():
+    result = reconcile(EXPECTED, [[1, 2, 2], [2], [1, 1, 2, 2]])
+
+    assert result.found.tolist() == [[0, 1, 2], [0, 0, 1], [0, 2, 2]]
+    assert result.missing.tolist() == [[0, 0, 0], [0, 1, 1], [0, 0, 0]]
+    assert result.unexpected.tolist() == [[0, 0, 0], [0, 0, 0], [0, 1, 0]]
+    assert result.hand_checks() == [False, True, False]
+    assert result.matched_ids(1) == [2]
+    assert result.predictions(2) == [1, 1, 2, 2]
+
+
+def test_reconcile_extends_expected_for_tools_outside_the_toolkit():
+    result = reconcile(EXPECTED, [[1, 2, 2, 5]])
+
+    assert result.expected.tolist() == [0, 1, 2, 0, 0, 0]
+    assert result.unexpected[0].tolist() == [0, 0, 0, 0, 0, 1]
+    assert not result.hand_check(0)
+
+
+def test_reconcile_without_detections():
+    result = reconcile(EXPECTED, [[], []])
+
+    assert result.found.tolist() == [[0, 0, 0], [0, 0, 0]]
+    assert result.hand_checks() == [True, True]
+    assert reconcile(np.zeros(0, dtype=np.int64), [[]]).found.shape == (1, 0)
+
+
+def test_tool_counts_lists_expected_and_found_tools():
+    tools = {1: ToolInfo(id=1, name="Отвёртка", serial_number="S1", category="c")}
+
+    counts = reconcile(EXPECTED, [[1, 3]]).tool_counts(0, tools)
+
+    assert [(c.tool_id, c.name, c.expected, c.found, c.missing, c.unexpected) for c in counts] == [
+        (1, "Отвёртка", 1, 1, 0, 0),
+        (2, None, 2, 0, 2, 0),
+        (3, None, 0, 1, 0, 1),
+    ]
+
+
+def test_combine_takes_max_over_frames():
+    combined = reconcile(EXPECTED, [[1, 2], [2, 2], []]).combine()
+
+    assert combined.found.tolist() == [[0, 1, 2]]
+    assert combined.hand_checks() == [False]
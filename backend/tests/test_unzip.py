@@ -0,0 +1,75 @@
+import io
+import zipfile
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from src.utils.unzip import ZipImages
+
+
+def make_zip(files: dict[str, bytes], compression: int = zipfile.ZIP_STORED) -> UploadFile:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return UploadFile(filename="images.zip", file=buffer)
+
+
+def test_iterates_only_images():
+    archive = make_zip({
+        "a.jpg": b"a", "nested/b.PNG": b"bb", "notes.txt": b"x", "__MACOSX/._a.jpg": b"x", "dir/": b"",
+    })
+
+    images = ZipImages(archive)
+
+    assert len(images) == 2
+    assert [(image.filename, image.file.read()) for image in images] == [("a.jpg", b"a"), ("b.PNG", b"bb")]
+
+
+def test_rejects_broken_archive():
+    with pytest.raises(HTTPException) as error:
+        ZipImages(UploadFile(filename="images.zip", file=io.BytesIO(b"not a zip")))
+    assert error.value.status_code == 400
+
+
+def test_limits_number_of_images():
+    archive = make_zip({f"{i}.jpg": b"x" for i in range(3)})
+
+    assert len(ZipImages(archive, max_members=3)) == 3
+    with pytest.raises(HTTPException) as error:
+        ZipImages(archive, max_members=2)
+    assert error.value.status_code == 413
+
+
+def test_limits_member_size():
+    with pytest.raises(HTTPException) as error:
+        ZipImages(make_zip({"big.jpg": b"x" * 101}), max_member_bytes=100)
+    assert error.value.status_code == 413
+
+
+def test_limits_total_size():
+    archive = make_zip({"a.jpg": b"x" * 60, "b.jpg": b"x" * 60})
+
+    with pytest.raises(HTTPException) as error:
+        ZipImages(archive, max_total_bytes=100)
+    assert error.value.status_code == 413
+
+
+def test_rejects_suspicious_compression_ratio():
+    archive = make_zip({"bomb.jpg": b"\0" * 100_000}, zipfile.ZIP_DEFLATED)
+
+    with pytest.raises(HTTPException) as error:
+        ZipImages(archive, max_compression_ratio=100)
+    assert error.value.status_code == 400
+
+
+def test_checks_sizes_again_while_reading():
+    # лимиты на прочитанных байтах срабатывают, даже если оглавление прошло проверку
+    images = ZipImages(make_zip({"a.jpg": b"x" * 60, "b.jpg": b"x" * 60}))
+    images.max_total_bytes = 100
+    iterator = iter(images)
+
+    assert next(iterator).filename == "a.jpg"
+    with pytest.raises(HTTPException) as error:
+        next(iterator)
+    assert error.value.status_code == 413